@@ -0,0 +1,46 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+# Benchmark of program canonicalization (ProgramDB.formatProgram and
+# programKey on the C code, structuralHash on the AST) against program
+# generation, which it has to keep up with
+# when de-duplication is on.
+#   python tests/bench_program_db.py [programs]
+
+import gen_program
+import program_db
+import time
+
+def bench(programs):
+    start = time.perf_counter()
+    trees = [gen_program.generateProgram(0, i) for i in range(programs)]
+    codes = [p.printCode()[0] for p in trees]
+    generation = time.perf_counter() - start
+
+    # Builds the exponent classes outside of the timed loop
+    program_db.ProgramDB.formatProgram(codes[0])
+    start = time.perf_counter()
+    for c in codes:
+        program_db.ProgramDB.formatProgram(c)
+    canonicalization = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for c in codes:
+        program_db.programKey(c)
+    hashing = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for p in trees:
+        p.structuralHash()
+    structural = time.perf_counter() - start
+
+    print("programs:          {}".format(programs))
+    print("generation:        {:.0f} programs/s".format(programs / generation))
+    print("canonicalization:  {:.0f} programs/s".format(programs / canonicalization))
+    print("programKey:        {:.0f} programs/s".format(programs / hashing))
+    print("structuralHash:    {:.0f} programs/s".format(programs / structural))
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,64 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import pytest
+np = pytest.importorskip("numpy")
+
+import analysis
+import cfg
+import json
+import tempfile
+
+def test_ulp_distance(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    one = analysis.parse_outputs(["1", "1", "-0", "2.2250738585072014e-308", "-1", "nan"])
+    two = analysis.parse_outputs(["1.0000000000000002", "1", "0", "-2.2250738585072014e-308", "1", "1"])
+    d = analysis.ulp_distance(one, two)
+    assert d[0] == 1
+    assert d[1] == 0
+    assert d[2] == 0
+    assert d[3] == 2 * 2 ** 52
+    assert d[4] == 2 * 0x3FF0000000000000
+    assert d[5] == np.iinfo(np.uint64).max
+    assert analysis.sign_flips(one, two).tolist() == [False, False, True, True, True, False]
+
+def test_ulp_distance_float(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "float")
+    one = analysis.parse_outputs(["1", "1"])
+    two = analysis.parse_outputs(["1.0000001192092896", "1.0000002384185791"])
+    assert analysis.ulp_distance(one, two).tolist() == [1, 2]
+
+def test_exact_output_formats(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "OUTPUT_FORMAT", "bits")
+    one = analysis.parse_outputs(["0x3ff0000000000000", "0x7ff8000000000001"])
+    assert one[0] == 1.0 and np.isnan(one[1])
+    monkeypatch.setattr(cfg, "OUTPUT_FORMAT", "hexfloat")
+    two = analysis.parse_outputs(["0x1.0000000000001p+0", "-nan"])
+    assert analysis.ulp_distance(one[:1], two[:1]).tolist() == [1]
+    assert np.signbit(two[1])
+
+def test_analyze_ulp(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "ULP_TOLERANCE", 1)
+    monkeypatch.setattr(cfg, "RELATIVE_TOLERANCE", None)
+    records = [
+        {"test": "t", "input": "1", "gcc:O0": "1 time:1", "gcc:O3": "1.0000000000000002 time:1"},
+        {"test": "t", "input": "2", "gcc:O0": "1 time:1", "gcc:O3": "1.0000000000000009 time:1"},
+        {"test": "t", "input": "3", "gcc:O0": "nan time:1", "gcc:O3": "1 time:1"},
+    ]
+    with tempfile.TemporaryDirectory() as d:
+        with open(os.path.join(d, "divergence_pairs.jsonl"), "w") as f:
+            for r in records:
+                f.write(json.dumps(r) + "\n")
+        analysis.analyze_ulp(d)
+        with open(os.path.join(d, "ulp_analysis.json")) as f:
+            pair = json.load(f)["Pairs"]["gcc:O0 vs gcc:O3"]
+        assert pair["Divergences"] == 3
+        assert pair["Within tolerance"] == 1
+        assert pair["NaN"] == 1
+        assert pair["ULP histogram"] == {"1": 1, "[4,8)": 1, "nan": 1}
+        with open(os.path.join(d, "divergence_pairs_filtered.jsonl")) as f:
+            assert len(f.readlines()) == 2
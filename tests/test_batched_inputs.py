@@ -0,0 +1,63 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import pytest
+np = pytest.importorskip("numpy")
+
+import cfg
+import gen_inputs
+from gen_inputs import BatchInputGenerator, InputGenerator, FPNumberType
+
+def check_inputs(types, suffix):
+    inputsList = BatchInputGenerator.genInputs(types, 500, np.random.default_rng(7))
+    assert len(inputsList) == 500
+    classes = set()
+    for inputs in inputsList:
+        values = inputs.split()
+        assert len(values) == len(types)
+        for t, v in zip(types, values):
+            if t == "int":
+                assert v == "5"
+                continue
+            assert v.endswith(suffix)
+            c = InputGenerator.getRealType(v)
+            assert c is not None
+            classes.add(c)
+    # Every class is drawn
+    assert classes == set(FPNumberType)
+
+def test_double_inputs(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    check_inputs(["double", "double*", "int", "double"], "")
+
+def test_float_inputs(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "float")
+    check_inputs(["float", "int", "float*"], "f")
+
+def test_exact_values(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    matrix = BatchInputGenerator.genMatrix(200, 3, np.random.default_rng(1))
+    inputsList = BatchInputGenerator.formatInputs(["double"] * 3, matrix)
+    # The printed inputs are read back to the same bits
+    parsed = np.array([[float(v) for v in inputs.split()] for inputs in inputsList])
+    assert (parsed.view(np.uint64) == matrix.view(np.uint64)).all()
+    # Mantissas are not limited to a few decimal digits
+    assert len(set((matrix.view(np.uint64) & np.uint64(0xffff)).ravel().tolist())) > 100
+
+def test_same_seed(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    one = BatchInputGenerator.genInputs(["double", "double"], 10, np.random.default_rng(3))
+    two = BatchInputGenerator.genInputs(["double", "double"], 10, np.random.default_rng(3))
+    assert one == two
+
+def test_scalar_fallback(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(gen_inputs, "np", None)
+    inputsList = BatchInputGenerator.genInputs(["double", "int"], 4)
+    assert len(inputsList) == 4
+    for inputs in inputsList:
+        (v, i) = inputs.split()
+        assert InputGenerator.getRealType(v) is not None
+        assert i == "5"
@@ -0,0 +1,107 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import varity
+import run
+import compile_failures
+import failure_log
+import cfg
+import glob
+import json
+import shutil
+import tempfile
+
+def setup_campaign(monkeypatch, d):
+    monkeypatch.chdir(d)
+    monkeypatch.setattr(cfg, "NUM_GROUPS", 1)
+    monkeypatch.setattr(cfg, "TESTS_PER_GROUP", 3)
+    monkeypatch.setattr(cfg, "INPUT_SAMPLES_PER_RUN", 2)
+    monkeypatch.setattr(cfg, "OPT_LEVELS", [("-O0", 0), ("-O1", 0)])
+    monkeypatch.setattr(cfg, "COMPILERS", [("gcc", shutil.which("gcc")), ("cc", shutil.which("cc"))])
+    monkeypatch.setattr(cfg, "SEED", 7)
+    monkeypatch.setattr(cfg, "DEDUP_INDEX", None)
+    monkeypatch.setattr(cfg, "COMPILE_CACHE_DIR", None)
+    monkeypatch.setattr(cfg, "EXEC_CACHE_FILE", None)
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+
+def test_compile_all_jobs_despite_errors(monkeypatch):
+    with tempfile.TemporaryDirectory() as d:
+        setup_campaign(monkeypatch, d)
+        dir = varity.generateTests()
+        group = os.path.join(dir, cfg.TESTS_DIR, "_group_1")
+        with open(os.path.join(group, "_test_2.c"), "a") as f:
+            f.write("\nthis does not compile\n")
+        varity.compileTests(dir)
+
+        # Every (test, compiler, opt) job ran, and only the broken test failed
+        for n in (1, 2, 3):
+            for compiler in ("gcc", "cc"):
+                for opt in ("-O0", "-O1"):
+                    exe = os.path.join(group, "_test_{}.c-{}{}.exe".format(n, compiler, opt))
+                    assert os.path.exists(exe) == (n != 2)
+        records = list(failure_log.readRecords(compile_failures.getLogFileName(dir)))
+        assert len(records) == 4
+        assert all(r["file"].endswith("_test_2.c") for r in records)
+
+# results.json of campaign dir, by test file name, without runtimes
+def load_results(dir):
+    with open(os.path.join(dir, "results.json")) as f:
+        results = json.load(f)
+    return {os.path.basename(test): {inputs: {c: {o: v.split(" time:")[0] for o, v in opts.items()}
+                                              for c, opts in compilers.items()}
+                                     for inputs, compilers in r.items()}
+            for test, r in results.items()}
+
+def test_pipeline_matches_stages(monkeypatch):
+    with tempfile.TemporaryDirectory() as d:
+        setup_campaign(monkeypatch, d)
+        monkeypatch.setattr(cfg, "COMPILERS", [("gcc", shutil.which("gcc"))])
+        monkeypatch.setattr(cfg, "OPT_LEVELS", [("-O0", 0)])
+        monkeypatch.setattr(cfg, "PIPELINE_QUEUE_SIZE", 1)
+        monkeypatch.setattr(run, "PROG_PER_TEST", {})
+        for stage in ("pipeline", "stages"):
+            os.mkdir(os.path.join(d, stage))
+        # Both campaigns are named after the process; saving the results
+        # changes to the campaign directory
+        monkeypatch.chdir(os.path.join(d, "pipeline"))
+        pipelined = os.path.join(d, "pipeline", varity.pipelineTests())
+
+        monkeypatch.chdir(os.path.join(d, "stages"))
+        staged = os.path.abspath(varity.generateTests())
+        # The same inputs: the input corpus of the pipeline is reused
+        for corpus in glob.glob(os.path.join(pipelined, cfg.TESTS_DIR, "_group_1", "*.npy")):
+            shutil.copy(corpus, os.path.join(staged, cfg.TESTS_DIR, "_group_1"))
+        varity.compileTests(staged)
+        varity.runTests(staged)
+
+        for n in (1, 2, 3):
+            source = os.path.join(cfg.TESTS_DIR, "_group_1", "_test_{}.c".format(n))
+            with open(os.path.join(pipelined, source)) as one, open(os.path.join(staged, source)) as two:
+                assert one.read() == two.read()
+        results = load_results(pipelined)
+        assert len(results) == 3 and all(len(r) == 2 for r in results.values())
+        assert results == load_results(staged)
+
+def test_jsonl_results_relative_campaign(monkeypatch):
+    with tempfile.TemporaryDirectory() as d:
+        setup_campaign(monkeypatch, d)
+        monkeypatch.setattr(cfg, "COMPILERS", [("gcc", shutil.which("gcc"))])
+        monkeypatch.setattr(cfg, "RESULTS_BACKEND", "jsonl")
+        monkeypatch.setattr(run, "PROG_PER_TEST", {})
+        dir = varity.generateTests()
+        assert not os.path.isabs(dir)
+        varity.compileTests(dir)
+        varity.runTests(dir)
+        results = load_results(os.path.join(d, dir))
+        assert len(results) == 3
+        assert all(set(r["gcc"].keys()) == {"O0", "O1"} for test in results.values() for r in test.values())
+
+def test_compile_sources_without_manifest(monkeypatch):
+    with tempfile.TemporaryDirectory() as d:
+        setup_campaign(monkeypatch, d)
+        sources = varity.getCompileSources(d)
+        assert sources == [(os.path.join(d, cfg.TESTS_DIR, "_group_1"), "_test_" + str(n) + ".c") for n in (1, 2, 3)]
+        # Nothing is created
+        assert os.listdir(d) == []
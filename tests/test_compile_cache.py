@@ -0,0 +1,52 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import compile_cache
+import cfg
+import shutil
+import tempfile
+
+def test_cache_key():
+    cc_path = shutil.which('cc')
+    assert cc_path != None
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, "a.c")
+        with open(src, "w") as f:
+            f.write("int main() { return 0; }\n")
+        k1 = compile_cache.cacheKey(src, cc_path, "-O0  -lm")
+        # Whitespace in the flags does not matter, the flags themselves do
+        assert k1 == compile_cache.cacheKey(src, cc_path, "-O0 -lm")
+        assert k1 != compile_cache.cacheKey(src, cc_path, "-O3 -lm")
+        with open(src, "a") as f:
+            f.write("\n")
+        assert k1 != compile_cache.cacheKey(src, cc_path, "-O0 -lm")
+
+def test_fetch_store_evict():
+    old_dir, old_size = cfg.COMPILE_CACHE_DIR, cfg.COMPILE_CACHE_MAX_SIZE
+    with tempfile.TemporaryDirectory() as d:
+        cfg.COMPILE_CACHE_DIR = os.path.join(d, "cache")
+        try:
+            exe = os.path.join(d, "a.exe")
+            with open(exe, "w") as f:
+                f.write("x" * 100)
+            target = os.path.join(d, "b.exe")
+            assert not compile_cache.fetch("aa11", target)
+            compile_cache.store("aa11", exe)
+            assert compile_cache.fetch("aa11", target)
+            with open(target) as f:
+                assert f.read() == "x" * 100
+
+            compile_cache.store("bb22", exe)
+            os.utime(compile_cache.entryPath("aa11"), (0, 0))
+            cfg.COMPILE_CACHE_MAX_SIZE = 150
+            assert compile_cache.evict() == 1
+            assert not os.path.exists(compile_cache.entryPath("aa11"))
+            assert os.path.exists(compile_cache.entryPath("bb22"))
+        finally:
+            cfg.COMPILE_CACHE_DIR, cfg.COMPILE_CACHE_MAX_SIZE = old_dir, old_size
+
+if __name__ == '__main__':
+    test_cache_key()
+    test_fetch_store_evict()
@@ -0,0 +1,79 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import json
+import tempfile
+import compile_failures
+import failure_log
+from process_limits import RunFailure
+
+SOURCE = """#include <stdio.h>
+#include <math.h>
+
+void compute(double comp, double var_1, int var_2) {
+  if (comp > var_1) {
+    for (int i = 0; i < var_2; ++i) {
+      comp += ldexp(var_1, 2) + sinf(var_1);
+    }
+  }
+}
+
+int main(int argc, char** argv) {
+  compute(atof(argv[1]), atof(argv[2]), atoi(argv[3]));
+  return 0;
+}
+"""
+
+def test_signature():
+    one = ("_tests/_group_1/_test_3.c: In function 'compute':\n"
+           "_tests/_group_1/_test_3.c:12:5: error: too few arguments to function 'ldexp' (var_12)\n")
+    two = ("_tests/_group_2/_test_17.c: In function 'compute':\n"
+           "_tests/_group_2/_test_17.c:40:11: error: too few arguments to function 'ldexp' (var_3)\n")
+    assert compile_failures.getSignature("exit", one) == compile_failures.getSignature("exit", two)
+    assert "ldexp" in compile_failures.getSignature("exit", one)
+    assert compile_failures.getSignature("timeout", one) == "timeout"
+    # Without error lines the kind is the signature
+    assert compile_failures.getSignature("crash", "warning: unused") == "crash"
+
+def test_source_features():
+    with tempfile.TemporaryDirectory() as d:
+        source = os.path.join(d, "_test_1.c")
+        with open(source, "w") as f:
+            f.write(SOURCE)
+        features = compile_failures.getSourceFeatures(source)
+        assert features["functions"] == ["ldexp", "sin"]
+        assert features["nesting"] == 2
+        assert compile_failures.getSourceFeatures(os.path.join(d, "missing.c")) is None
+
+def test_summary():
+    with tempfile.TemporaryDirectory() as d:
+        sources = []
+        for n in range(3):
+            source = os.path.join(d, "_test_" + str(n) + ".c")
+            with open(source, "w") as f:
+                f.write(SOURCE if n == 0 else SOURCE.replace("ldexp(var_1, 2)", "var_1"))
+            sources.append(source)
+
+        failure = RunFailure("exit", 1, 0.5, b"_test_0.c:7:15: error: ldexp is broken\n")
+        records = [compile_failures.newRecord(sources[0], c, [c, "-O2", sources[0]], failure)
+                   for c in ("gcc", "nvcc")]
+        records.append(compile_failures.newRecord(sources[1], "nvcc", ["nvcc", sources[1]],
+                                                  RunFailure("timeout", -9, 300.0)))
+        compile_failures.save(d, records)
+        assert len(list(failure_log.readRecords(compile_failures.getLogFileName(d)))) == 3
+
+        summary = compile_failures.summarize(d, sources)
+        assert summary["Failed jobs"] == 3 and summary["Failed sources"] == 2
+        assert [c["jobs"] for c in summary["Clusters"]] == [2, 1]
+        assert summary["Clusters"][0]["compilers"] == {"gcc": 1, "nvcc": 1}
+        # ldexp is only in the failing source
+        assert summary["Constructs"]["call:ldexp"]["failure rate"] == 1.0
+        assert summary["Constructs"]["call:sin"]["failure rate"] == 2 / 3
+        with open(os.path.join(d, "compile_failures_summary.json")) as f:
+            assert json.load(f)["Failed jobs"] == 3
+
+        # A new compilation replaces the log
+        compile_failures.save(d, [])
+        assert compile_failures.summarize(d, sources) is None
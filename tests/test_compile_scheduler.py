@@ -0,0 +1,79 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import cfg
+import compile_scheduler
+import process_limits
+import threading
+
+GiB = 1024 ** 3
+RESOURCES = {
+    "nvcc": {"max_jobs": 2, "memory": 4 * GiB},
+    "default": {"max_jobs": None, "memory": 1 * GiB},
+}
+
+def config(compiler_name):
+    return (compiler_name, "/usr/bin/" + compiler_name, "-O0", 0, "_tests/_group_1", "_test_1.c")
+
+def test_resource_hints(monkeypatch):
+    monkeypatch.setattr(cfg, "COMPILER_RESOURCES", RESOURCES)
+    assert compile_scheduler.getResourceHints("my_nvcc")["memory"] == 4 * GiB
+    assert compile_scheduler.getResourceHints("gcc_12")["memory"] == 1 * GiB
+    monkeypatch.setattr(cfg, "COMPILE_MEMORY_BUDGET", 3 * GiB)
+    assert compile_scheduler.getMemoryBudget() == 3 * GiB
+
+def test_packing(monkeypatch):
+    monkeypatch.setattr(cfg, "COMPILER_RESOURCES", RESOURCES)
+    scheduler = compile_scheduler.CompileScheduler(4, 11 * GiB)
+    pending = scheduler.order([config("gcc")] * 4 + [config("nvcc")] * 3)
+    assert list(pending.queues) == ["nvcc", "gcc"] and len(pending) == 7
+
+    # Two nvcc jobs (the limit of nvcc), then gcc jobs fill the CPUs
+    started = [scheduler.acquireNext(pending) for i in range(4)]
+    assert [c[0] for (c, memory) in started] == ["nvcc", "nvcc", "gcc", "gcc"]
+    assert scheduler.memoryInUse == 10 * GiB
+    assert not scheduler.fits("gcc")
+
+    # A gcc job ends: only a gcc job fits, and its peak RSS is recorded
+    scheduler.release("gcc", started[3][1], 2 * GiB)
+    (c, memory) = scheduler.acquireNext(pending)
+    assert c[0] == "gcc" and memory == 2 * GiB
+    assert len(pending) == 2
+
+def test_pending_order(monkeypatch):
+    monkeypatch.setattr(cfg, "COMPILER_RESOURCES", RESOURCES)
+    scheduler = compile_scheduler.CompileScheduler(1, None)
+    configs = [("gcc", "/usr/bin/gcc", "-O" + str(n % 4), 0, "_tests/_group_1", "_test_" + str(n) + ".c")
+               for n in range(20000)] + [config("nvcc")]
+    pending = scheduler.order(configs)
+    started = []
+    while len(pending) > 0:
+        (c, memory) = scheduler.acquireNext(pending)
+        scheduler.release(c[0], memory)
+        started.append(c)
+    # The heavy job first, then the others in their order
+    assert started == configs[-1:] + configs[:-1]
+
+def test_oversized_job_runs_alone(monkeypatch):
+    monkeypatch.setattr(cfg, "COMPILER_RESOURCES", RESOURCES)
+    scheduler = compile_scheduler.CompileScheduler(4, 2 * GiB)
+    memory = scheduler.acquire("nvcc")
+    assert not scheduler.fits("gcc")
+
+    done = []
+    waiter = threading.Thread(target=lambda: done.append(scheduler.acquire("gcc")))
+    waiter.start()
+    scheduler.release("nvcc", memory)
+    waiter.join(10)
+    assert done == [1 * GiB]
+
+def test_peak_rss():
+    (out, failure, seconds, peakRSS) = process_limits.spawnMeasured(
+        [sys.executable, "-c", "x = bytearray(200 * 1024 * 1024)"])
+    assert failure is None and peakRSS >= 200 * 1024 * 1024
+
+    (out, failure, seconds, peakRSS) = process_limits.spawnMeasured([sys.executable, "-c", "import time; time.sleep(30)"],
+                                                                    timeout=0.5)
+    assert failure.kind == "timeout" and seconds < 10
@@ -0,0 +1,63 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import run
+import results_store
+import cfg
+import json
+import tempfile
+
+RESULTS = {
+    "t/_test_1": {
+        "+1.0E3 5": {
+            "gcc": {"O0": "1000 time:5", "O3": "1000.5 time:4"},
+            "clang": {"O0": "1000 time:6"},
+        },
+        "-0.0 5": {
+            "gcc": {"O0": "0 time:5", "O3": "-0 time:4"},
+            "clang": {"O0": "nan time:6"},
+        },
+    }
+}
+
+def check_matrix(d):
+    cfg.SKIP_VALUES = True
+    run.check_divergence_matrix(d)
+    with open(os.path.join(d, "divergence_matrix.json")) as f:
+        data = json.load(f)
+    m = data["Divergences"]
+    assert data["Variants"] == ["clang:O0", "gcc:O0", "gcc:O3"]
+    assert data["Comparisons"]["gcc:O0"]["gcc:O3"] == 2
+    # 0 vs -0 is skipped
+    assert m["gcc:O0"]["gcc:O3"] == 1
+    assert m["gcc:O3"]["gcc:O0"] == 1
+    assert m["clang:O0"]["gcc:O0"] == 1
+    assert m["clang:O0"]["gcc:O3"] == 2
+    assert data["Total Divergences"] == 4
+    with open(os.path.join(d, "divergence_pairs.jsonl")) as f:
+        records = [json.loads(l) for l in f]
+    assert len(records) == 4
+
+def test_matrix_from_json():
+    with tempfile.TemporaryDirectory() as d:
+        with open(os.path.join(d, "results.json"), "w") as f:
+            json.dump(RESULTS, f)
+        check_matrix(d)
+
+def test_matrix_from_store():
+    with tempfile.TemporaryDirectory() as d:
+        store = results_store.openStore(d, reset=True, backend="sqlite")
+        for test, inputs in RESULTS.items():
+            for input_vals, compilers in inputs.items():
+                for compiler, opts in compilers.items():
+                    for opt, value in opts.items():
+                        (output, runtime) = value.split(" time:")
+                        store.add(test, input_vals, compiler, opt, output, int(runtime))
+        store.close()
+        check_matrix(d)
+
+if __name__ == '__main__':
+    test_matrix_from_json()
+    test_matrix_from_store()
@@ -0,0 +1,166 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import varity
+import gen_program
+import gen_inputs
+import cfg
+import run
+import process_limits
+import shutil
+import subprocess
+import tempfile
+
+def test_targets_match_single_target_printing():
+    for i in range(10):
+        (codes, allTypes) = gen_program.generateProgram(11, i).printTargets(["c", "cuda", "hip", "lib"])
+        p = gen_program.generateProgram(11, i)
+        assert codes["c"] == p.printCode()[0]
+        assert codes["cuda"] == p.printCode(True)[0]
+        assert codes["hip"] == p.printCode(True, hip=True)[0]
+        assert codes["lib"] == p.printLibraryCode()[0]
+        assert allTypes == p.printCode()[1]
+        assert "__global__" in codes["cuda"] and "__global__" not in codes["c"]
+        assert "hip_runtime.h" in codes["hip"]
+
+def test_only_configured_targets():
+    compilers = cfg.COMPILERS
+    shared = cfg.SHARED_LIBRARY_TARGET
+    try:
+        cfg.SHARED_LIBRARY_TARGET = False
+        cfg.COMPILERS = [("gcc", "/usr/bin/gcc"), ("clang", "/usr/bin/clang")]
+        assert varity.getTargets() == ["c"]
+        cfg.COMPILERS = [("gcc", "/usr/bin/gcc"), ("my_nvcc", "/usr/bin/nvcc")]
+        assert varity.getTargets() == ["c", "cuda"]
+        assert varity.getTestSources("t/_test_1.c") == {"c": "t/_test_1.c", "cuda": "t/_test_1.cu"}
+        cfg.SHARED_LIBRARY_TARGET = True
+        cfg.COMPILERS = [("my_hipcc", "/opt/rocm/bin/hipcc"), ("gcc", "/usr/bin/gcc")]
+        assert varity.getTargets() == ["c", "hip", "lib"]
+    finally:
+        cfg.COMPILERS = compilers
+        cfg.SHARED_LIBRARY_TARGET = shared
+
+def test_shared_driver_targets(monkeypatch):
+    monkeypatch.setattr(cfg, "SHARED_LIBRARY_TARGET", False)
+    monkeypatch.setattr(cfg, "SHARED_DRIVER", True)
+    monkeypatch.setattr(cfg, "COMPILERS", [("gcc", "/usr/bin/gcc"), ("my_nvcc", "/usr/bin/nvcc")])
+    assert varity.getTestSources("t/_test_1.c") == {"c": "t/_test_1.c", "cuda": "t/_test_1.cu",
+                                                    "kernel": "t/_test_1.kernel.c"}
+    assert varity.usesSharedDriver("gcc") and not varity.usesSharedDriver("my_nvcc")
+    # The shared-library target replaces the executables of host compilers
+    monkeypatch.setattr(cfg, "SHARED_LIBRARY_TARGET", True)
+    assert "kernel" not in varity.getTargets() and not varity.usesSharedDriver("gcc")
+
+def test_shared_driver_matches_program(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    cc_path = shutil.which('cc')
+    assert cc_path != None
+    with tempfile.TemporaryDirectory() as d:
+        with open(d + "/driver.c", "w") as f:
+            f.write(gen_program.printSharedDriver())
+        subprocess.check_call([cc_path, "-std=c99", "-c", "-o", d + "/driver.o", d + "/driver.c"])
+        for i in range(3):
+            (codes, allTypes) = gen_program.generateProgram(7, i).printTargets(["c", "kernel"])
+            assert "int main" not in codes["kernel"] and "int main" in codes["c"]
+            for target in ("c", "kernel"):
+                with open(d + "/t." + target + ".c", "w") as f:
+                    f.write(codes[target])
+            subprocess.check_call([cc_path, "-std=c99", "-O2", "-o", d + "/t.exe", d + "/t.c.c", "-lm"])
+            subprocess.check_call([cc_path, "-std=c99", "-O2", "-o", d + "/t.kernel.exe", d + "/t.kernel.c",
+                                   d + "/driver.o", "-lm"])
+
+            types = [cfg.REAL_TYPE] + allTypes.split(",")
+            inputsList = [" ".join(["5" if t == "int" else gen_inputs.InputGenerator.genInput() for t in types])
+                          for n in range(3)]
+            outputs = []
+            for inputs in inputsList:
+                outputs.append(subprocess.check_output([d + "/t.exe"] + inputs.split()))
+                assert subprocess.check_output([d + "/t.kernel.exe"] + inputs.split()) == outputs[-1]
+            # The shared driver also reads one input vector per line
+            out = subprocess.check_output([d + "/t.kernel.exe"], input="\n".join(inputsList).encode())
+            assert out == b"".join(outputs)
+
+def test_batch_targets(monkeypatch):
+    monkeypatch.setattr(cfg, "SHARED_LIBRARY_TARGET", False)
+    monkeypatch.setattr(cfg, "SHARED_DRIVER", True)
+    monkeypatch.setattr(cfg, "BATCH_SIZE", 3)
+    monkeypatch.setattr(cfg, "COMPILERS", [("gcc", "/usr/bin/gcc"), ("my_nvcc", "/usr/bin/nvcc")])
+    assert varity.getTestSources("t/_test_1.c") == {"c": "t/_test_1.c", "cuda": "t/_test_1.cu",
+                                                    "batch": "t/_test_1.batch.c"}
+    # Batches replace the shared driver, and GPU compilers build every test
+    assert varity.usesBatches("gcc") and not varity.usesBatches("my_nvcc")
+    assert not varity.usesSharedDriver("gcc")
+    fileNames = ["t/_test_" + str(n) + ".c" for n in range(1, 8)]
+    assert varity.getBatches(fileNames) == {"t/_batch_1.c": fileNames[0:3], "t/_batch_2.c": fileNames[3:6],
+                                            "t/_batch_3.c": fileNames[6:]}
+
+def test_batch_matches_program(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    cc_path = shutil.which('cc')
+    assert cc_path != None
+    with tempfile.TemporaryDirectory() as d:
+        kernels = []
+        tests = []
+        for n in range(1, 4):
+            (codes, allTypes) = gen_program.generateProgram(5, n).printTargets(["c", "batch"], n)
+            assert "int main" not in codes["batch"]
+            kernels.append((n, codes["batch"]))
+            with open(d + "/t" + str(n) + ".c", "w") as f:
+                f.write(codes["c"])
+            subprocess.check_call([cc_path, "-std=c99", "-O2", "-o", d + "/t" + str(n) + ".exe",
+                                   d + "/t" + str(n) + ".c", "-lm"])
+            tests.append((n, [cfg.REAL_TYPE] + allTypes.split(",")))
+        with open(d + "/_batch_1.c", "w") as f:
+            f.write(gen_program.printBatchProgram(kernels))
+        subprocess.check_call([cc_path, "-std=c99", "-O2", "-o", d + "/_batch_1.c-cc-O2.exe", d + "/_batch_1.c",
+                               "-lm"])
+
+        # The kernel is the one of the test the executable is linked as
+        for (n, types) in tests:
+            exe = d + "/_test_" + str(n) + ".c-cc-O2.exe"
+            os.link(d + "/_batch_1.c-cc-O2.exe", exe)
+            inputs = " ".join(["5" if t == "int" else gen_inputs.InputGenerator.genInput() for t in types])
+            expected = subprocess.check_output([d + "/t" + str(n) + ".exe"] + inputs.split())
+            assert subprocess.check_output([exe] + inputs.split()) == expected
+            assert subprocess.check_output([exe], input=inputs.encode()) == expected
+        assert subprocess.run([d + "/_batch_1.c-cc-O2.exe"], input=b"1 2").returncode == 2
+
+def test_multi_input_driver_matches_argv_runs(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "MULTI_INPUT_DRIVER", True)
+    monkeypatch.setattr(cfg, "EXEC_CACHE_FILE", None)
+    cc_path = shutil.which('cc')
+    assert cc_path != None
+    with tempfile.TemporaryDirectory() as d:
+        for i in range(3):
+            p = gen_program.generateProgram(13, i)
+            (code, allTypes) = p.printCode()
+            if "initPointer(" in code.split("void runTest")[1]:
+                assert "free(tmp_" in code.split("void runTest")[1]
+            # The kernel crashes on the first input 13
+            code = code.replace("void runTest(char** argv) {\n",
+                                "void runTest(char** argv) {\n  if (atof(argv[1]) == 13.0) abort();\n")
+            with open(d + "/t.c", "w") as f:
+                f.write(code)
+            exe = d + "/t.c-cc-O0.exe"
+            subprocess.check_call([cc_path, "-std=c99", "-O0", "-o", exe, d + "/t.c", "-lm"])
+
+            types = [cfg.REAL_TYPE] + allTypes.split(",")
+            inputsList = [" ".join(["5" if t == "int" else gen_inputs.InputGenerator.genInput() for t in types])
+                          for n in range(4)]
+            expected = [subprocess.check_output([exe] + inputs.split()).decode()[:-1] for inputs in inputsList]
+            # All the vectors go through the stdin of one process
+            results = run.runExecutable(exe, inputsList, types)
+            assert [res for (inputs, res, runtime) in results] == expected
+
+            # A crashing vector, and a short one that the driver skips, send
+            # every vector to its own process: the others keep their outputs
+            for bad in ("13.0 " + " ".join(inputsList[2].split()[1:]), "1.0"):
+                results = run.runExecutable(exe, inputsList[:2] + [bad] + inputsList[3:], types)
+                assert len(results) == 4
+                assert [res for (inputs, res, runtime) in results[:2]] == expected[:2]
+                assert results[3][1] == expected[3]
+            results = run.runExecutable(exe, inputsList[:2] + ["13.0 " + " ".join(inputsList[2].split()[1:])], types)
+            assert process_limits.isFailure(results[2][1]) and results[2][1].kind == "crash"
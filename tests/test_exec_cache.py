@@ -0,0 +1,133 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import cfg
+import run
+import exec_cache
+import manifest
+import shutil
+import subprocess
+import tempfile
+
+# An "executable" that logs its runs and prints its first input
+SCRIPT = "#!/bin/sh\necho run >> {log}\necho $1\n"
+
+def write_script(d, name):
+    path = os.path.join(d, name)
+    with open(path, "w") as f:
+        f.write(SCRIPT.format(log=os.path.join(d, "log")))
+    os.chmod(path, 0o755)
+    return path
+
+def count_runs(d):
+    if not os.path.exists(os.path.join(d, "log")):
+        return 0
+    with open(os.path.join(d, "log")) as f:
+        return len(f.readlines())
+
+def test_exec_cache(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "MULTI_INPUT_DRIVER", False)
+    with tempfile.TemporaryDirectory() as d:
+        monkeypatch.setattr(cfg, "EXEC_CACHE_FILE", os.path.join(d, "cache.db"))
+        exe = write_script(d, "t.c-gcc-O0.exe")
+        inputsList = ["+1.5000000000000000E+00 5 ", "-2.0000000000000000E-300 5 "]
+        one = run.runExecutable(exe, inputsList)
+        assert [res for (inputs, res, runtime) in one] == ["+1.5000000000000000E+00", "-2.0000000000000000E-300"]
+        assert count_runs(d) == 2
+
+        # The same inputs, printed differently, and a new one
+        two = run.runExecutable(exe, ["+1.5 5", "+3.0 5", "-2.0000000000000000E-300 5 "])
+        assert [res for (inputs, res, runtime) in two] == ["+1.5000000000000000E+00", "+3.0",
+                                                          "-2.0000000000000000E-300"]
+        assert count_runs(d) == 3
+
+        # An identical executable hits the cache of the first one
+        copy = os.path.join(d, "t.c-gcc-O2.exe")
+        shutil.copy2(exe, copy)
+        run.runExecutable(copy, inputsList)
+        assert count_runs(d) == 3
+
+def test_batched_executables_keyed_by_test(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "MULTI_INPUT_DRIVER", False)
+    with tempfile.TemporaryDirectory() as d:
+        monkeypatch.setattr(cfg, "EXEC_CACHE_FILE", os.path.join(d, "cache.db"))
+        batch = write_script(d, "_batch_1.c-gcc-O0.exe")
+        inputsList = ["+1.5000000000000000E+00 5 "]
+        # The tests of a batch share the executable but not its results
+        for name in ("_test_1.c-gcc-O0.exe", "_test_2.c-gcc-O0.exe"):
+            exe = os.path.join(d, name)
+            os.link(batch, exe)
+            exec_cache.addBatchedExecutable(exe)
+            run.runExecutable(exe, inputsList)
+        assert count_runs(d) == 2
+        run.runExecutable(os.path.join(d, "_test_1.c-gcc-O0.exe"), inputsList)
+        assert count_runs(d) == 2
+
+def test_shared_library_key_has_output_format(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    with tempfile.TemporaryDirectory() as d:
+        monkeypatch.setattr(cfg, "EXEC_CACHE_FILE", os.path.join(d, "cache.db"))
+        lib = os.path.join(d, "t.c-gcc-O0.so")
+        with open(lib, "wb") as f:
+            f.write(b"library")
+        calls = []
+
+        def fakeHarness(lib_file, types, inputsList):
+            calls.append(inputsList)
+            return [(inputs, run.output_format.formatValue(1.5), 1) for inputs in inputsList]
+
+        monkeypatch.setattr(run.harness, "runSharedLibrary", fakeHarness)
+        monkeypatch.setattr(cfg, "OUTPUT_FORMAT", "decimal")
+        assert run.runExecutable(lib, ["+1.0 5"], ["double", "int"])[0][1] == "1.5"
+        assert run.runExecutable(lib, ["+1.0 5"], ["double", "int"])[0][1] == "1.5"
+        assert len(calls) == 1
+        # Another format is not served from the runs of the first one
+        monkeypatch.setattr(cfg, "OUTPUT_FORMAT", "hexfloat")
+        assert run.runExecutable(lib, ["+1.0 5"], ["double", "int"])[0][1] == "0x1.8p+0"
+        assert len(calls) == 2
+
+def test_runtime_identity(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "MULTI_INPUT_DRIVER", False)
+    monkeypatch.setattr(exec_cache, "RUNTIME_IDS", {})
+    cc_path = shutil.which('cc')
+    assert cc_path != None
+    with tempfile.TemporaryDirectory() as d:
+        monkeypatch.setattr(cfg, "EXEC_CACHE_FILE", os.path.join(d, "cache.db"))
+        with open(os.path.join(d, "t.c"), "w") as f:
+            f.write("#include <stdio.h>\n#include <stdlib.h>\n#include <math.h>\n"
+                    "int main(int argc, char** argv) { printf(\"%.17g\\n\", sin(atof(argv[1]))); return 0; }\n")
+        exe = os.path.join(d, "t.c-cc-O0.exe")
+        subprocess.check_call([cc_path, "-o", exe, os.path.join(d, "t.c"), "-lm"])
+        if shutil.which("ldd") is not None:
+            assert any("libm" in os.path.basename(path) or "libc" in os.path.basename(path)
+                       for (path, size, mtime) in exec_cache.getLinkedLibraries(exe))
+
+        exec_cache.store(exe, [("+1.5 5", "cached", 1)])
+        assert run.runExecutable(exe, ["+1.5 5"])[0][1] == "cached"
+        # Another host does not reuse the runs
+        monkeypatch.setattr(exec_cache, "RUNTIME_IDS", {})
+        monkeypatch.setattr(exec_cache.socket, "gethostname", lambda: "another-host")
+        assert run.runExecutable(exe, ["+1.5 5"])[0][1] == "0.99749498660405445"
+
+def test_identical_executables(monkeypatch):
+    with tempfile.TemporaryDirectory() as d:
+        one = write_script(d, "t.c-gcc-O2.exe")
+        two = os.path.join(d, "t.c-gcc-O3.exe")
+        shutil.copy2(one, two)
+        with open(os.path.join(d, "t.c-gcc-O0.exe"), "w") as f:
+            f.write("#!/bin/sh\necho 0\n")
+        exes = [os.path.join(d, "t.c-gcc-O0.exe"), one, two]
+        assert run.getExecutableGroups(exes) == [[exes[0]], [one, two]]
+        monkeypatch.setattr(cfg, "RUN_IDENTICAL_ONCE", False)
+        assert run.getExecutableGroups(exes) == [[e] for e in exes]
+
+        m = manifest.newManifest()
+        for (exe, opt) in zip(exes, ["O0", "O2", "O3"]):
+            manifest.addExecutable(m, d, os.path.join(d, "t"), exe, "gcc", opt, "exe",
+                                   exec_cache.executableHash(exe))
+        assert manifest.getIdenticalExecutables(m, d, os.path.join(d, "t")) == [[exes[0]], [one, two]]
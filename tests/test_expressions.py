@@ -4,6 +4,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../v
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
 
 from gen_program import Expression
+from id_generator import GenerationContext
 import cfg
 import random
 
@@ -12,7 +13,7 @@ tests = 10
 def test_operands():
     random.seed(1)
     for i in range(tests):
-        e = Expression()
+        e = Expression(GenerationContext())
         str = e.printCode()
         terms = str.split()
         operands = 0
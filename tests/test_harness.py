@@ -0,0 +1,122 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import gen_program
+import gen_inputs
+import harness
+import run
+import cfg
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+def compile(cc_path, source, output, extra=[]):
+    subprocess.check_call([cc_path, "-std=c99", "-O0"] + extra + ["-o", output, source, "-lm"])
+
+def test_shared_library_matches_executable():
+    cfg.REAL_TYPE = "double"
+    cc_path = shutil.which('cc')
+    assert cc_path != None
+    with tempfile.TemporaryDirectory() as d:
+        for s in range(3):
+            random.seed(s)
+            p = gen_program.Program()
+            (code, allTypes) = p.printCode()
+            (libCode, libTypes) = p.printLibraryCode()
+            assert allTypes == libTypes
+
+            with open(d + "/t.c", "w") as f:
+                f.write(code)
+            with open(d + "/t.lib.c", "w") as f:
+                f.write(libCode)
+            compile(cc_path, d + "/t.c", d + "/t.exe")
+            compile(cc_path, d + "/t.lib.c", d + "/t.so", ["-fPIC", "-shared"])
+
+            types = [cfg.REAL_TYPE] + allTypes.split(",") if allTypes else [cfg.REAL_TYPE]
+            inputsList = []
+            for n in range(5):
+                inputs = []
+                for t in types:
+                    if t == "int":
+                        inputs.append("5")
+                    else:
+                        inputs.append(gen_inputs.InputGenerator.genInput())
+                inputsList.append(" ".join(inputs))
+
+            results = harness.runSharedLibrary(d + "/t.so", types, inputsList)
+            for (inputs, res, runtime) in results:
+                out = subprocess.check_output([d + "/t.exe"] + inputs.split())
+                assert out.decode('ascii')[:-1] == res
+
+# compute crashes on the input 13 and never returns on the input 7
+FAULTY = """double compute(double comp) {
+  if (comp == 13.0) {
+    volatile double* p = 0;
+    return *p;
+  }
+  while (comp == 7.0) {
+  }
+  return comp + 1.0;
+}
+"""
+
+def test_faulty_kernels_fail_alone(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "OUTPUT_FORMAT", "decimal")
+    monkeypatch.setattr(cfg, "RUN_TIMEOUT", 1)
+    monkeypatch.setattr(cfg, "RUN_CPU_LIMIT", 1)
+    cc_path = shutil.which('cc')
+    assert cc_path != None
+    with tempfile.TemporaryDirectory() as d:
+        with open(d + "/t.lib.c", "w") as f:
+            f.write(FAULTY)
+        compile(cc_path, d + "/t.lib.c", d + "/t.so", ["-fPIC", "-shared"])
+        results = harness.runSharedLibrary(d + "/t.so", ["double"], ["1.0", "13.0", "2.0", "7.0"])
+        assert [res for (inputs, res, runtime) in results[::2]] == ["2", "3"]
+        assert results[1][1].kind == "crash"
+        assert results[3][1].kind in ("timeout", "cpu_limit")
+
+# Best wall-clock time of a few calls of f
+def best_time(f, repeat=5):
+    ret = None
+    for r in range(repeat):
+        start_time = time.perf_counter()
+        f()
+        seconds = time.perf_counter() - start_time
+        if ret is None or seconds < ret:
+            ret = seconds
+    return ret
+
+def test_harness_faster_than_executable(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "MULTI_INPUT_DRIVER", True)
+    cc_path = shutil.which('cc')
+    assert cc_path != None
+    with tempfile.TemporaryDirectory() as d:
+        p = gen_program.generateProgram(1, 0)
+        (code, allTypes) = p.printCode()
+        (libCode, libTypes) = p.printLibraryCode()
+        with open(d + "/t.c", "w") as f:
+            f.write(code)
+        with open(d + "/t.lib.c", "w") as f:
+            f.write(libCode)
+        compile(cc_path, d + "/t.c", d + "/t.exe")
+        compile(cc_path, d + "/t.lib.c", d + "/t.so", ["-fPIC", "-shared"])
+
+        types = [cfg.REAL_TYPE] + allTypes.split(",") if allTypes else [cfg.REAL_TYPE]
+        inputsList = []
+        for n in range(cfg.INPUT_SAMPLES_PER_RUN):
+            inputsList.append(" ".join(["5" if t == "int" else gen_inputs.InputGenerator.genInput() for t in types]))
+
+        # The first call starts the worker; the following ones reuse it
+        harness.runSharedLibrary(d + "/t.so", types, inputsList)
+        libTime = best_time(lambda: harness.runSharedLibrary(d + "/t.so", types, inputsList))
+        exeTime = best_time(lambda: run.executeInputs(d + "/t.exe", inputsList, types))
+        assert libTime < exeTime
+
+if __name__ == '__main__':
+    test_shared_library_matches_executable()
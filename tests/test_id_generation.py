@@ -19,6 +19,20 @@ def test_generate_real():
     ig.clear()
     assert len(ig.printAllVars()) == 0
 
+def test_independent_contexts():
+    one = id_generator.GenerationContext()
+    two = id_generator.GenerationContext()
+    one.ids.generateRealID()
+    one.ids.generateTempRealID()
+    assert two.ids.generateRealID() == "var_1"
+    assert two.ids.generateTempRealID() == "tmp_1"
+    assert len(one.ids.printAllVars()) == 1
+    one.clear()
+    assert len(one.ids.printAllVars()) == 0
+    assert one.ids.generateTempRealID() == "tmp_1"
+    assert len(two.ids.printAllVars()) == 1
+
 if __name__ == '__main__':
     test_generate_real()
+    test_independent_contexts()
 
@@ -0,0 +1,62 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import cfg
+import run
+import input_corpus
+import tempfile
+
+ROWS = [[1.5, -0.0, 5e-324], [1.7976931348623157e+308, 2.2250738585072014e-308, -3.0]]
+
+def write_types(base):
+    with open(base + ".input", "w") as f:
+        f.write("double,double,int,double*,\n")
+
+def check_rows(rows, expected):
+    assert len(rows) == len(expected)
+    for row, e in zip(rows, expected):
+        assert [float(v).hex() for v in row] == [v.hex() for v in e]
+
+def test_without_numpy(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(input_corpus, "np", None)
+    with tempfile.TemporaryDirectory() as d:
+        base = os.path.join(d, "_test_1")
+        assert input_corpus.load(base) is None
+        input_corpus.write(base, ROWS)
+        with open(input_corpus.getCorpusFileName(base), "rb") as f:
+            data = f.read()
+        # The data is aligned and holds the exact bits
+        assert (len(data) - 6 * 8) % 64 == 0
+        check_rows(input_corpus.load(base), ROWS)
+
+def test_numpy_compatible(monkeypatch):
+    import pytest
+    np = pytest.importorskip("numpy")
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    with tempfile.TemporaryDirectory() as d:
+        base = os.path.join(d, "_test_1")
+        input_corpus.write(base, ROWS)
+        matrix = np.load(input_corpus.getCorpusFileName(base))
+        assert matrix.dtype == np.float64 and matrix.shape == (2, 3)
+        check_rows(input_corpus.load(base), ROWS)
+
+def test_same_inputs_on_every_run(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "INPUT_CORPUS", True)
+    monkeypatch.setattr(cfg, "BATCHED_INPUTS", True)
+    with tempfile.TemporaryDirectory() as d:
+        base = os.path.join(d, "_test_1")
+        write_types(base)
+        one = run.generateInputsList(base, 4)
+        assert input_corpus.exists(base)
+        assert run.generateInputsList(base, 4) == one
+        assert run.loadInputsList(base) == one
+        # More samples extend the corpus
+        two = run.generateInputsList(base, 6)
+        assert two[:4] == one and len(two) == 6
+        for inputs in two:
+            values = inputs.split()
+            assert len(values) == 4 and values[2] == "5"
@@ -0,0 +1,50 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import manifest
+import tempfile
+
+def test_manifest_round_trip():
+    with tempfile.TemporaryDirectory() as d:
+        base = os.path.join(d, "_tests", "_group_1", "_test_1")
+        m = manifest.loadOrCreate(d)
+        manifest.addTest(m, d, base, {"c": base + ".c"})
+        manifest.addExecutable(m, d, base, base + ".c-gcc-O0.exe", "gcc", "O0")
+        manifest.addExecutable(m, d, base, base + ".c-clang-O3_fast.exe", "clang", "O3_fast")
+        # Recompiling the same executable replaces its entry
+        manifest.addExecutable(m, d, base, base + ".c-gcc-O0.exe", "gcc", "O0")
+        manifest.save(d, m)
+
+        m = manifest.load(d)
+        entry = m["tests"][os.path.join("_tests", "_group_1", "_test_1")]
+        assert entry["sources"]["c"] == os.path.join("_tests", "_group_1", "_test_1.c")
+        assert entry["input"] == os.path.join("_tests", "_group_1", "_test_1.input")
+
+        tests = manifest.getTests(m, d)
+        assert len(tests) == 1
+        (base_name, exes) = tests[0]
+        assert base_name == base
+        assert sorted(exes) == sorted([(base + ".c-gcc-O0.exe", "gcc", "O0"),
+                                       (base + ".c-clang-O3_fast.exe", "clang", "O3_fast")])
+
+def test_manifest_batches():
+    with tempfile.TemporaryDirectory() as d:
+        group = os.path.join(d, "_tests", "_group_1")
+        bases = [os.path.join(group, "_test_" + str(n)) for n in (1, 2)]
+        m = manifest.loadOrCreate(d)
+        for base in bases:
+            manifest.addTest(m, d, base, {"c": base + ".c"})
+            manifest.addExecutable(m, d, base, base + ".c-gcc-O0.exe", "gcc", "O0", "batch", "ab12")
+        manifest.addBatch(m, d, os.path.join(group, "_batch_1.c"), bases)
+        manifest.save(d, m)
+
+        m = manifest.load(d)
+        assert manifest.getBatches(m, d) == [(os.path.join(group, "_batch_1.c"), bases)]
+        assert manifest.getBatchedExecutables(m, d) == [base + ".c-gcc-O0.exe" for base in bases]
+
+def test_manifest_missing():
+    with tempfile.TemporaryDirectory() as d:
+        assert manifest.load(d) is None
+        assert manifest.loadOrCreate(d) == {"seed": None, "tests": {}}
@@ -4,6 +4,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../v
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
 
 import gen_math_exp
+import id_generator
 import cfg
 import random
 
@@ -22,7 +23,7 @@ def test_fp64_math_expressions():
     matched = 0
     for i in range(tests):
         random.seed(i)
-        m = gen_math_exp.MathExpression().printCode()
+        m = gen_math_exp.MathExpression(id_generator.GenerationContext()).printCode()
         f = m.split('(')[0]
         if f in funcs:
             matched = matched + 1
@@ -35,13 +36,20 @@ def test_fp32_math_expressions():
     matched = 0
     for i in range(tests):
         random.seed(i)
-        m = gen_math_exp.MathExpression().printCode()
+        m = gen_math_exp.MathExpression(id_generator.GenerationContext()).printCode()
         f = m.split('(')[0]
         f = f[:-1] # remove f
         if f in funcs:
             matched = matched + 1
     assert matched == tests
 
+def test_disabled_math_functions(monkeypatch):
+    cfg.REAL_TYPE = "double"
+    monkeypatch.setattr(cfg, "DISABLED_MATH_FUNCTIONS", ["ldexp", "pow"])
+    for i in range(tests):
+        m = gen_math_exp.MathExpression(id_generator.GenerationContext(random.Random(i))).printCode()
+        assert m.split('(')[0] not in ("ldexp", "pow")
+
 if __name__ == '__main__':
     test_fp64_math_expressions()
     test_fp32_math_expressions()
@@ -0,0 +1,77 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import gen_program
+import output_format
+import harness
+import run
+import cfg
+import math
+import shutil
+import subprocess
+import tempfile
+
+VALUES = [0.0, -0.0, 1.0, -2.5, 0.1, 5e-324, 2.2250738585072014e-308, 1.7976931348623157e+308,
+          math.inf, -math.inf, math.nan, -math.nan]
+
+def print_values(cc_path, d, fmt):
+    # The print statement of the generated drivers, on each value
+    with open(d + "/p.c", "w") as f:
+        f.write("#include <stdio.h>\n#include <stdlib.h>\n#include <math.h>\n")
+        f.write("int main(int argc, char** argv) {\n  for (int i = 1; i < argc; i++) {\n")
+        f.write("    double comp = strtod(argv[i], NULL);\n    if (argv[i][0] == '-') comp = -fabs(comp);\n")
+        f.write(output_format.getPrintStatement() + "  }\n}\n")
+    subprocess.check_call([cc_path, "-std=c99", "-o", d + "/p.exe", d + "/p.c", "-lm"])
+    args = [("-" if math.copysign(1.0, v) < 0 else "") + repr(abs(v)) for v in VALUES]
+    return subprocess.check_output([d + "/p.exe"] + args).decode('ascii').splitlines()
+
+def test_formats_match_c(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    cc_path = shutil.which('cc')
+    assert cc_path != None
+    with tempfile.TemporaryDirectory() as d:
+        for fmt in output_format.FORMATS:
+            monkeypatch.setattr(cfg, "OUTPUT_FORMAT", fmt)
+            outputs = print_values(cc_path, d, fmt)
+            assert len(outputs) == len(VALUES)
+            for v, out in zip(VALUES, outputs):
+                if fmt != "bits" or not math.isnan(v):
+                    # NaN payloads are not portable
+                    assert harness.formatResult(v) == out
+                if fmt != "decimal":
+                    assert output_format.toBits(out) == output_format.getBits(v) or math.isnan(v)
+
+def test_compare_bits(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "OUTPUT_FORMAT", "bits")
+    assert output_format.sameOutput("0x3ff0000000000000", "0x3ff0000000000000")
+    assert not output_format.sameOutput("0x0000000000000000", "0x8000000000000000")
+    assert run.is_skipped_value("0x0000000000000000", "0x8000000000000000")
+    assert run.is_skipped_value("0x7ff8000000000000", "0xfff8000000000000")
+    assert not run.is_skipped_value("0x3ff0000000000000", "0x3ff0000000000001")
+    assert output_format.toDecimal("0xbff0000000000000") == "-1"
+    monkeypatch.setattr(cfg, "OUTPUT_FORMAT", "hexfloat")
+    assert output_format.sameOutput("0x1p+0", "0x1.0p+0")
+    assert not output_format.sameOutput("0x1p+0", "0x1.0000000000001p+0")
+    assert run.is_skipped_value("-0x0p+0", "0x0p+0")
+
+def test_single_precision_bits(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "float")
+    monkeypatch.setattr(cfg, "OUTPUT_FORMAT", "bits")
+    assert "unsigned int" in output_format.getPrintStatement()
+    assert harness.formatResult(1.0) == "0x3f800000"
+    assert output_format.toDecimal("0x3f800000") == "1"
+
+def test_generated_program(monkeypatch):
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    monkeypatch.setattr(cfg, "OUTPUT_FORMAT", "hexfloat")
+    cc_path = shutil.which('cc')
+    with tempfile.TemporaryDirectory() as d:
+        # A seeded stream of its own, not the global random module
+        (code, allTypes) = gen_program.generateProgram(1, 0).printCode()
+        assert 'printf("%a\\n", comp)' in code
+        with open(d + "/t.c", "w") as f:
+            f.write(code)
+        subprocess.check_call([cc_path, "-std=c99", "-o", d + "/t.exe", d + "/t.c", "-lm"])
@@ -0,0 +1,136 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import cfg
+import run
+import process_limits
+import failure_log
+import results_store
+import json
+import asyncio
+import time
+import tempfile
+
+# Prints its inputs (one vector per argv, or per line of stdin), and fails
+# on the input "bad"
+SCRIPT = """#!/bin/sh
+if [ $# -eq 0 ]; then
+  while read line; do
+    if [ "$line" = "bad" ]; then exit 1; fi
+    echo $line
+  done
+else
+  if [ "$1" = "bad" ]; then exit 1; fi
+  echo $1
+fi
+"""
+
+def write_script(d, name, code):
+    path = os.path.join(d, name)
+    with open(path, "w") as f:
+        f.write(code)
+    os.chmod(path, 0o755)
+    return path
+
+def test_failures(monkeypatch):
+    monkeypatch.setattr(cfg, "RUN_TIMEOUT", 0.5)
+    monkeypatch.setattr(cfg, "RUN_CPU_LIMIT", 1)
+    with tempfile.TemporaryDirectory() as d:
+        # The child keeps stdout open: only killing the process group ends the run
+        hang = write_script(d, "hang", "#!/bin/sh\nsleep 30 &\nsleep 30\n")
+        start = time.time()
+        (out, failure, seconds) = process_limits.spawn([hang])
+        assert failure.kind == "timeout"
+        assert time.time() - start < 10
+
+        crash = write_script(d, "crash", "#!/bin/sh\necho partial\nkill -SEGV $$\n")
+        (out, failure, seconds) = process_limits.spawn([crash])
+        assert failure.kind == "crash" and failure.toRecord()["signal"] == "SIGSEGV"
+
+        fail = write_script(d, "fail", "#!/bin/sh\necho error >&2\nexit 3\n")
+        (out, failure, seconds) = process_limits.spawn([fail])
+        assert failure.kind == "exit" and failure.returncode == 3 and failure.stderr == "error\n"
+
+        monkeypatch.setattr(cfg, "RUN_TIMEOUT", 20)
+        spin = write_script(d, "spin", "#!/bin/sh\nwhile :; do :; done\n")
+        (out, failure, seconds) = process_limits.spawn([spin])
+        assert failure.kind == "cpu_limit"
+
+        (out, failure, seconds) = asyncio.run(process_limits.spawnAsync([fail]))
+        assert failure.kind == "exit"
+
+def check_results(results):
+    assert [r[1] for r in results[:2]] == ["1.0", "2.0"]
+    assert process_limits.isFailure(results[2][1])
+
+def test_failed_inputs_are_isolated(monkeypatch):
+    monkeypatch.setattr(cfg, "MULTI_INPUT_DRIVER", True)
+    monkeypatch.setattr(cfg, "EXEC_CACHE_FILE", None)
+    with tempfile.TemporaryDirectory() as d:
+        exe = write_script(d, "_test_1.c-gcc-O0.exe", SCRIPT)
+        inputsList = ["1.0", "2.0", "bad"]
+        check_results(run.runExecutable(exe, inputsList))
+        check_results(asyncio.run(run.runExecutableAsync(exe, inputsList)))
+
+        # Failed runs are recorded in the failure log, not in the results
+        run.openResultsStore(d)
+        base = os.path.join(d, "_test_1")
+        for index, (inputs, res, runtime) in enumerate(run.runExecutable(exe, inputsList)):
+            run.appendResult(base, exe, inputs, res, runtime, {}, index)
+        run.RESULTS_STORE.close()
+        run.FAILURE_LOG.close()
+        records = list(failure_log.readRecords(failure_log.getFailureLogFileName(d, "run")))
+        assert len(records) == 1
+        assert records[0]["test"] == base and records[0]["input"] == "bad" and records[0]["index"] == 2
+        assert records[0]["kind"] == "exit" and records[0]["compiler"] == "gcc"
+
+def test_async_runner(monkeypatch):
+    monkeypatch.setattr(cfg, "RUN_TIMEOUT", 0.5)
+    monkeypatch.setattr(cfg, "MULTI_INPUT_DRIVER", True)
+    monkeypatch.setattr(cfg, "EXEC_CACHE_FILE", None)
+    monkeypatch.setattr(cfg, "INPUT_CORPUS", False)
+    monkeypatch.setattr(cfg, "BATCHED_INPUTS", False)
+    monkeypatch.setattr(cfg, "INPUT_SAMPLES_PER_RUN", 2)
+    monkeypatch.setattr(cfg, "REAL_TYPE", "double")
+    with tempfile.TemporaryDirectory() as d:
+        base = os.path.join(d, "_test_1")
+        with open(base + ".input", "w") as f:
+            f.write("double\n")
+        ok = write_script(d, "_test_1.c-gcc-O0.exe", SCRIPT)
+        hang = write_script(d, "_test_1.c-gcc-O1.exe", "#!/bin/sh\nsleep 30 &\nsleep 30\n")
+        fail = write_script(d, "_test_1.c-gcc-O2.exe", "#!/bin/sh\necho error >&2\nexit 3\n")
+        monkeypatch.setattr(run, "PROG_PER_TEST", {base: [ok, hang, fail]})
+
+        run.openResultsStore(d)
+        start = time.time()
+        run.runTestsAsync()
+        # The hung executable is killed on timeout, and does not stall the others
+        assert time.time() - start < 10
+        results_file = os.path.join(d, "results.json")
+        results_store.exportLegacyJSON(run.RESULTS_STORE, results_file)
+        run.RESULTS_STORE.close()
+        run.FAILURE_LOG.close()
+        with open(results_file) as f:
+            results = json.load(f)[base]
+        assert len(results) == 2
+        assert all(list(r.keys()) == ["gcc"] and list(r["gcc"].keys()) == ["O0"] for r in results.values())
+
+        records = list(failure_log.readRecords(failure_log.getFailureLogFileName(d, "run")))
+        kinds = sorted([(r["opt"], r["kind"]) for r in records])
+        assert kinds == [("O1", "timeout"), ("O1", "timeout"), ("O2", "exit"), ("O2", "exit")]
+        assert all(r["returncode"] == 3 for r in records if r["kind"] == "exit")
+
+def test_print_failures_after_chdir(monkeypatch, capsys):
+    with tempfile.TemporaryDirectory() as d:
+        os.mkdir(os.path.join(d, "campaign"))
+        monkeypatch.chdir(d)
+        # The campaign directory is relative, like the default one
+        log = failure_log.FailureLog(failure_log.getFailureLogFileName("campaign", "run"), reset=True)
+        log.add(process_limits.RunFailure("timeout", -9, 1.0).toRecord())
+        log.add(process_limits.RunFailure("crash", -11, 0.1).toRecord())
+        monkeypatch.chdir("campaign")
+        run.printFailures(log)
+        log.close()
+        assert "Failed runs: 2 (crash: 1, timeout: 1)" in capsys.readouterr().out
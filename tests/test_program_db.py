@@ -0,0 +1,76 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import program_db
+import cfg
+import gen_program
+import hashlib
+import tempfile
+
+def keys(n):
+    return [hashlib.sha256(str(i).encode()).digest() for i in range(n)]
+
+def check_index(backend):
+    with tempfile.TemporaryDirectory() as d:
+        fileName = os.path.join(d, "programs." + backend)
+        index = program_db.openIndex(fileName, backend)
+        assert all(index.add(k) for k in keys(100))
+        assert not any(index.add(k) for k in keys(100))
+        index.close()
+
+        # The index persists across campaigns
+        index = program_db.openIndex(fileName, backend)
+        assert not index.add(keys(1)[0])
+        index.close()
+
+def test_sqlite_index():
+    check_index("sqlite")
+
+def test_bloom_index():
+    check_index("bloom")
+
+def test_bloom_parameters():
+    (bits, hashes) = program_db.BloomProgramIndex.getParameters(1000000, 1e-4)
+    # About 19.2 bits and 13 hashes per program for a 0.01% error rate
+    assert 19000000 < bits < 19300000
+    assert hashes == 13
+
+def test_program_key():
+    cfg.REAL_TYPE = "double"
+    one = gen_program.generateProgram(1, 0).printCode()[0]
+    two = gen_program.generateProgram(1, 0).printCode()[0]
+    three = gen_program.generateProgram(1, 1).printCode()[0]
+    assert program_db.programKey(one) == program_db.programKey(two)
+    assert program_db.programKey(one) != program_db.programKey(three)
+
+def test_program_key_float():
+    cfg.REAL_TYPE = "float"
+    try:
+        one = gen_program.generateProgram(2, 0).printCode()[0]
+        assert program_db.programKey(one) == program_db.programKey(one)
+    finally:
+        cfg.REAL_TYPE = "double"
+
+def test_format_program():
+    cfg.REAL_TYPE = "double"
+    code = """
+void compute(double comp, int var_1,double var_2) {
+double tmp_1 = -1.9890E-316;
+comp = tmp_1 - +0.0 / -1.6010E-306 + var_2 / +1.6503E306;
+comp += +1.2E-30 * -1.5E400;
+   printf("%.17g\\n", comp);
+
+}
+double* initPointer(double v) {
+    return NULL;
+}
+int main(int argc, char** argv) {
+  compute(tmp_1,tmp_2,tmp_3);
+}
+"""
+    assert program_db.ProgramDB.formatProgram(code) == (
+        "void compute(double comp, int VAR,double VAR) { double TMP = SUBNORMAL; "
+        "comp = TMP - ZERO / ALMOST_UNDER + VAR / ALMOST_OVER; comp += NORMAL * UNDEFINED; "
+        "printf(\"%.17g\\n\", comp);")
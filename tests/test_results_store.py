@@ -0,0 +1,41 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import results_store
+import json
+import tempfile
+
+def check_backend(backend):
+    with tempfile.TemporaryDirectory() as d:
+        store = results_store.openStore(d, reset=True, backend=backend)
+        store.add("t/_test_1", "+1.0E3 5", "gcc", "O0", "1000", 12)
+        store.add("t/_test_2", "-0.0 5", "gcc", "O0", "-0", 3)
+        store.add("t/_test_1", "+1.0E3 5", "clang", "O3", "1000", 10)
+        store.add("t/_test_1", "+2.0E3 5", "gcc", "O0", "2000", None)
+        store.close()
+
+        store = results_store.openStore(d, backend=backend)
+        results_file = os.path.join(d, "results.json")
+        results_store.exportLegacyJSON(store, results_file)
+        store.close()
+        with open(results_file) as f:
+            data = json.load(f)
+
+        assert list(data.keys()) == ["t/_test_1", "t/_test_2"]
+        assert data["t/_test_1"] == {
+            "+1.0E3 5": {"gcc": {"O0": "1000 time:12"}, "clang": {"O3": "1000 time:10"}},
+            "+2.0E3 5": {"gcc": {"O0": "2000"}},
+        }
+        assert data["t/_test_2"] == {"-0.0 5": {"gcc": {"O0": "-0 time:3"}}}
+
+def test_sqlite_store():
+    check_backend("sqlite")
+
+def test_jsonl_store():
+    check_backend("jsonl")
+
+if __name__ == '__main__':
+    test_sqlite_store()
+    test_jsonl_store()
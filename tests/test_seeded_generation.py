@@ -0,0 +1,37 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import gen_program
+import random_functions
+
+def print_program(p):
+    return p.printCode()[0] + p.printCode(True)[0]
+
+def test_same_seed_same_program():
+    one = print_program(gen_program.generateProgram(1234, 7))
+    # Generating other tests in between does not change the stream of a test
+    for (index, p) in gen_program.generatePrograms(1234, range(5)):
+        print_program(p)
+    two = print_program(gen_program.generateProgram(1234, 7))
+    assert one == two
+
+def test_generate_programs_order():
+    programs = {}
+    for (index, p) in gen_program.generatePrograms(99, [3, 1, 2]):
+        programs[index] = print_program(p)
+    for (index, p) in gen_program.generatePrograms(99, [1, 2, 3]):
+        assert programs[index] == print_program(p)
+
+def test_interleaved_programs():
+    expected = [print_program(gen_program.generateProgram(5, i)) for i in range(3)]
+    # Programs have their own context, so they can be built before any is printed
+    programs = [p for (index, p) in gen_program.generatePrograms(5, range(3))]
+    for i in reversed(range(3)):
+        assert print_program(programs[i]) == expected[i]
+
+def test_independent_streams():
+    seeds = set([random_functions.getTestSeed(1234, i) for i in range(100)])
+    assert len(seeds) == 100
+    assert random_functions.getTestSeed(1234, 1) != random_functions.getTestSeed(1235, 0)
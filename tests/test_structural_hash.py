@@ -0,0 +1,53 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../varity/common')))
+
+import gen_program
+import program_db
+import cfg
+
+def test_structural_hash_matches_canonical_form():
+    cfg.REAL_TYPE = "double"
+    sizes = (cfg.MAX_EXPRESSION_SIZE, cfg.MAX_NESTING_LEVELS, cfg.MAX_LINES_IN_BLOCK, cfg.MAX_SAME_LEVEL_BLOCKS)
+    try:
+        # Small programs, so that many of them have the same structure
+        cfg.MAX_EXPRESSION_SIZE = 2
+        cfg.MAX_NESTING_LEVELS = 1
+        cfg.MAX_LINES_IN_BLOCK = 1
+        cfg.MAX_SAME_LEVEL_BLOCKS = 0
+        hashes = {}
+        forms = {}
+        for i in range(500):
+            p = gen_program.generateProgram(5, i)
+            h = p.structuralHash()
+            f = program_db.ProgramDB.formatProgram(p.printCode()[0])
+            hashes.setdefault(h, set()).add(f)
+            forms.setdefault(f, set()).add(h)
+        assert len(hashes) < 500
+        assert all(len(v) == 1 for v in hashes.values())
+        assert all(len(v) == 1 for v in forms.values())
+    finally:
+        (cfg.MAX_EXPRESSION_SIZE, cfg.MAX_NESTING_LEVELS, cfg.MAX_LINES_IN_BLOCK, cfg.MAX_SAME_LEVEL_BLOCKS) = sizes
+
+def test_hash_does_not_change_the_program():
+    for i in range(20):
+        code = gen_program.generateProgram(8, i).printCode()[0]
+        p = gen_program.generateProgram(8, i)
+        p.structuralHash()
+        assert p.printCode()[0] == code
+
+def check_slots(n):
+    if isinstance(n, list):
+        for c in n:
+            check_slots(c)
+        return
+    if not isinstance(n, gen_program.Node):
+        return
+    assert not hasattr(n, "__dict__"), type(n).__name__
+    for c in [n.code, n.left, n.right, getattr(n, "rootNode", None), getattr(n, "parameters", None)]:
+        check_slots(c)
+
+def test_nodes_have_slots():
+    for i in range(50):
+        check_slots(gen_program.generateProgram(3, i).func)
@@ -9,6 +9,9 @@ ARRAY_SIZE = 10
 MAX_SAME_LEVEL_BLOCKS = 2
 MATH_FUNC_ALLOWED = True
 MATH_FUNC_PROBABILITY = 0.05
+# Math functions that are never generated (e.g., ["ldexp"]), such as the
+# ones that often fail to compile (see compile_failures_summary.json)
+DISABLED_MATH_FUNCTIONS = []
 
 ###############################################################################
 # Compilation options
@@ -21,6 +24,25 @@ NUM_GROUPS = 2
 # Number of tests per group
 TESTS_PER_GROUP = 200
 
+# Seed of the campaign. Test i is generated from the stream (SEED, i), so it
+# can be regenerated later (--regenerate). None draws a new seed; the seed
+# is recorded in the campaign manifest.
+SEED = None
+
+# Persistent index of the programs generated by all campaigns. A program
+# whose canonical compute function is already in the index is replaced by a
+# new one (up to DEDUP_MAX_RETRIES times, then the test is dropped), so
+# duplicates are never compiled. None disables de-duplication.
+DEDUP_INDEX = None
+# DEDUP_INDEX = "/tmp/varity_programs.db"
+# "sqlite" keeps every program hash; "bloom" is a fixed-size memory-mapped
+# Bloom filter for endless campaigns, sized for DEDUP_BLOOM_CAPACITY programs
+# with a false-duplicate rate of DEDUP_BLOOM_ERROR_RATE
+DEDUP_BACKEND = "sqlite"
+DEDUP_BLOOM_CAPACITY = 10 * 1000 * 1000
+DEDUP_BLOOM_ERROR_RATE = 1e-4
+DEDUP_MAX_RETRIES = 100
+
 # Set of compilers to test.
 # COMPILERS is a list containing tuples (x, y), 
 # where x is a string with the compiler name, and y is the path to the compiler
@@ -41,12 +63,112 @@ OPT_LEVELS = [("-O0", 0), ("-O1", 0), ("-O2", 0), ("-O3", 0), ("-O3", 2)]
 # Name of root directory 
 TESTS_DIR = "_tests"
 
+# Build host-compiler tests (gcc, clang, xlc, pgi, ...) as shared libraries
+# that export compute, and run them through a ctypes harness (long-lived
+# worker processes, one per concurrent run, with the limits of RUN_TIMEOUT
+# and RUN_CPU_LIMIT for each input).
+# GPU compilers still build executables.
+SHARED_LIBRARY_TARGET = False
+
+# Split layout for host-compiler executables: compute (and the parsing of
+# its inputs) is written to its own translation unit (_test_N.kernel.c),
+# compiled at each optimization level, and linked with a driver object
+# (main and initPointer) compiled once per compiler for the campaign.
+# Ignored when SHARED_LIBRARY_TARGET is set. GPU compilers still build the
+# whole program.
+SHARED_DRIVER = False
+
+# Number of tests compiled together by host compilers (1 disables batches).
+# The kernels of BATCH_SIZE consecutive tests of a group (_test_N.batch.c)
+# are written to one translation unit (_batch_B.c) with a main that runs the
+# kernel of the test it is started as, and the executable of the batch is
+# linked as the executable of each of its tests, so results and
+# de-duplication stay per test. Ignored when SHARED_LIBRARY_TARGET is set;
+# SHARED_DRIVER only applies without batches.
+BATCH_SIZE = 1
+
+# Directory of the content-addressed compile cache, shared across campaigns.
+# Executables are looked up by source, compiler identity and flags.
+# None disables the cache.
+COMPILE_CACHE_DIR = None
+# COMPILE_CACHE_DIR = "/tmp/varity_compile_cache"
+# Maximum size of the compile cache in bytes (least recently used entries are evicted)
+COMPILE_CACHE_MAX_SIZE = 10 * 1024 ** 3
+
+# Resource hints of the compilers, by substring of the compiler name (the
+# "default" entry is used for the others): maximum number of concurrent jobs
+# (None for no limit besides the CPUs) and expected peak memory of a job in
+# bytes. Compile jobs are started while they fit in COMPILE_MEMORY_BUDGET.
+# The observed peak RSS of each compiler is saved in compile_data.json.
+COMPILER_RESOURCES = {
+    "nvcc": {"max_jobs": 16, "memory": 2 * 1024 ** 3},
+    "hipcc": {"max_jobs": 16, "memory": 3 * 1024 ** 3},
+    "default": {"max_jobs": None, "memory": 256 * 1024 ** 2},
+}
+# Memory in bytes for the compile jobs running at the same time (None uses
+# 80% of the memory available when compilation starts)
+COMPILE_MEMORY_BUDGET = None
+
+# Maximum time in seconds to compile a test (None disables it). Compile
+# failures and timeouts are recorded in compile_failures.jsonl and clustered
+# by error signature in compile_failures_summary.json.
+COMPILE_TIMEOUT = 300
+
+# Byte-identical executables of a test (e.g., -O2 and -O3 builds of a small
+# kernel) are run once, and their results recorded for each of them.
+RUN_IDENTICAL_ONCE = True
+# SQLite file of the execution cache, shared across campaigns and reruns.
+# Runs are looked up by the SHA-256 of the executable, its runtime identity
+# (host name, GPU driver version and the shared libraries it loads, like
+# libm or libcudart) and the bits of the input, so runs cached on another
+# host or before a library upgrade are run again. None disables the cache.
+EXEC_CACHE_FILE = None
+# EXEC_CACHE_FILE = "/tmp/varity_exec_cache.db"
+
 ###############################################################################
 # Running options
 ###############################################################################
 
 # Number of random inputs per run
 INPUT_SAMPLES_PER_RUN = 10
+# Generate all the input samples of a test at once with NumPy (random
+# mantissa bits, one draw per sample matrix). Without NumPy, or when False,
+# inputs are generated one value at a time.
+BATCHED_INPUTS = True
+# Save the inputs of each test, the first time it is run, as a binary .npy
+# file (exact bits) next to its .input file. All the executables of the test,
+# and reruns, then run on the same inputs.
+INPUT_CORPUS = True
+
+# How executables are run: "async" runs as many executables as CPUs at the
+# same time, "serial" runs them one after another, "pool" uses a process pool
+RUNNER = "async"
+
+# Generate, compile and run the tests as a streaming pipeline when no
+# arguments are given (same as the -p option)
+PIPELINE = False
+# Maximum number of compile jobs and executables waiting to run in the
+# pipeline (None uses twice the number of CPUs)
+PIPELINE_QUEUE_SIZE = None
+
+# Maximum time in seconds to run a test on one input (None disables it).
+# Executables run in their own process group, which is killed on timeout.
+RUN_TIMEOUT = 60
+# Maximum CPU time in seconds to run a test on one input (None disables it)
+RUN_CPU_LIMIT = 30
+# Timeouts, crashes and non-zero exits are recorded in run_failures.jsonl
+# and the campaign goes on.
+
+# Where run results are streamed while a campaign runs: "sqlite" (results.db)
+# or "jsonl" (results.jsonl). results.json is exported from it at the end.
+RESULTS_BACKEND = "sqlite"
+# Number of sqlite records buffered between commits
+RESULTS_COMMIT_INTERVAL = 1000
+
+# Generate executables that read one input vector per line from stdin, and
+# run all the input samples of an executable in a single process.
+# Tests generated with this option off must also be run with it off.
+MULTI_INPUT_DRIVER = True
 
 ###############################################################################
 # Floating-point types
@@ -55,8 +177,19 @@ INPUT_SAMPLES_PER_RUN = 10
 REAL_TYPE = "double"
 # REAL_TYPE = "float"
 
+# How the generated programs print their result: "decimal" (%.17g),
+# "hexfloat" (%a) or "bits" (the bit pattern of the result in hex). With
+# "hexfloat" and "bits" the outputs are exact and compared by bit pattern.
+OUTPUT_FORMAT = "decimal"
+
 # Values to skip during divergence checks
 SKIP_VALUES = True
 # SKIP_VALUES = False
+
+# Divergences within these tolerances are reported as noise by the ULP
+# analysis (-u); None disables a tolerance
+ULP_TOLERANCE = 1
+RELATIVE_TOLERANCE = None
+
 # RECORD_RUNTIME = False
 RECORD_RUNTIME = True
@@ -0,0 +1,165 @@
+import os
+import json
+
+import cfg
+import run
+import output_format
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ULP-distance analysis of the divergences found by run.check_divergence_matrix.
+# Outputs are parsed once into float arrays (float64 or float32, following
+# cfg.REAL_TYPE) per pair of variants, and the ULP distances, relative
+# errors and sign flips are computed with vectorized NumPy operations.
+
+
+def get_float_types():
+    if cfg.REAL_TYPE == "float":
+        return (np.float32, np.int32, np.uint32)
+    return (np.float64, np.int64, np.uint64)
+
+
+def parse_outputs(outputs):
+    (float_type, int_type, uint_type) = get_float_types()
+    if output_format.getFormat() == "bits":
+        return np.array([int(o, 16) for o in outputs], dtype=uint_type).view(float_type)
+    if output_format.getFormat() == "hexfloat":
+        return np.array([output_format.parseFloat(o) for o in outputs]).astype(float_type)
+    # Outputs are printed as doubles; single-precision values convert exactly
+    return np.array(outputs).astype(np.float64).astype(float_type)
+
+
+def ulp_distance(one, two):
+    """Number of representable values between one and two (element-wise).
+    NaNs get the maximum distance."""
+    (float_type, int_type, uint_type) = get_float_types()
+    bits_one = one.view(int_type)
+    bits_two = two.view(int_type)
+    # Map the sign-magnitude encoding to a monotonic integer order
+    sign_mask = int_type(np.iinfo(int_type).max)
+    ordered_one = np.where(bits_one < 0, -(bits_one & sign_mask), bits_one)
+    ordered_two = np.where(bits_two < 0, -(bits_two & sign_mask), bits_two)
+    # The distance always fits in the unsigned type, so modular arithmetic is exact
+    greater = ordered_one >= ordered_two
+    ordered_one = ordered_one.astype(uint_type)
+    ordered_two = ordered_two.astype(uint_type)
+    distance = np.where(greater, ordered_one - ordered_two, ordered_two - ordered_one)
+    nans = np.isnan(one) | np.isnan(two)
+    return np.where(nans, np.iinfo(uint_type).max, distance)
+
+
+def relative_error(one, two):
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        one = one.astype(np.float64)
+        two = two.astype(np.float64)
+        return np.abs(one - two) / np.maximum(np.abs(one), np.abs(two))
+
+
+def sign_flips(one, two):
+    return (np.signbit(one) != np.signbit(two)) & ~(np.isnan(one) & np.isnan(two))
+
+
+# Histogram of ULP distances with power-of-two buckets: "0", "1", "[2,4)", ...
+def ulp_histogram(distance, nans):
+    valid = distance[~nans]
+    buckets = np.zeros(valid.shape, dtype=np.int64)
+    nonzero = valid > 0
+    # Exponent of the highest set bit; float64 rounding could move a value
+    # just below a power of two to the next bucket, so it is corrected below
+    exps = np.floor(np.log2(valid[nonzero].astype(np.float64))).astype(np.int64)
+    exps = np.where((np.left_shift(np.uint64(1), exps.astype(np.uint64)) > valid[nonzero].astype(np.uint64)),
+                    exps - 1, exps)
+    buckets[nonzero] = exps + 1
+    counts = np.bincount(buckets)
+    ret = {}
+    for b, n in enumerate(counts.tolist()):
+        if n == 0:
+            continue
+        if b == 0:
+            name = "0"
+        elif b == 1:
+            name = "1"
+        else:
+            name = "[" + str(2 ** (b - 1)) + "," + str(2 ** b) + ")"
+        ret[name] = n
+    if nans.any():
+        ret["nan"] = int(nans.sum())
+    return ret
+
+
+def within_tolerance(distance, rel_error, nans):
+    ret = np.zeros(distance.shape, dtype=bool)
+    if cfg.ULP_TOLERANCE is not None:
+        ret |= distance <= np.uint64(cfg.ULP_TOLERANCE)
+    if cfg.RELATIVE_TOLERANCE is not None:
+        ret |= rel_error <= cfg.RELATIVE_TOLERANCE
+    return ret & ~nans
+
+
+def read_divergence_pairs(folder_path):
+    pairs = {}
+    with open(os.path.join(folder_path, "divergence_pairs.jsonl"), "r") as f:
+        for line in f:
+            record = json.loads(line)
+            (name_one, name_two) = [k for k in record.keys() if k not in ("test", "input")]
+            pair = (name_one, name_two)
+            if pair not in pairs:
+                pairs[pair] = ([], [], [])
+            (outputs_one, outputs_two, records) = pairs[pair]
+            outputs_one.append(record[name_one].split(" time:")[0])
+            outputs_two.append(record[name_two].split(" time:")[0])
+            records.append(line)
+    return pairs
+
+
+def analyze_ulp(folder_path):
+    """Computes ULP distances, relative errors and sign flips of the
+    divergences of a campaign, per pair of compiler:opt variants.
+
+    Writes the per-pair statistics and histograms to ulp_analysis.json,
+    and the divergences that are not within cfg.ULP_TOLERANCE /
+    cfg.RELATIVE_TOLERANCE to divergence_pairs_filtered.jsonl.
+    """
+    if np is None:
+        print("The ULP analysis requires NumPy!")
+        return
+
+    if not os.path.exists(os.path.join(folder_path, "divergence_pairs.jsonl")):
+        run.check_divergence_matrix(folder_path)
+        if not os.path.exists(os.path.join(folder_path, "divergence_pairs.jsonl")):
+            return
+
+    print("Analyzing the divergences...")
+    summary = {}
+    with open(os.path.join(folder_path, "divergence_pairs_filtered.jsonl"), "w") as filtered:
+        for (pair, (outputs_one, outputs_two, records)) in read_divergence_pairs(folder_path).items():
+            one = parse_outputs(outputs_one)
+            two = parse_outputs(outputs_two)
+            nans = np.isnan(one) | np.isnan(two)
+            distance = ulp_distance(one, two)
+            rel_error = relative_error(one, two)
+            flips = sign_flips(one, two)
+            noise = within_tolerance(distance, rel_error, nans)
+
+            for i in np.flatnonzero(~noise).tolist():
+                filtered.write(records[i])
+
+            finite = ~nans & np.isfinite(rel_error)
+            summary[pair[0] + " vs " + pair[1]] = {
+                "Divergences": len(records),
+                "Within tolerance": int(noise.sum()),
+                "NaN": int(nans.sum()),
+                "Sign flips": int(flips.sum()),
+                "Max relative error": float(rel_error[finite].max()) if finite.any() else None,
+                "Median ULP distance": int(np.median(distance[~nans])) if (~nans).any() else None,
+                "ULP histogram": ulp_histogram(distance, nans),
+            }
+
+    with open(os.path.join(folder_path, "ulp_analysis.json"), "w") as f:
+        json.dump({"ULP tolerance": cfg.ULP_TOLERANCE, "Relative tolerance": cfg.RELATIVE_TOLERANCE,
+                   "Pairs": summary}, f, indent=2)
+
+    print("ULP analysis saved to ulp_analysis.json!")
@@ -0,0 +1,114 @@
+import os
+import shutil
+import hashlib
+import subprocess
+
+import cfg
+
+# Compiler identities are expensive to compute (one --version call each),
+# so each worker process computes them only once.
+COMPILER_IDS = {}
+
+
+def isEnabled():
+    return cfg.COMPILE_CACHE_DIR is not None
+
+
+def compilerIdentity(compiler_path):
+    if compiler_path not in COMPILER_IDS:
+        resolved = os.path.realpath(shutil.which(compiler_path) or compiler_path)
+        mtime = os.stat(resolved).st_mtime_ns
+        try:
+            out = subprocess.run([resolved, "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                 timeout=60).stdout
+        except (OSError, subprocess.SubprocessError):
+            out = b""
+        COMPILER_IDS[compiler_path] = "\0".join([resolved, str(mtime), out.decode('utf-8', 'replace')])
+    return COMPILER_IDS[compiler_path]
+
+
+# The key covers everything that can change the produced executable:
+# the source bytes (and those of extra_files, e.g. the shared driver), the
+# compiler binary and the full flag string.
+def cacheKey(source_file, compiler_path, flags, extra_files=None):
+    extra_files = extra_files or []
+    h = hashlib.sha256()
+    for fileName in [source_file] + extra_files:
+        with open(fileName, "rb") as f:
+            h.update(f.read())
+        h.update(b"\0")
+    h.update(compilerIdentity(compiler_path).encode())
+    h.update(b"\0")
+    h.update(" ".join(flags.split()).encode())
+    return h.hexdigest()
+
+
+def entryPath(key):
+    return os.path.join(cfg.COMPILE_CACHE_DIR, key[:2], key + ".exe")
+
+
+# Places the cached artifact at target. Returns False on a cache miss.
+def fetch(key, target):
+    entry = entryPath(key)
+    if not os.path.exists(entry):
+        return False
+    try:
+        # Refresh the entry so that LRU eviction keeps it
+        os.utime(entry)
+        if os.path.lexists(target):
+            os.remove(target)
+        try:
+            os.link(entry, target)
+        except OSError:
+            shutil.copy2(entry, target)
+    except OSError:
+        # The entry may have been evicted by another campaign in the meantime
+        return False
+    return True
+
+
+def store(key, built_file):
+    entry = entryPath(key)
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    # Copy under a private name first so that concurrent readers never see
+    # a partially written executable.
+    tmp = entry + "." + str(os.getpid()) + ".tmp"
+    try:
+        shutil.copy2(built_file, tmp)
+        os.replace(tmp, entry)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# Removes the least recently used entries until the cache fits in
+# cfg.COMPILE_CACHE_MAX_SIZE bytes.
+def evict():
+    if not isEnabled() or not os.path.isdir(cfg.COMPILE_CACHE_DIR):
+        return 0
+    entries = []
+    total_size = 0
+    for dirName, subdirList, fileList in os.walk(cfg.COMPILE_CACHE_DIR):
+        for fname in fileList:
+            if not fname.endswith(".exe"):
+                continue
+            path = os.path.join(dirName, fname)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total_size += st.st_size
+
+    removed = 0
+    entries.sort()
+    for (mtime, size, path) in entries:
+        if total_size <= cfg.COMPILE_CACHE_MAX_SIZE:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total_size -= size
+        removed += 1
+    return removed
@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import hashlib
+
+import failure_log
+from gen_math_exp import MathFunctions
+
+# Compile failures of a campaign.
+# Each failed compile job is recorded in compile_failures.jsonl with the
+# compiler, the flags, the kind of failure (timeout, crash or exit), the
+# tail of stderr and a signature: the error lines of stderr with the file
+# names, positions, generated names and numbers taken out, so that the
+# failures caused by the same construct share it. summarize() clusters the
+# failures by signature and counts the generator constructs (math functions,
+# nesting depth) of the failing sources against all the compiled ones, to
+# find the constructs that can be turned off (cfg.DISABLED_MATH_FUNCTIONS,
+# cfg.MAX_NESTING_LEVELS).
+
+MATH_FUNCTION_NAMES = [f.split("(")[0] for f in MathFunctions]
+
+# Lines of compiler output that describe an error
+ERROR_LINE = re.compile(r"error|undefined reference|internal compiler|fatal|segmentation fault", re.IGNORECASE)
+NORMALIZE = [
+    (re.compile(r"\S+\.(?:c|cu|cpp|o|exe|so|h)\b(?::\d+)*:?"), "FILE:"),
+    (re.compile(r"\b(?:var|tmp|i)_\d+\b"), "ID"),
+    (re.compile(r"0x[0-9a-fA-F]+"), "N"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "N"),
+    (re.compile(r"\s+"), " "),
+]
+MAX_SIGNATURE_LINES = 5
+
+
+def getSignature(kind, stderr):
+    if kind == "timeout":
+        return "timeout"
+    lines = []
+    for line in stderr.splitlines():
+        if not ERROR_LINE.search(line):
+            continue
+        for (pattern, replacement) in NORMALIZE:
+            line = pattern.sub(replacement, line)
+        line = line.strip()
+        if line not in lines:
+            lines.append(line)
+    if len(lines) == 0:
+        return kind
+    return "\n".join(lines[:MAX_SIGNATURE_LINES])
+
+
+def getDigest(signature):
+    return hashlib.sha256(signature.encode()).hexdigest()[:12]
+
+
+def getSourceFeatures(source_file):
+    """Generator constructs of a test source: the math functions it calls,
+    the maximum nesting depth of the blocks of compute, and its size."""
+    try:
+        with open(source_file, "r") as f:
+            code = f.read()
+    except OSError:
+        return None
+    # The driver follows compute (the kernels compute_N in batches)
+    match = re.search(r"\bcompute(?:_\d+)?\(", code)
+    start = match.start() if match is not None else 0
+    end = code.find("\nint main", start)
+    body = code[start:end if end >= 0 else len(code)]
+    # Single-precision tests call the "f" versions (sinf, ...)
+    functions = set()
+    for name in re.findall(r"\b([a-z][a-z0-9]*)\(", body):
+        if name in MATH_FUNCTION_NAMES:
+            functions.add(name)
+        elif name.endswith("f") and name[:-1] in MATH_FUNCTION_NAMES:
+            functions.add(name[:-1])
+    functions = sorted(functions)
+    depth = 0
+    nesting = 0
+    for c in body:
+        if c == "{":
+            depth += 1
+            nesting = max(nesting, depth)
+        elif c == "}":
+            depth -= 1
+    # The body of compute is the first level
+    return {"functions": functions, "nesting": max(nesting - 1, 0), "lines": body.count("\n")}
+
+
+def getFeatureNames(features):
+    if features is None:
+        return []
+    return ["call:" + name for name in features["functions"]] + ["nesting:" + str(features["nesting"])]
+
+
+def newRecord(source_file, compiler, args, failure):
+    record = {"file": source_file, "compiler": compiler, "command": " ".join(args)}
+    record.update(failure.toRecord())
+    record["signature"] = getSignature(failure.kind, failure.stderr)
+    record["digest"] = getDigest(record["signature"])
+    return record
+
+
+def getLogFileName(path):
+    return failure_log.getFailureLogFileName(path, "compile")
+
+
+def save(path, records):
+    log = failure_log.FailureLog(getLogFileName(path), reset=True)
+    for r in records:
+        log.add(r)
+    log.close()
+
+
+def summarize(path, sources):
+    """Clusters the compile failures of the campaign by signature and writes
+    compile_failures_summary.json. sources is the list of all the compiled
+    source files, the base of the construct failure rates."""
+    clusters = {}
+    failedSources = set()
+    for r in failure_log.readRecords(getLogFileName(path)):
+        if r["digest"] not in clusters:
+            clusters[r["digest"]] = {"signature": r["signature"], "kind": r["kind"], "jobs": 0, "compilers": {},
+                                     "constructs": {}, "example": r["command"], "sources": set()}
+        c = clusters[r["digest"]]
+        c["jobs"] += 1
+        c["compilers"][r["compiler"]] = c["compilers"].get(r["compiler"], 0) + 1
+        c["sources"].add(r["file"])
+        failedSources.add(r["file"])
+
+    if len(clusters) == 0:
+        return None
+
+    features = {s: getFeatureNames(getSourceFeatures(s)) for s in set(sources) | failedSources}
+    constructs = {}
+    for s, names in features.items():
+        for n in names:
+            if n not in constructs:
+                constructs[n] = {"sources": 0, "failed sources": 0}
+            constructs[n]["sources"] += 1
+            if s in failedSources:
+                constructs[n]["failed sources"] += 1
+    for c in clusters.values():
+        for s in c["sources"]:
+            for n in features[s]:
+                c["constructs"][n] = c["constructs"].get(n, 0) + 1
+        c["sources"] = len(c["sources"])
+
+    for n, stats in constructs.items():
+        stats["failure rate"] = stats["failed sources"] / stats["sources"]
+    ranked = sorted([(n, s) for n, s in constructs.items() if s["failed sources"] > 0],
+                    key=lambda x: (-x[1]["failure rate"], -x[1]["failed sources"]))
+
+    summary = {
+        "Failed jobs": sum([c["jobs"] for c in clusters.values()]),
+        "Failed sources": len(failedSources),
+        "Clusters": sorted([dict(c, digest=d) for d, c in clusters.items()], key=lambda c: -c["jobs"]),
+        "Constructs": {n: s for n, s in ranked},
+    }
+    with open(os.path.join(path, "compile_failures_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def printSummary(summary, top=5):
+    print("Compile failures: {} jobs, {} sources, {} signatures (see compile_failures_summary.json)".format(
+        summary["Failed jobs"], summary["Failed sources"], len(summary["Clusters"])))
+    for c in summary["Clusters"][:top]:
+        print("  {} jobs [{}]: {}".format(c["jobs"], c["digest"], c["signature"].split("\n")[0]))
@@ -0,0 +1,147 @@
+import os
+import threading
+from collections import deque
+
+import cfg
+
+# Scheduling of compile jobs by compiler resources.
+# GPU compilers (nvcc, hipcc) use many times the memory and time of a host
+# compiler job. Each compiler has hints in cfg.COMPILER_RESOURCES (maximum
+# concurrent jobs and expected peak memory per job), and a job is started
+# only when the number of jobs of its compiler, the total number of jobs
+# and the memory of the running jobs stay under the limits. Jobs are
+# started heaviest first, and light jobs fill the CPUs that the heavy ones
+# leave free. The peak RSS of each compile job is recorded by compiler; a
+# compiler that uses more than its hint is scheduled with what it used.
+
+# Fraction of the available memory used by compile jobs when
+# cfg.COMPILE_MEMORY_BUDGET is None
+MEMORY_FRACTION = 0.8
+
+
+def getResourceHints(compiler_name):
+    """Resource hints of a compiler: the entry of cfg.COMPILER_RESOURCES
+    whose key is in the compiler name (like isCUDACompiler), or "default"."""
+    for (key, hints) in cfg.COMPILER_RESOURCES.items():
+        if key != "default" and key in compiler_name:
+            return hints
+    return cfg.COMPILER_RESOURCES.get("default", {})
+
+
+def getAvailableMemory():
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def getMemoryBudget():
+    if cfg.COMPILE_MEMORY_BUDGET is not None:
+        return cfg.COMPILE_MEMORY_BUDGET
+    memory = getAvailableMemory()
+    if memory is None:
+        return None
+    return int(memory * MEMORY_FRACTION)
+
+
+class PendingConfigs:
+    """Compile configurations waiting to start, in one queue per compiler
+    (in the order of the configurations)."""
+
+    def __init__(self, configs):
+        self.queues = {}
+        for config in configs:
+            if config[0] not in self.queues:
+                self.queues[config[0]] = deque()
+            self.queues[config[0]].append(config)
+        self.count = len(configs)
+
+    def __len__(self):
+        return self.count
+
+    def pop(self, compiler_name):
+        config = self.queues[compiler_name].popleft()
+        if len(self.queues[compiler_name]) == 0:
+            del self.queues[compiler_name]
+        self.count -= 1
+        return config
+
+
+class CompileScheduler:
+    def __init__(self, maxJobs, memoryBudget=None):
+        self.maxJobs = maxJobs
+        self.memoryBudget = memoryBudget
+        self.running = {}
+        self.memoryInUse = 0
+        # Observed peak RSS of the compile jobs, by compiler
+        self.peakRSS = {}
+        # Compile callbacks release jobs from the result thread of the pool
+        self.condition = threading.Condition()
+
+    def getMemory(self, compiler_name):
+        memory = getResourceHints(compiler_name).get("memory") or 0
+        return max(memory, self.peakRSS.get(compiler_name, 0))
+
+    def fits(self, compiler_name):
+        running = sum(self.running.values())
+        if running >= self.maxJobs:
+            return False
+        maxCompilerJobs = getResourceHints(compiler_name).get("max_jobs")
+        if maxCompilerJobs is not None and self.running.get(compiler_name, 0) >= maxCompilerJobs:
+            return False
+        # A job larger than the budget still runs, alone
+        if self.memoryBudget is not None and running > 0:
+            return self.memoryInUse + self.getMemory(compiler_name) <= self.memoryBudget
+        return True
+
+    def start(self, compiler_name):
+        memory = self.getMemory(compiler_name)
+        self.running[compiler_name] = self.running.get(compiler_name, 0) + 1
+        self.memoryInUse += memory
+        return memory
+
+    def acquire(self, compiler_name):
+        """Waits until a job of the compiler can start. Returns the memory
+        reserved for it, to pass to release."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.fits(compiler_name))
+            return self.start(compiler_name)
+
+    def acquireNext(self, pending):
+        """Waits until one of the pending compile configurations (from
+        order()) can start, removes it from pending and returns (config,
+        reserved memory). The heaviest compiler that fits goes first."""
+        with self.condition:
+            while True:
+                for compiler_name in sorted(pending.queues, key=lambda c: -self.getMemory(c)):
+                    if self.fits(compiler_name):
+                        return (pending.pop(compiler_name), self.start(compiler_name))
+                self.condition.wait()
+
+    def release(self, compiler_name, memory, peakRSS=None):
+        with self.condition:
+            self.running[compiler_name] -= 1
+            self.memoryInUse -= memory
+            if peakRSS is not None:
+                self.peakRSS[compiler_name] = max(self.peakRSS.get(compiler_name, 0), peakRSS)
+            self.condition.notify_all()
+
+    def wait(self):
+        with self.condition:
+            self.condition.wait_for(lambda: sum(self.running.values()) == 0)
+
+    def order(self, configs):
+        """Pending compile configurations for acquireNext, heaviest compiler
+        first."""
+        return PendingConfigs(sorted(configs, key=lambda config: -self.getMemory(config[0])))
+
+
+def newScheduler(maxJobs):
+    return CompileScheduler(maxJobs, getMemoryBudget())
@@ -0,0 +1,198 @@
+import os
+import socket
+import struct
+import hashlib
+import sqlite3
+import threading
+import subprocess
+
+import cfg
+
+# Execution cache.
+# The output of an executable on an input depends on the bytes of the
+# executable, the bits of the input and the runtime it is loaded with (the
+# libm, libcudart or libamdhip64 it links and the GPU), so runs are memoized
+# by (SHA-256 of the executable and runtime identity, input bits). The
+# runtime identity is the host name, the GPU driver version and the shared
+# libraries the executable resolves to (from ldd), so runs cached on another
+# host, or before a library upgrade, are not reused. The cache is a SQLite
+# file shared across campaigns and reruns (cfg.EXEC_CACHE_FILE); cached runs
+# report the runtime of the run that was cached.
+
+# SHA-256 of the executables, by (path, size, mtime)
+EXE_HASHES = {}
+# Runtime identity of the executables, by SHA-256
+RUNTIME_IDS = {}
+# Version files of the GPU drivers, when they are loaded
+DRIVER_VERSION_FILES = ["/proc/driver/nvidia/version", "/sys/module/amdgpu/version"]
+# Executables linked from a batch (cfg.BATCH_SIZE): the same bytes run the
+# kernel of the test they are named after, so the test is part of their key
+BATCHED_EXECUTABLES = set()
+
+
+def isEnabled():
+    return cfg.EXEC_CACHE_FILE is not None
+
+
+def executableHash(exe_file):
+    st = os.stat(exe_file)
+    key = (exe_file, st.st_size, st.st_mtime_ns)
+    if key not in EXE_HASHES:
+        h = hashlib.sha256()
+        with open(exe_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        EXE_HASHES[key] = h.hexdigest()
+    return EXE_HASHES[key]
+
+
+# Shared libraries that exe_file is loaded with, as (path, size, mtime) of
+# the resolved files; none for static executables or without ldd
+def getLinkedLibraries(exe_file):
+    try:
+        out = subprocess.run(["ldd", exe_file], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             timeout=60).stdout.decode('utf-8', 'replace')
+    except (OSError, subprocess.SubprocessError):
+        return []
+    ret = []
+    for line in out.splitlines():
+        # "libm.so.6 => /lib/x86_64-linux-gnu/libm.so.6 (0x...)" or "/lib64/ld-linux-x86-64.so.2 (0x...)"
+        path = line.split("=>")[-1].split("(")[0].strip()
+        if os.path.isabs(path) and os.path.exists(path):
+            resolved = os.path.realpath(path)
+            st = os.stat(resolved)
+            ret.append((resolved, st.st_size, st.st_mtime_ns))
+    return sorted(ret)
+
+
+def getDriverVersions():
+    ret = []
+    for fileName in DRIVER_VERSION_FILES:
+        try:
+            with open(fileName, "r") as f:
+                ret.append(f.read().strip())
+        except OSError:
+            pass
+    return ret
+
+
+def runtimeIdentity(exe_file):
+    exeHash = executableHash(exe_file)
+    if exeHash not in RUNTIME_IDS:
+        parts = [socket.gethostname()] + getDriverVersions()
+        parts += ["{}:{}:{}".format(path, size, mtime) for (path, size, mtime) in getLinkedLibraries(exe_file)]
+        RUNTIME_IDS[exeHash] = hashlib.sha256("\0".join(parts).encode()).hexdigest()[:16]
+    return RUNTIME_IDS[exeHash]
+
+
+def addBatchedExecutable(exe_file):
+    BATCHED_EXECUTABLES.add(exe_file)
+
+
+# Key of the runs of an executable in the cache. The outputs of shared
+# libraries are decoded and printed by the harness, so they also depend on
+# the output format and the real type.
+def executableKey(exe_file):
+    key = executableHash(exe_file) + ":" + runtimeIdentity(exe_file)
+    if exe_file in BATCHED_EXECUTABLES:
+        key += ":" + os.path.basename(exe_file).split(".")[0]
+    if exe_file.endswith(".so"):
+        key += ":" + cfg.OUTPUT_FORMAT + ":" + cfg.REAL_TYPE
+    return key
+
+
+# Groups executables by content. Returns the lists of identical executables,
+# in the order of their first executable.
+def groupIdentical(exes):
+    groups = {}
+    for exe_file in exes:
+        key = executableHash(exe_file)
+        if key not in groups:
+            groups[key] = []
+        groups[key].append(exe_file)
+    return list(groups.values())
+
+
+# The bits of the reals of an input vector (integers are kept as they are),
+# so that inputs printed differently but with the same value share a key
+def inputKey(inputs):
+    code = "<f" if cfg.REAL_TYPE == "float" else "<d"
+    ret = []
+    for v in inputs.split():
+        if v.lstrip("+-").isdigit():
+            ret.append(v)
+        else:
+            ret.append(struct.pack(code, float(v.rstrip("fF"))).hex())
+    return " ".join(ret)
+
+
+class ExecCache:
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.db = sqlite3.connect(fileName, timeout=60, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS runs (exe TEXT, input TEXT, output TEXT, runtime INTEGER, "
+                        "PRIMARY KEY (exe, input)) WITHOUT ROWID")
+        self.db.commit()
+        # The pipeline runs executables from several threads
+        self.lock = threading.Lock()
+
+    # Returns the cached (output, runtime) of the inputs of inputsList, by inputs
+    def lookup(self, exeHash, inputsList):
+        ret = {}
+        with self.lock:
+            for inputs in inputsList:
+                row = self.db.execute("SELECT output, runtime FROM runs WHERE exe = ? AND input = ?",
+                                      (exeHash, inputKey(inputs))).fetchone()
+                if row is not None:
+                    ret[inputs] = row
+        return ret
+
+    # results are (inputs, output, runtime) tuples, like run.runExecutable
+    def store(self, exeHash, results):
+        rows = [(exeHash, inputKey(inputs), output, runtime) for (inputs, output, runtime) in results]
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO runs (exe, input, output, runtime) VALUES (?, ?, ?, ?)",
+                                rows)
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+# The cache of the current process (runners use threads and processes)
+EXEC_CACHE = None
+EXEC_CACHE_PID = None
+
+def getCache():
+    global EXEC_CACHE, EXEC_CACHE_PID
+    if EXEC_CACHE is None or EXEC_CACHE_PID != os.getpid() or EXEC_CACHE.fileName != cfg.EXEC_CACHE_FILE:
+        EXEC_CACHE = ExecCache(cfg.EXEC_CACHE_FILE)
+        EXEC_CACHE_PID = os.getpid()
+    return EXEC_CACHE
+
+
+def lookup(exe_file, inputsList):
+    """Returns (cached, missing): the cached (output, runtime) of the inputs
+    of inputsList that exe_file already ran on, by inputs, and the inputs it
+    still has to run on."""
+    cached = getCache().lookup(executableKey(exe_file), inputsList)
+    return (cached, [inputs for inputs in inputsList if inputs not in cached])
+
+
+# Failed runs are not cached: a timeout can depend on the load of the machine
+def store(exe_file, results):
+    results = [r for r in results if isinstance(r[1], str)]
+    if len(results) > 0:
+        getCache().store(executableKey(exe_file), results)
+
+
+# Returns the (inputs, output, runtime) tuples of inputsList, in order, from
+# the cached runs and the new results
+def merge(inputsList, cached, results):
+    new = {inputs: (output, runtime) for (inputs, output, runtime) in results}
+    ret = []
+    for inputs in inputsList:
+        (output, runtime) = cached[inputs] if inputs in cached else new[inputs]
+        ret.append((inputs, output, runtime))
+    return ret
@@ -0,0 +1,45 @@
+import os
+import json
+
+# Structured logs of the failures of a campaign, one JSON record per line
+# (e.g., run_failures.jsonl). Records are appended while the campaign runs.
+
+
+def getFailureLogFileName(rootDir, stage):
+    return os.path.join(rootDir, stage + "_failures.jsonl")
+
+
+class FailureLog:
+    def __init__(self, fileName, reset=False):
+        # Read again by printFailures, after saveResults changed to the
+        # campaign directory
+        self.fileName = os.path.abspath(fileName)
+        self.fd = open(self.fileName, "w" if reset else "a")
+        self.count = 0
+
+    def add(self, record):
+        self.fd.write(json.dumps(record) + "\n")
+        self.fd.flush()
+        self.count += 1
+
+    def close(self):
+        self.fd.close()
+
+
+def readRecords(fileName):
+    if not os.path.exists(fileName):
+        return
+    with open(fileName, "r") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+# Number of records by kind
+def countByKind(fileName):
+    ret = {}
+    for r in readRecords(fileName):
+        ret[r["kind"]] = ret.get(r["kind"], 0) + 1
+    return ret
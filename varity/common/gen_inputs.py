@@ -8,6 +8,13 @@ from random_functions import lucky, veryLucky
 
 from enum import Enum
 import random
+import math
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class FPNumberType(Enum):
     normal = 0
@@ -30,13 +37,14 @@ class NumericalType(Enum):
 #   (3) Almost underflow
 #   (4) Subnormal (underflow)
 #   (5) zero (positive or negative)
+# The numbers are drawn from rng, the random module by default.
 class InputGenerator:
 
-    def genInput():
+    def genInput(rng=random):
         if type_checking.areRealsDouble():
-            return FP64Input.genInput()
+            return FP64Input.genInput(rng)
         elif type_checking.areRealsSingle():
-            return FP32Input.genInput()
+            return FP32Input.genInput(rng)
         return "undefined"
 
     def getRealType(number):
@@ -48,46 +56,46 @@ class InputGenerator:
 class FP64Input:
 
     # ---- Get Specific Classes of Numbers -----
-    def getNormalSmall():
-        exponent = random.randrange(-306, 1)
-        return FP64Input.writeNumber(exponent)
+    def getNormalSmall(rng=random):
+        exponent = rng.randrange(-306, 1)
+        return FP64Input.writeNumber(exponent, rng)
     
-    def getNormalLarge():
-        exponent = random.randrange(1, 155) # +308/2 = 154
-        return FP64Input.writeNumber(exponent)
+    def getNormalLarge(rng=random):
+        exponent = rng.randrange(1, 155) # +308/2 = 154
+        return FP64Input.writeNumber(exponent, rng)
     
-    def getNormalVeryLarge():
-        exponent = random.randrange(155, 306)
-        return FP64Input.writeNumber(exponent)
+    def getNormalVeryLarge(rng=random):
+        exponent = rng.randrange(155, 306)
+        return FP64Input.writeNumber(exponent, rng)
         
-    def getAnyNumericalValue():
-        x = random.choice(list(NumericalType))
+    def getAnyNumericalValue(rng=random):
+        x = rng.choice(list(NumericalType))
         if x == NumericalType.very_small:
-            return FP64Input.getSubnormal()
+            return FP64Input.getSubnormal(rng)
         if x == NumericalType.small:
-            return FP64Input.getNormalSmall()
+            return FP64Input.getNormalSmall(rng)
         if x == NumericalType.large:
-            return FP64Input.getNormalLarge()
+            return FP64Input.getNormalLarge(rng)
         if x == NumericalType.very_large:
-            return FP64Input.getNormalVeryLarge()
+            return FP64Input.getNormalVeryLarge(rng)
         # otherwise
         return 0.0
 
     # ---- Get Random Numbers -----
-    def genInput():
+    def genInput(rng=random):
         ret = "0.0";
-        x = random.choice(list(FPNumberType))
+        x = rng.choice(list(FPNumberType))
         if x == FPNumberType.normal:
-            n = FP64Input.getNormal()
+            n = FP64Input.getNormal(rng)
         elif x == FPNumberType.subnormal:
-            n = FP64Input.getSubnormal()
+            n = FP64Input.getSubnormal(rng)
         elif x == FPNumberType.almost_overflow:
-            n = FP64Input.getAlmostOverflow()
+            n = FP64Input.getAlmostOverflow(rng)
         elif x == FPNumberType.almost_underflow:
-            n = FP64Input.getAlmostUnderflow()
+            n = FP64Input.getAlmostUnderflow(rng)
         elif x == FPNumberType.zero:
             n = "+0.0"
-            if lucky():
+            if lucky(rng):
                 n = "-0.0"
         else:
             n = ret
@@ -107,51 +115,51 @@ class FP64Input:
         elif exp >= -307 and exp <= -305:
             return FPNumberType.almost_underflow
     
-    def getNormal():
-        exponent = random.randrange(-300, 300)
-        return FP64Input.writeNumber(exponent)
+    def getNormal(rng=random):
+        exponent = rng.randrange(-300, 300)
+        return FP64Input.writeNumber(exponent, rng)
     
-    def getSubnormal():
-        exponent = random.randrange(-323, -309)
-        return FP64Input.writeNumber(exponent)
+    def getSubnormal(rng=random):
+        exponent = rng.randrange(-323, -309)
+        return FP64Input.writeNumber(exponent, rng)
     
-    def getAlmostOverflow():
-        exponent = random.randrange(305, 307)
-        return FP64Input.writeNumber(exponent)
+    def getAlmostOverflow(rng=random):
+        exponent = rng.randrange(305, 307)
+        return FP64Input.writeNumber(exponent, rng)
     
-    def getAlmostUnderflow():
-        exponent = random.randrange(-307, -305)
-        return FP64Input.writeNumber(exponent)
+    def getAlmostUnderflow(rng=random):
+        exponent = rng.randrange(-307, -305)
+        return FP64Input.writeNumber(exponent, rng)
     
-    def writeNumber(exponent):
-        mag = random.uniform(1, 2)
+    def writeNumber(exponent, rng=random):
+        mag = rng.uniform(1, 2)
         mag = str(mag)[0:6]
-        s = FP64Input.getSign()
+        s = FP64Input.getSign(rng)
         ret = s + mag + "E" + str(exponent)
         return ret
     
-    def getSign():
-        if random.randrange(2) == 0:
+    def getSign(rng=random):
+        if rng.randrange(2) == 0:
             return "-";
         else:
             return "+";
 
 class FP32Input:
     
-    def genInput():
+    def genInput(rng=random):
         ret = "0.0";
-        x = random.choice(list(FPNumberType))
+        x = rng.choice(list(FPNumberType))
         if x == FPNumberType.normal:
-            n = FP32Input.getNormal()
+            n = FP32Input.getNormal(rng)
         elif x == FPNumberType.subnormal:
-            n = FP32Input.getSubnormal()
+            n = FP32Input.getSubnormal(rng)
         elif x == FPNumberType.almost_overflow:
-            n = FP32Input.getAlmostOverflow()
+            n = FP32Input.getAlmostOverflow(rng)
         elif x == FPNumberType.almost_underflow:
-            n = FP32Input.getAlmostUnderflow()
+            n = FP32Input.getAlmostUnderflow(rng)
         elif x == FPNumberType.zero:
             n = "+0.0"
-            if lucky():
+            if lucky(rng):
                 n = "-0.0"
         else:
             n = ret
@@ -172,35 +180,151 @@ class FP32Input:
         elif exp >= -37 and exp <= -34:
             return FPNumberType.almost_underflow
     
-    def getNormal():
-        exponent = random.randrange(-30, 30)
-        return FP32Input.writeNumber(exponent)
+    def getNormal(rng=random):
+        exponent = rng.randrange(-30, 30)
+        return FP32Input.writeNumber(exponent, rng)
     
-    def getSubnormal():
-        exponent = random.randrange(-44, -40)
-        return FP32Input.writeNumber(exponent)
+    def getSubnormal(rng=random):
+        exponent = rng.randrange(-44, -40)
+        return FP32Input.writeNumber(exponent, rng)
     
-    def getAlmostOverflow():
-        exponent = random.randrange(34, 37)
-        return FP32Input.writeNumber(exponent)
+    def getAlmostOverflow(rng=random):
+        exponent = rng.randrange(34, 37)
+        return FP32Input.writeNumber(exponent, rng)
     
-    def getAlmostUnderflow():
-        exponent = random.randrange(-37, -34)
-        return FP32Input.writeNumber(exponent)
+    def getAlmostUnderflow(rng=random):
+        exponent = rng.randrange(-37, -34)
+        return FP32Input.writeNumber(exponent, rng)
     
-    def writeNumber(exponent):
-        mag = random.uniform(1, 2)
+    def writeNumber(exponent, rng=random):
+        mag = rng.uniform(1, 2)
         mag = str(mag)[0:6]
-        s = FP32Input.getSign()
+        s = FP32Input.getSign(rng)
         ret = s + mag + "E" + str(exponent)
         return ret
     
-    def getSign():
-        if random.randrange(2) == 0:
+    def getSign(rng=random):
+        if rng.randrange(2) == 0:
             return "-";
         else:
             return "+";
 
+# Generates whole input matrices at once: the values of every sample and
+# input variable of a test are drawn by FP class (the classes of
+# InputGenerator) with NumPy, at bit level, so that all the bits of the
+# mantissas are random (the scalar generator only draws 4 digits).
+class BatchInputGenerator:
+
+    # (total bits, mantissa bits, exponent bias, int and uint types) of the real type
+    def getFormat():
+        if type_checking.areRealsDouble():
+            return (64, 52, 1023, np.float64, np.uint64)
+        return (32, 23, 127, np.float32, np.uint32)
+
+    # Ranges [low, high] of binary exponents of each class, so that the
+    # values fall in the decimal exponent ranges of FP64Input and FP32Input
+    def getExponentRanges():
+        if type_checking.areRealsDouble():
+            decimal = {FPNumberType.normal: (-300, 300), FPNumberType.subnormal: (-323, -309),
+                       FPNumberType.almost_overflow: (305, 307), FPNumberType.almost_underflow: (-307, -305)}
+        else:
+            decimal = {FPNumberType.normal: (-30, 30), FPNumberType.subnormal: (-44, -40),
+                       FPNumberType.almost_overflow: (34, 37), FPNumberType.almost_underflow: (-37, -34)}
+        ret = {}
+        for c, (low, high) in decimal.items():
+            ret[c] = (math.ceil(low * math.log2(10)), math.floor(high * math.log2(10)) - 1)
+        return ret
+
+    def genMatrix(samples, columns, rng=None):
+        """Returns a samples x columns array of random reals of cfg.REAL_TYPE.
+
+        Each value is drawn from an FP class (normal, subnormal, almost
+        overflow, almost underflow or zero) with the same probability, with
+        a random sign and random mantissa bits.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        (bits, mantissaBits, bias, floatType, uintType) = BatchInputGenerator.getFormat()
+        shape = (samples, columns)
+        classes = rng.integers(0, len(FPNumberType), size=shape)
+        sign = rng.integers(0, 2, size=shape, dtype=uintType)
+        mantissa = rng.integers(0, 1 << mantissaBits, size=shape, dtype=uintType)
+        exponentField = np.zeros(shape, dtype=uintType)
+        for c, (low, high) in BatchInputGenerator.getExponentRanges().items():
+            selected = classes == c.value
+            exponents = rng.integers(low, high + 1, size=shape)[selected]
+            if c == FPNumberType.subnormal:
+                # The exponent field is zero and the leading one of the
+                # mantissa gives the exponent: 2^(1 - bias - mantissaBits) is
+                # the smallest subnormal
+                lead = (np.maximum(exponents, 1 - bias - mantissaBits) + bias + mantissaBits - 1).astype(uintType)
+                one = uintType(1)
+                mantissa[selected] = (one << lead) | (mantissa[selected] & ((one << lead) - one))
+            else:
+                exponentField[selected] = (exponents + bias).astype(uintType)
+        mantissa[classes == FPNumberType.zero.value] = 0
+
+        word = (sign << uintType(bits - 1)) | (exponentField << uintType(mantissaBits)) | mantissa
+        return word.view(floatType)
+
+    # Formats a value with enough digits to be read back exactly; zeros
+    # are written like the scalar generator does
+    def formatValue(v, single):
+        if v == 0.0:
+            s = "-0.0" if math.copysign(1.0, v) < 0 else "+0.0"
+        elif single:
+            s = "%+.8E" % v
+        else:
+            s = "%+.16E" % v
+        if single:
+            s = s + "f"
+        return s
+
+    def getRealColumns(types):
+        return len([t for t in types if type_checking.isTypeReal(t) or type_checking.isTypeRealPointer(t)])
+
+    def formatInputs(types, matrix):
+        """Formats the rows of matrix (one column per real in types) as
+        input strings, like run.generateInputs. matrix can also be a list
+        of rows."""
+        single = not type_checking.areRealsDouble()
+        rows = matrix.tolist() if hasattr(matrix, "tolist") else matrix
+        ret = []
+        for row in rows:
+            values = iter(row)
+            line = []
+            for t in types:
+                if type_checking.isTypeReal(t) or type_checking.isTypeRealPointer(t):
+                    line.append(BatchInputGenerator.formatValue(next(values), single))
+                elif t == "int":
+                    line.append("5")
+            ret.append(" ".join(line) + " ")
+        return ret
+
+    def genRows(types, samples, rng=None, batched=True):
+        """Returns the real values of samples inputs for a test with the
+        given types, as a matrix. Falls back to the scalar generator, and
+        a list of rows, when NumPy is not available (or batched is False)."""
+        columns = BatchInputGenerator.getRealColumns(types)
+        if np is not None and batched:
+            return BatchInputGenerator.genMatrix(samples, columns, rng)
+        single = not type_checking.areRealsDouble()
+        ret = []
+        for n in range(samples):
+            row = []
+            for c in range(columns):
+                v = float(InputGenerator.genInput().rstrip("f"))
+                if single:
+                    # Round to the value the executables will read
+                    v = struct.unpack("<f", struct.pack("<f", v))[0]
+                row.append(v)
+            ret.append(row)
+        return ret
+
+    def genInputs(types, samples, rng=None):
+        """Returns samples input strings for a test with the given types."""
+        return BatchInputGenerator.formatInputs(types, BatchInputGenerator.genRows(types, samples, rng))
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Generate floating-point numbers.')
 
@@ -1,6 +1,6 @@
 
 import gen_program
-import random
+import id_generator
 import gen_inputs
 from random_functions import lucky, veryLucky
 import type_checking
@@ -28,16 +28,24 @@ MathFunctions = [
                  "fmod(double,double)"
                  ]
 
+def getAllowedMathFunctions():
+    if not cfg.DISABLED_MATH_FUNCTIONS:
+        return MathFunctions
+    return [f for f in MathFunctions if f.split("(")[0] not in cfg.DISABLED_MATH_FUNCTIONS]
+
 class MathExpression(gen_program.Node):
-    def __init__(self, code="", left=None, right=None):
+    __slots__ = ("parameters",)
+
+    def __init__(self, ctx, code="", left=None, right=None):
         self.code = code
         self.left  = left
         self.right = right
         self.parameters = []
 
-        if cfg.MATH_FUNC_ALLOWED:
-            i = random.randrange(0, len(MathFunctions))
-            func = MathFunctions[i]
+        functions = getAllowedMathFunctions()
+        if cfg.MATH_FUNC_ALLOWED and len(functions) > 0:
+            i = ctx.rng.randrange(0, len(functions))
+            func = functions[i]
         else:
             func = " (double)"
         
@@ -48,23 +56,42 @@ class MathExpression(gen_program.Node):
         types = func[:-1].split("(")[1].split(",")
         for t in types:
             if t == "double":
-                if veryLucky():
-                    self.parameters.append(gen_inputs.InputGenerator.genInput() )
+                if veryLucky(ctx.rng):
+                    self.parameters.append(gen_program.Literal(gen_inputs.InputGenerator.genInput(ctx.rng)))
                 else:
-                    self.parameters.append(gen_program.Expression())
+                    self.parameters.append(gen_program.Expression(ctx))
             elif t == "int":
                 self.parameters.append("2")
 
+    def materialize(self):
+        for p in self.parameters:
+            if isinstance(p, gen_program.Expression):
+                p.materialize()
+
     def printCode(self):
         params = []
         for p in self.parameters:
             if isinstance(p, str):
                 params.append(p)
+            elif isinstance(p, gen_program.Literal):
+                params.append(p.printCode())
             else:
                 params.append(p.printCode(False))
         ret = self.code + "(" + ", ".join(params) + ")"
         return ret
 
+    def structuralTokens(self, out):
+        out.append(self.code + "(")
+        for p in self.parameters:
+            if isinstance(p, str):
+                out.append(p)
+            elif isinstance(p, gen_program.Literal):
+                p.structuralTokens(out)
+            else:
+                p.structuralTokens(out, False)
+            out.append(",")
+        out.append(")")
+
 if __name__ == "__main__":
-    m = MathExpression()
+    m = MathExpression(id_generator.GenerationContext())
     print(m.printCode())
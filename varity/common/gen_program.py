@@ -4,15 +4,22 @@ import gen_inputs
 import cfg
 
 from enum import Enum
-import random
 import subprocess
+import hashlib
 
+import random_functions
+import output_format
+import literal_classes
 from random_functions import lucky, veryLucky, generateMathExpression
 from type_checking import getTypeString, isTypeReal, isTypeRealPointer, isTypeInt
 
 
-# Basic node in a tree
+# Basic node in a tree.
+# Nodes are created in large numbers (dedup and mutation corpora keep many
+# programs alive), so every node class declares __slots__.
 class Node:
+    __slots__ = ("code", "left", "right")
+
     def __init__(self, code, left=None, right=None):
         self.code = code
         self.left = left
@@ -24,6 +31,64 @@ class Node:
     def printCode(self) -> str:
         return "{};\n"
 
+    # Random choices that are made when the code is printed (the leaves of
+    # expressions, the bodies of the innermost blocks) are drawn here
+    # instead, in the order printing would draw them.
+    def materialize(self):
+        pass
+
+    # Appends to out the tokens of the structure of the node: variable
+    # numbers and literal values are left out, the classes of the literals
+    # (ZERO, NORMAL, SUBNORMAL, ...) are kept.
+    def structuralTokens(self, out):
+        out.append(str(self.code))
+
+    def structuralHash(self) -> bytes:
+        tokens = []
+        self.structuralTokens(tokens)
+        return hashlib.sha256("\0".join(tokens).encode()).digest()
+
+
+# A real literal in an expression
+class Literal(Node):
+    __slots__ = ()
+
+    def __init__(self, code):
+        self.code = code
+        self.left = None
+        self.right = None
+
+    def printCode(self) -> str:
+        return self.code
+
+    def structuralTokens(self, out):
+        out.append(literal_classes.getLiteralClass(self.code))
+
+
+# A variable in an expression (an input of compute or a temporal variable)
+class Variable(Node):
+    __slots__ = ()
+
+    def __init__(self, code):
+        self.code = code
+        self.left = None
+        self.right = None
+
+    def printCode(self) -> str:
+        return self.code
+
+    def structuralTokens(self, out):
+        out.append(getStructuralName(self.code))
+
+
+# Name of a variable without its number: VAR, VAR[i] or TMP
+def getStructuralName(name):
+    if name.startswith("tmp_"):
+        return "TMP"
+    if name.endswith("[i]"):
+        return "VAR[i]"
+    return "VAR"
+
 
 # Types of binary operations
 class BinaryOperationType(Enum):
@@ -34,13 +99,17 @@ class BinaryOperationType(Enum):
 
 
 class BinaryOperation(Node):
-    def __init__(self, code="", left=None, right=None):
+    __slots__ = ("ctx", "parenthesis")
+
+    def __init__(self, ctx, code="", left=None, right=None):
+        self.ctx = ctx
         self.code = code
         self.left = left
         self.right = right
+        self.parenthesis = False
 
     def generate(self):
-        op = random.choice(list(BinaryOperationType))
+        op = self.ctx.rng.choice(list(BinaryOperationType))
         if op == BinaryOperationType.add:
             self.code = " + "
         elif op == BinaryOperationType.sub:
@@ -55,29 +124,33 @@ class BinaryOperation(Node):
 
 
 class Expression(Node):
-    rootNode = None
+    __slots__ = ("ctx", "varToBeUsed", "rootNode", "prefixOperations", "materialized")
 
-    def __init__(self, code="=", left=None, right=None, varToBeUsed=None):
+    def __init__(self, ctx, code="=", left=None, right=None, varToBeUsed=None):
         import gen_math_exp
+        self.ctx = ctx
         self.left = left
         self.right = right
         self.varToBeUsed = varToBeUsed
+        self.rootNode = None
+        self.prefixOperations = []
+        self.materialized = False
 
-        if lucky():
+        if lucky(ctx.rng):
             self.code = code
         else:
             self.code = "+" + code
 
-        size = random.randrange(1, cfg.MAX_EXPRESSION_SIZE)
+        size = ctx.rng.randrange(1, cfg.MAX_EXPRESSION_SIZE)
 
         lastOp = None
         mathExpTerminator = None
         while (size >= 1):
-            if generateMathExpression():
-                op = gen_math_exp.MathExpression()
+            if generateMathExpression(ctx.rng):
+                op = gen_math_exp.MathExpression(ctx)
                 mathExpTerminator = True
             else:
-                op = BinaryOperation()
+                op = BinaryOperation(ctx)
                 op.generate()
 
             if lastOp != None:
@@ -91,30 +164,51 @@ class Expression(Node):
             if mathExpTerminator == True:
                 break
 
-    def total(self, n):
-        import gen_math_exp
+    # Draws the leaves and parenthesis of the tree, and the operations that
+    # combine the variables to be used with the expression
+    def materialize(self):
+        if self.materialized:
+            return
+        self.materialized = True
+        self.rootNode = self.materializeTerm(self.rootNode)
+        if self.varToBeUsed != None:
+            for v in self.varToBeUsed:
+                op = BinaryOperation(self.ctx)
+                op.generate()
+                self.prefixOperations.append(op)
+
+    def materializeTerm(self, n):
         if n == None:
-            if lucky():
-                n = gen_inputs.InputGenerator.genInput()
-            else:
-                n = id_generator.IdGenerator.get().generateRealID()
-            return n
+            if lucky(self.ctx.rng):
+                return Literal(gen_inputs.InputGenerator.genInput(self.ctx.rng))
+            return Variable(self.ctx.ids.generateRealID())
         elif isinstance(n, str):
             return n
-        elif isinstance(n, gen_math_exp.MathExpression):
+        elif not isinstance(n, BinaryOperation):
+            n.materialize()
+            return n
+
+        n.left = self.materializeTerm(n.left)
+        n.right = self.materializeTerm(n.right)
+        n.parenthesis = lucky(self.ctx.rng)
+        return n
+
+    def total(self, n):
+        if isinstance(n, str):
+            return n
+        elif not isinstance(n, BinaryOperation):
             return n.printCode()
 
         ret = Expression.total(self, n.left) + n.code + Expression.total(self, n.right)
-        if lucky():
+        if n.parenthesis:
             return '(' + ret + ')'
         return ret
 
     def printCode(self, assignment=True) -> str:
+        self.materialize()
         t = Expression.total(self, self.rootNode)
         if self.varToBeUsed != None:
-            for v in self.varToBeUsed:
-                op = BinaryOperation()
-                op.generate()
+            for v, op in zip(self.varToBeUsed, self.prefixOperations):
                 t = v + op.printCode() + t
 
         if assignment == True:
@@ -122,22 +216,49 @@ class Expression(Node):
         else:
             return t
 
+    def structuralTerm(self, n, out):
+        if isinstance(n, str):
+            out.append(n)
+        elif not isinstance(n, BinaryOperation):
+            n.structuralTokens(out)
+        else:
+            if n.parenthesis:
+                out.append("(")
+            self.structuralTerm(n.left, out)
+            out.append(n.code.strip())
+            self.structuralTerm(n.right, out)
+            if n.parenthesis:
+                out.append(")")
+
+    def structuralTokens(self, out, assignment=True):
+        self.materialize()
+        if assignment:
+            out.append("comp" + self.code)
+        # Printed as v1 op1 (v2 op2 (... t)) without parenthesis
+        if self.varToBeUsed != None:
+            for v, op in reversed(list(zip(self.varToBeUsed, self.prefixOperations))):
+                out.append(getStructuralName(v))
+                out.append(op.code.strip())
+        self.structuralTerm(self.rootNode, out)
+
 
 class VariableDefinition(Node):
-    def __init__(self, code=" = ", left=None, right=None, isPointer=False):
+    __slots__ = ("isPointer",)
+
+    def __init__(self, ctx, code=" = ", left=None, right=None, isPointer=False):
         self.code = code
         self.right = right
         self.isPointer = isPointer
 
         if isPointer == True:
-            self.left = id_generator.IdGenerator.get().generateRealID(True) + "[i]"
+            self.left = ctx.ids.generateRealID(True) + "[i]"
         else:
-            self.left = getTypeString() + " " + id_generator.IdGenerator.get().generateTempRealID()
+            self.left = getTypeString() + " " + ctx.ids.generateTempRealID()
 
-        if lucky():  # constant definition
-            self.right = gen_inputs.InputGenerator.genInput()
+        if lucky(ctx.rng):  # constant definition
+            self.right = Literal(gen_inputs.InputGenerator.genInput(ctx.rng))
         else:
-            self.right = Expression()
+            self.right = Expression(ctx)
 
     def getVarName(self):
         if self.isPointer == False:
@@ -145,23 +266,40 @@ class VariableDefinition(Node):
         else:
             return self.left
 
+    def materialize(self):
+        self.right.materialize()
+
     def printCode(self) -> str:
-        if isinstance(self.right, str):
-            c = self.right
+        if isinstance(self.right, Literal):
+            c = self.right.printCode()
         else:
             c = self.right.printCode(False)
         return self.left + self.code + c + ";"
 
+    def structuralTokens(self, out):
+        if self.isPointer:
+            out.append("VAR[i]")
+        else:
+            out.append(getTypeString() + " TMP")
+        out.append("=")
+        if isinstance(self.right, Literal):
+            self.right.structuralTokens(out)
+        else:
+            self.right.structuralTokens(out, False)
+        out.append(";")
+
 
 # A non-recursive block has only expressions (it does not have if-blocks or loop-blocks)
 class OperationsBlock(Node):
-    def __init__(self, code="", left=None, right=None, inLoop=False, recursive=True):
+    __slots__ = ()
+
+    def __init__(self, ctx, code="", left=None, right=None, inLoop=False, recursive=True):
         self.code = code
         self.left = left
         self.right = right
 
         # Defines the number of lines that the block will have
-        lines = random.randrange(1, cfg.MAX_LINES_IN_BLOCK + 1)
+        lines = ctx.rng.randrange(1, cfg.MAX_LINES_IN_BLOCK + 1)
         assert lines > 0
 
         # In the block, we either have definitions of new variables or 
@@ -169,28 +307,28 @@ class OperationsBlock(Node):
         # an assigment from an expression:
         #    comp = ...
         if lines == 1:
-            self.left = [Expression()]
+            self.left = [Expression(ctx)]
         else:
             i = 1
             varsToBeUsed = []
             l = []
             while (i <= lines):
 
-                if lucky() or i == lines:  # expression with assigment
+                if lucky(ctx.rng) or i == lines:  # expression with assigment
                     c = None
                     if len(varsToBeUsed) > 0:
-                        c = Expression("=", None, None, varsToBeUsed[:])
+                        c = Expression(ctx, "=", None, None, varsToBeUsed[:])
                         varsToBeUsed.clear()
                     else:
-                        c = Expression()
+                        c = Expression(ctx)
                     l.append(c)
                     if i == lines:
                         break
                 else:
-                    if inLoop == True and lucky():
-                        v = VariableDefinition(isPointer=True)
+                    if inLoop == True and lucky(ctx.rng):
+                        v = VariableDefinition(ctx, isPointer=True)
                     else:
-                        v = VariableDefinition()
+                        v = VariableDefinition(ctx)
                     l.append(v)
                     varsToBeUsed.append(v.getVarName())
                 i = i + 1
@@ -198,21 +336,31 @@ class OperationsBlock(Node):
 
         # An operations block can also have if-conditions and loop blocks
         if recursive:
-            nBlocks = random.randrange(0, cfg.MAX_SAME_LEVEL_BLOCKS + 1)
+            nBlocks = ctx.rng.randrange(0, cfg.MAX_SAME_LEVEL_BLOCKS + 1)
             # nBlocks = 2
             for k in range(nBlocks):
-                if lucky():
-                    b = IfConditionBlock(recursive=False)
+                if lucky(ctx.rng):
+                    b = IfConditionBlock(ctx, recursive=False)
                 else:
-                    b = ForLoopBlock(recursive=False)
+                    b = ForLoopBlock(ctx, recursive=False)
                 self.left.append(b)
 
+    def materialize(self):
+        for l in self.left:
+            l.materialize()
+
     def printCode(self) -> str:
         ret = []
         for l in self.left:
             ret.append(l.printCode())
         return "\n".join(ret)
 
+    def structuralTokens(self, out):
+        for l in self.left:
+            l.structuralTokens(out)
+            if isinstance(l, Expression):
+                out.append(";")
+
 
 # Types of binary operations
 class BooleanExpressionType(Enum):
@@ -224,9 +372,10 @@ class BooleanExpressionType(Enum):
 
 
 class BooleanExpression(Node):
-    def __init__(self, code="==", left=None, right=None):
-        # self.idGen = idGen
-        op = random.choice(list(BooleanExpressionType))
+    __slots__ = ()
+
+    def __init__(self, ctx, code="==", left=None, right=None):
+        op = ctx.rng.choice(list(BooleanExpressionType))
         if op == BooleanExpressionType.eq:
             self.code = " == "
         elif op == BooleanExpressionType.lt:
@@ -238,39 +387,65 @@ class BooleanExpression(Node):
         elif op == BooleanExpressionType.leq:
             self.code = " <= "
 
-        self.left = "comp"
-        self.right = Expression()
+        self.left = Variable("comp")
+        self.right = Expression(ctx)
+
+    def materialize(self):
+        self.right.materialize()
 
     def printCode(self) -> str:
-        return self.left + self.code + self.right.printCode(False)
+        return self.left.printCode() + self.code + self.right.printCode(False)
+
+    def structuralTokens(self, out):
+        out.append("comp")
+        out.append(self.code.strip())
+        self.right.structuralTokens(out, False)
 
 
 class ForLoopCondition(Node):
-    def __init__(self, code="", left=None, right=None):
-        self.code = "int i=0; i < " + id_generator.IdGenerator.get().generateIntID() + "; ++i"
+    __slots__ = ()
+
+    def __init__(self, ctx, code="", left=None, right=None):
+        # The loop runs over the integer input variable in left
+        self.code = code
+        self.left = Variable(ctx.ids.generateIntID())
+        self.right = None
 
     def printCode(self) -> str:
-        return self.code
+        return "int i=0; i < " + self.left.printCode() + "; ++i"
+
+    def structuralTokens(self, out):
+        out.append("i <")
+        self.left.structuralTokens(out)
 
 
 class IfConditionBlock(Node):
-    def __init__(self, level=1, code=None, left=None, right=None, recursive=True):
+    __slots__ = ("ctx", "level", "identation", "rec")
+
+    def __init__(self, ctx, level=1, code=None, left=None, right=None, recursive=True):
+        self.ctx = ctx
         self.level = level
         self.identation = ''
         self.identation += '  ' * self.level
         self.rec = recursive
 
         # Generate code of the boolean expresion (default)
-        self.code = BooleanExpression()
+        self.code = BooleanExpression(ctx)
 
         # Generate code inside the block
         self.left = left
         self.right = "break;"
 
+    # The body of the innermost block is generated after its condition
+    def materialize(self):
+        self.code.materialize()
+        if self.left == None:
+            self.left = OperationsBlock(self.ctx, recursive=self.rec)
+        self.left.materialize()
+
     def printCode(self) -> str:
+        self.materialize()
         t = "if (" + self.code.printCode() + ") {\n"
-        if self.left == None:
-            self.left = OperationsBlock(recursive=self.rec)
         t = t + self.identation + self.left.printCode() + "\n"
         t = t + "}"
         return t
@@ -278,24 +453,38 @@ class IfConditionBlock(Node):
     def setContent(self, c):
         self.left = c
 
+    def structuralTokens(self, out):
+        out.append("if")
+        self.code.structuralTokens(out)
+        out.append("{")
+        self.left.structuralTokens(out)
+        out.append("}")
+
 
 class ForLoopBlock(Node):
-    def __init__(self, level=1, code=None, left=None, right=None, recursive=True):
+    __slots__ = ("ctx", "level", "identation", "rec")
+
+    def __init__(self, ctx, level=1, code=None, left=None, right=None, recursive=True):
+        self.ctx = ctx
         self.level = level
         self.identation = ''
         self.identation += '  ' * self.level
         self.rec = recursive
 
         # Generate code of the loop condition
-        self.code = ForLoopCondition()
+        self.code = ForLoopCondition(ctx)
         # self.left = OperationsBlock()
         self.left = left
         self.right = None
 
+    def materialize(self):
+        if self.left == None:
+            self.left = OperationsBlock(self.ctx, inLoop=True, recursive=self.rec)
+        self.left.materialize()
+
     def printCode(self) -> str:
+        self.materialize()
         t = "for (" + self.code.printCode() + ") {\n"
-        if self.left == None:
-            self.left = OperationsBlock(inLoop=True, recursive=self.rec)
         t = t + self.identation + self.left.printCode() + "\n"
         t = t + "}"
         return t
@@ -303,6 +492,13 @@ class ForLoopBlock(Node):
     def setContent(self, c):
         self.left = c
 
+    def structuralTokens(self, out):
+        out.append("for")
+        self.code.structuralTokens(out)
+        out.append("{")
+        self.left.structuralTokens(out)
+        out.append("}")
+
 
 class CodeBlock(Enum):
     expression = 1
@@ -314,9 +510,11 @@ class CodeBlock(Enum):
 
 class FunctionCall(Node):
     # global MAX_NESTING_LEVELS
+    __slots__ = ("ctx", "codeCache")
 
-    def __init__(self, code=None, left=None, right=None):
+    def __init__(self, ctx, code=None, left=None, right=None):
         # self.device = device
+        self.ctx = ctx
         self.code = None
         self.left = None
         self.right = "}\n"
@@ -324,14 +522,14 @@ class FunctionCall(Node):
         self.codeCache = None  # If the code was printed will be saved here
 
         # Sample the blocks and levels of the function
-        levels = random.randrange(1, cfg.MAX_NESTING_LEVELS + 1)
+        levels = ctx.rng.randrange(1, cfg.MAX_NESTING_LEVELS + 1)
         # levels = 2
         # print("levels: {}".format(levels))
         lastBlock = None
 
         blocks = []
         while (levels >= 1):
-            b = random.choice(list(CodeBlock))
+            b = ctx.rng.choice(list(CodeBlock))
             blocks.append(b)
             levels = levels - 1
 
@@ -339,7 +537,7 @@ class FunctionCall(Node):
         for i in range(len(blocks)):
             b = blocks[i]
             if b == CodeBlock.expression:
-                c = OperationsBlock()
+                c = OperationsBlock(ctx)
                 if lastBlock != None:
                     lastBlock.setContent(c)
 
@@ -350,7 +548,7 @@ class FunctionCall(Node):
                 break
 
             elif b == CodeBlock.if_codition:
-                c = IfConditionBlock(i + 1)
+                c = IfConditionBlock(ctx, i + 1)
                 if lastBlock != None:
                     lastBlock.setContent(c)
                 lastBlock = c
@@ -360,7 +558,7 @@ class FunctionCall(Node):
                     self.left = c
 
             elif b == CodeBlock.for_loop:
-                c = ForLoopBlock(i + 1)
+                c = ForLoopBlock(ctx, i + 1)
                 if lastBlock != None:
                     lastBlock.setContent(c)
                 lastBlock = c
@@ -369,64 +567,239 @@ class FunctionCall(Node):
                 if self.left == None:
                     self.left = c
 
-    def printHeader(self):
-        h = ""
+    def printHeader(self, returnValue=False, name="compute"):
+        h = []
         # if self.device == True:
-        #    h = h + "__global__ "
-        h = h + "void compute("
-        h = h + getTypeString() + " comp"
-        if len(id_generator.IdGenerator.get().printAllVars()) > 0:
-            h = h + ", "
-        h = h + ",".join(id_generator.IdGenerator.get().printAllVars())
-        h = h + ") {\n"
-        return h
+        #    h.append("__global__ ")
+        if returnValue:
+            h.append(getTypeString() + " " + name + "(")
+        else:
+            h.append("void " + name + "(")
+        h.append(getTypeString() + " comp")
+        allVars = self.ctx.ids.printAllVars()
+        if len(allVars) > 0:
+            h.append(", ")
+        h.append(",".join(allVars))
+        h.append(") {\n")
+        return "".join(h)
 
     def writePrintStatement(self):
-        return '\n   printf("%.17g\\n", comp);\n'
+        return output_format.getPrintStatement()
 
-    def printCode(self) -> str:
-        if self.codeCache != None:
-            return self.codeCache
+    def writeReturnStatement(self):
+        return '\n   return comp;\n'
 
-        c = self.left.printCode()
-        c = self.printHeader() + c
-        c = c + self.writePrintStatement()
-        c = c + "\n}"
-        self.codeCache = c
-        return c
+    # With returnValue, compute returns comp instead of printing it
+    # (used for the shared-library target).
+    def printCode(self, returnValue=False, name="compute") -> str:
+        body = self.printBody()
+        if returnValue:
+            end = self.writeReturnStatement()
+        else:
+            end = self.writePrintStatement()
+        return "".join([self.printHeader(returnValue, name), body, end, "\n}"])
+
+    # The body is printed once and reused, so that all the targets share the
+    # same function. Materializing the body generates the input variables,
+    # so it must happen before anything that lists them.
+    def printBody(self) -> str:
+        if self.codeCache == None:
+            self.codeCache = self.left.printCode()
+        return self.codeCache
+
+    def materialize(self):
+        self.left.materialize()
+
+    def structuralTokens(self, out):
+        self.materialize()
+        out.append("compute(")
+        out.extend(self.ctx.ids.printAllTypes())
+        out.append(")")
+        self.left.structuralTokens(out)
+
+
+TEST_BANNER = "\n/* This is an automatically generated test. Do not modify */\n\n"
+
+
+def printPointerInitFunction(target="c"):
+    if target == "cuda":
+        ret = getTypeString() + "* initPointer(" + getTypeString() + " v) {\n"
+        ret += "    " + getTypeString() + " *ret;\n"
+        ret += "    cudaError_t err = cudaMalloc((void**)&ret, sizeof(" + getTypeString() + ")*" + str(
+            cfg.ARRAY_SIZE) + ");\n"
+        ret += "    if (err != cudaSuccess) {\n"
+        ret += "        printf(\"cudaMalloc failed: %s\\n\", cudaGetErrorString(err));\n"
+        ret += "        return NULL;\n"
+        ret += "    }\n"
+        if cfg.REAL_TYPE == "double":
+            ret += "    double temp[" + str(cfg.ARRAY_SIZE) + "];\n"
+        else:
+            ret += "    float temp[" + str(cfg.ARRAY_SIZE) + "];\n"
+        ret += "    for(int i=0; i < " + str(cfg.ARRAY_SIZE) + "; ++i)\n"
+        ret += "        temp[i] = v;\n"
+        if cfg.REAL_TYPE == "double":
+            ret += "    cudaMemcpy(ret, temp, sizeof(double) * " + str(
+                cfg.ARRAY_SIZE) + ", cudaMemcpyHostToDevice);\n"
+        else:
+            ret += "    cudaMemcpy(ret, temp, sizeof(float) * " + str(
+                cfg.ARRAY_SIZE) + ", cudaMemcpyHostToDevice);\n"
+        ret += "    return ret;\n"
+        ret += "}"
+    elif target == "hip":
+        ret = getTypeString() + "* initPointer(" + getTypeString() + " v) {\n"
+        ret += "    " + getTypeString() + " *ret;\n"
+        ret += "    hipError_t err = hipMalloc(&ret, sizeof(" + getTypeString() + ")*" + str(
+            cfg.ARRAY_SIZE) + ");\n"
+        ret += "    if (err != hipSuccess) {\n"
+        ret += "        printf(\"hipMalloc failed: %s\\n\", hipGetErrorString(err));\n"
+        ret += "        return NULL;\n"
+        ret += "    }\n"
+        if cfg.REAL_TYPE == "double":
+            ret += "    double temp[" + str(cfg.ARRAY_SIZE) + "];\n"
+        else:
+            ret += "    float temp[" + str(cfg.ARRAY_SIZE) + "];\n"
+        ret += "    for(int i=0; i < " + str(cfg.ARRAY_SIZE) + "; ++i)\n"
+        ret += "        temp[i] = v;\n"
+        if cfg.REAL_TYPE == "double":
+            ret += "    err = hipMemcpy(ret, temp, sizeof(double) * " + str(
+                cfg.ARRAY_SIZE) + ", hipMemcpyHostToDevice);\n"
+        else:
+            ret += "    err = hipMemcpy(ret, temp, sizeof(float) * " + str(
+                cfg.ARRAY_SIZE) + ", hipMemcpyHostToDevice);\n"
+        ret += "    if (err != hipSuccess) {\n"
+        ret += "        printf(\"hipMemcpy failed: %s\", hipGetErrorString(err));\n"
+        ret += "        return NULL;\n"
+        ret += "    }\n"
+        ret += "    return ret;\n"
+        ret += "}"
+    else:
+        ret = getTypeString() + "* initPointer(" + getTypeString() + " v) {\n"
+        ret += "    " + getTypeString() + " *ret = "
+        ret += "(" + getTypeString() + "*) malloc(sizeof(" + getTypeString() + ")*" + str(cfg.ARRAY_SIZE) + ");\n"
+        ret += "    for(int i=0; i < " + str(cfg.ARRAY_SIZE) + "; ++i)\n"
+        ret += "        ret[i] = v;\n"
+        ret += "    return ret;\n"
+        ret += "}"
+    return ret
+
+
+# The driver runs a single input vector given in argv, or reads one
+# input vector per line from stdin when no arguments are given, so a
+# single process can run all the input samples of a test. n is the number
+# of inputs (a C expression), and prologue is code that runs first.
+def printMultiInputMain(n, prologue=""):
+    ret = "\nint main(int argc, char** argv) {\n"
+    ret += prologue
+    ret += "  if (argc > 1) {\n"
+    ret += "    runTest(argv);\n"
+    ret += "    return 0;\n"
+    ret += "  }\n\n"
+    ret += "  static char line[65536];\n"
+    ret += "  char* args[" + n + " + 1];\n"
+    ret += "  args[0] = argv[0];\n"
+    ret += "  while (fgets(line, sizeof(line), stdin) != NULL) {\n"
+    ret += "    int n = 1;\n"
+    ret += '    for (char* tok = strtok(line, " \\t\\r\\n"); tok != NULL && n <= ' + n + '; '
+    ret += 'tok = strtok(NULL, " \\t\\r\\n"))\n'
+    ret += "      args[n++] = tok;\n"
+    ret += "    if (n <= " + n + ")\n"
+    ret += "      continue;\n"
+    ret += "    runTest(args);\n"
+    ret += "    fflush(stdout);\n"
+    ret += "  }\n"
+    ret += "  return 0;\n"
+    ret += "}\n"
+    return ret
+
+
+# Driver shared by the tests of a campaign with the split layout
+# (cfg.SHARED_DRIVER): main and initPointer are compiled once per compiler,
+# and linked with the kernel source of each test, which defines compute,
+# runTest and numInputs.
+def printSharedDriver():
+    c = [TEST_BANNER, "#include <stdio.h>\n", "#include <stdlib.h>\n", "#include <string.h>\n\n",
+         "extern int numInputs;\n", "void runTest(char** argv);\n\n",
+         printPointerInitFunction("c"), "\n", printMultiInputMain("numInputs")]
+    return "".join(c)
+
+
+# Program of a batch (cfg.BATCH_SIZE): the kernels of several tests, given as
+# (test number, code of the "batch" target) pairs, and a main that runs the
+# kernel of the test whose executable it is started as (_test_N.c-*).
+def printBatchProgram(kernels):
+    c = [TEST_BANNER, "#include <stdio.h>\n", "#include <stdlib.h>\n", "#include <string.h>\n",
+         "#include <math.h>\n\n", printPointerInitFunction("c"), "\n"]
+    for (number, code) in kernels:
+        c.append("\n")
+        c.append(code)
+
+    prologue = ["  /* The kernel is selected by the test number in the name of the program */\n",
+                "  const char* name = strrchr(argv[0], '/');\n",
+                "  name = name != NULL ? name + 1 : argv[0];\n",
+                '  int test = strncmp(name, "_test_", 6) == 0 ? atoi(name + 6) : 0;\n',
+                "  void (*runTest)(char**) = NULL;\n",
+                "  int numInputs = 0;\n",
+                "  switch (test) {\n"]
+    for (number, code) in kernels:
+        prologue.append("    case " + str(number) + ": runTest = runTest_" + str(number) + "; numInputs = numInputs_" +
+                        str(number) + "; break;\n")
+    prologue += ["  }\n",
+                 "  if (runTest == NULL) {\n",
+                 '    fprintf(stderr, "No test %d in this batch\\n", test);\n',
+                 "    return 2;\n",
+                 "  }\n\n"]
+    c.append(printMultiInputMain("numInputs", "".join(prologue)))
+    return "".join(c)
 
 
 class Program():
-    def __init__(self):
-        id_generator.IdGenerator.get().clear()
-        self.func = FunctionCall()
+    def __init__(self, ctx=None):
+        if ctx is None:
+            ctx = id_generator.GenerationContext()
+        self.ctx = ctx
+        self.func = FunctionCall(ctx)
+        self.func.materialize()
+
+    # Hash of the structure of compute, which ignores the numbering of the
+    # variables and the values of the literals but keeps their classes
+    def structuralHash(self) -> bytes:
+        return self.func.structuralHash()
 
     def printInputVariables(self):
-        ret = ""
-        vars = id_generator.IdGenerator.get().getVarsList()
+        vars = self.ctx.ids.getVarsList()
+        realType = getTypeString()
 
-        ret = ret + "  " + getTypeString() + " " + "tmp_1 = atof(argv[1]);\n"
+        ret = ["  " + realType + " " + "tmp_1 = atof(argv[1]);\n"]
         idNum = 2
-        for k in vars.keys():
-            type = vars[k]
+        for type in vars.values():
+            n = str(idNum)
             if (isTypeReal(type)):
-                ret = ret + "  " + getTypeString() + " " + "tmp_" + str(idNum)
-                ret = ret + " = atof(argv[" + str(idNum) + "]);\n"
+                ret.append("  " + realType + " tmp_" + n + " = atof(argv[" + n + "]);\n")
             elif (isTypeInt(type)):
-                ret = ret + "  int " + "tmp_" + str(idNum)
-                ret = ret + " = atoi(argv[" + str(idNum) + "]);\n"
+                ret.append("  int tmp_" + n + " = atoi(argv[" + n + "]);\n")
             elif (isTypeRealPointer(type)):
-                ret = ret + "  " + type + " " + "tmp_" + str(idNum)
-                ret = ret + " = initPointer( atof(argv[" + str(idNum) + "]) );\n"
+                ret.append("  " + type + " tmp_" + n + " = initPointer( atof(argv[" + n + "]) );\n")
 
             idNum = idNum + 1
 
-        ret = ret + "\n"
-        return ret
+        ret.append("\n")
+        return "".join(ret)
+
+    # The pointers of printInputVariables are freed after each input vector
+    # of the multi-input driver
+    def printFreePointers(self, target="c"):
+        free = {"cuda": "cudaFree", "hip": "hipFree"}.get(target, "free")
+        ret = []
+        idNum = 2
+        for type in self.ctx.ids.getVarsList().values():
+            if isTypeRealPointer(type):
+                ret.append("  " + free + "(tmp_" + str(idNum) + ");\n")
+            idNum = idNum + 1
+        return "".join(ret)
 
     def printFunctionParameters(self):
         vars = []
-        for k in range(len(id_generator.IdGenerator.get().getVarsList()) + 1):
+        for k in range(len(self.ctx.ids.getVarsList()) + 1):
             vars.append("tmp_" + str(k + 1))
         return ",".join(vars)
 
@@ -439,105 +812,118 @@ class Program():
     #     ret = ret + "  return ret;\n"
     #     ret = ret + "}"
     #     return ret
-    def printPointerInitFunction(self):
-        if self.device and not self.hip:
-            ret = getTypeString() + "* initPointer(" + getTypeString() + " v) {\n"
-            ret += "    " + getTypeString() + " *ret;\n"
-            ret += "    cudaError_t err = cudaMalloc((void**)&ret, sizeof(" + getTypeString() + ")*" + str(
-                cfg.ARRAY_SIZE) + ");\n"
-            ret += "    if (err != cudaSuccess) {\n"
-            ret += "        printf(\"cudaMalloc failed: %s\\n\", cudaGetErrorString(err));\n"
-            ret += "        return NULL;\n"
-            ret += "    }\n"
-            if cfg.REAL_TYPE == "double":
-                ret += "    double temp[" + str(cfg.ARRAY_SIZE) + "];\n"
-            else:
-                ret += "    float temp[" + str(cfg.ARRAY_SIZE) + "];\n"
-            ret += "    for(int i=0; i < " + str(cfg.ARRAY_SIZE) + "; ++i)\n"
-            ret += "        temp[i] = v;\n"
-            if cfg.REAL_TYPE == "double":
-                ret += "    cudaMemcpy(ret, temp, sizeof(double) * " + str(
-                    cfg.ARRAY_SIZE) + ", cudaMemcpyHostToDevice);\n"
-            else:
-                ret += "    cudaMemcpy(ret, temp, sizeof(float) * " + str(
-                    cfg.ARRAY_SIZE) + ", cudaMemcpyHostToDevice);\n"
-            ret += "    return ret;\n"
-            ret += "}"
-        elif self.hip:
-            ret = getTypeString() + "* initPointer(" + getTypeString() + " v) {\n"
-            ret += "    " + getTypeString() + " *ret;\n"
-            ret += "    hipError_t err = hipMalloc(&ret, sizeof(" + getTypeString() + ")*" + str(
-                cfg.ARRAY_SIZE) + ");\n"
-            ret += "    if (err != hipSuccess) {\n"
-            ret += "        printf(\"hipMalloc failed: %s\\n\", hipGetErrorString(err));\n"
-            ret += "        return NULL;\n"
-            ret += "    }\n"
-            if cfg.REAL_TYPE == "double":
-                ret += "    double temp[" + str(cfg.ARRAY_SIZE) + "];\n"
-            else:
-                ret += "    float temp[" + str(cfg.ARRAY_SIZE) + "];\n"
-            ret += "    for(int i=0; i < " + str(cfg.ARRAY_SIZE) + "; ++i)\n"
-            ret += "        temp[i] = v;\n"
-            if cfg.REAL_TYPE == "double":
-                ret += "    err = hipMemcpy(ret, temp, sizeof(double) * " + str(
-                    cfg.ARRAY_SIZE) + ", hipMemcpyHostToDevice);\n"
-            else:
-                ret += "    err = hipMemcpy(ret, temp, sizeof(float) * " + str(
-                    cfg.ARRAY_SIZE) + ", hipMemcpyHostToDevice);\n"
-            ret += "    if (err != hipSuccess) {\n"
-            ret += "        printf(\"hipMemcpy failed: %s\", hipGetErrorString(err));\n"
-            ret += "        return NULL;\n"
-            ret += "    }\n"
-            ret += "    return ret;\n"
-            ret += "}"
-        else:
-            ret = getTypeString() + "* initPointer(" + getTypeString() + " v) {\n"
-            ret += "    " + getTypeString() + " *ret = "
-            ret += "(" + getTypeString() + "*) malloc(sizeof(" + getTypeString() + ")*" + str(cfg.ARRAY_SIZE) + ");\n"
-            ret += "    for(int i=0; i < " + str(cfg.ARRAY_SIZE) + "; ++i)\n"
-            ret += "        ret[i] = v;\n"
-            ret += "    return ret;\n"
-            ret += "}"
-        return ret
-
-    def printHeader(self):
-        h = "\n/* This is an automatically generated test. Do not modify */\n\n"
-        if self.hip:
-            h = h + "#include <hip/hip_runtime.h>\n"
-        h = h + "#include <stdio.h>\n"
-        h = h + "#include <stdlib.h>\n"
-        h = h + "#include <math.h>\n\n"
-        if self.device or self.hip:
-            h = h + "__global__\n"
-        h = h + self.func.printCode()
-        h = h + "\n" + self.printPointerInitFunction()
-        h = h + "\n\nint main(int argc, char** argv) {\n"
-        h = h + "/* Program variables */\n\n"
-        h = h + self.printInputVariables()
-        return h
+    def printPointerInitFunction(self, target="c"):
+        return printPointerInitFunction(target)
+
+    def printHeader(self, target="c"):
+        h = [TEST_BANNER]
+        if target == "hip":
+            h.append("#include <hip/hip_runtime.h>\n")
+        h.append("#include <stdio.h>\n")
+        h.append("#include <stdlib.h>\n")
+        if cfg.MULTI_INPUT_DRIVER:
+            h.append("#include <string.h>\n")
+        h.append("#include <math.h>\n\n")
+        return "".join(h)
+
+    def printMultiInputMain(self):
+        return printMultiInputMain(str(len(self.ctx.ids.getVarsList()) + 1))
+
+    def printDriverEnd(self):
+        if cfg.MULTI_INPUT_DRIVER:
+            return "}\n" + self.printMultiInputMain()
+        return "\n  return 0;\n}\n"
+
+    # The call to compute in the driver of each target
+    def printComputeCall(self, target, parameters, name="compute"):
+        if target == "cuda":  # here we call a device kernel for cuda
+            return "  compute<<<1,1>>>(" + parameters + ");\n  cudaDeviceSynchronize();\n"
+        elif target == "hip":  # here we call a device kernel for hip
+            c = ["  hipLaunchKernelGGL(compute, dim3(1), dim3(1), 0, 0, " + parameters + ");\n",
+                 "  hipError_t err = hipDeviceSynchronize();\n",
+                 '  if (err != hipSuccess) {\n',
+                 '    printf("hipDeviceSynchronize failed: %s\\n", hipGetErrorString(err));\n',
+                 "  }\n"]
+            return "".join(c)
+        return "  " + name + "(" + parameters + ");\n"
+
+    def printTargets(self, targets, number=None) -> (dict, str):
+        """Prints the sources of several targets in one pass.
+
+        targets is a list of "c", "cuda", "hip", "lib" (the
+        shared-library code: only compute, which returns its result),
+        "kernel" (compute and runTest, for the shared driver) and "batch"
+        (the same, named after the test number, for printBatchProgram).
+        The parts shared by the targets (compute, the input parsing and the
+        driver) are printed once. Returns ({target: code}, allTypes).
+        """
+        # The body goes first: printing it generates the input variables
+        self.func.printBody()
+        computeFunction = None
+        if any(t != "lib" for t in targets):
+            computeFunction = self.func.printCode()
+            driverStart = "".join(["\n\n", "void runTest(char** argv) {\n" if cfg.MULTI_INPUT_DRIVER
+                                   else "int main(int argc, char** argv) {\n",
+                                   "/* Program variables */\n\n", self.printInputVariables()])
+            parameters = self.printFunctionParameters()
+            driverEnd = self.printDriverEnd()
+
+        codes = {}
+        for target in targets:
+            if target == "lib":
+                codes[target] = "".join([TEST_BANNER, "#include <stdio.h>\n", "#include <stdlib.h>\n",
+                                         "#include <math.h>\n\n", self.func.printCode(returnValue=True), "\n"])
+                continue
+            if target == "batch":
+                n = str(number)
+                codes[target] = "".join([self.func.printCode(name="compute_" + n), "\n\n",
+                                         "int numInputs_" + n + " = " + str(len(self.ctx.ids.getVarsList()) + 1) +
+                                         ";\n\n", "void runTest_" + n + "(char** argv) {\n",
+                                         "/* Program variables */\n\n", self.printInputVariables(),
+                                         self.printComputeCall("c", parameters, "compute_" + n),
+                                         self.printFreePointers(), "}\n"])
+                continue
+            if target == "kernel":
+                # main and initPointer are in the shared driver
+                codes[target] = "".join([self.printHeader("c"), getTypeString() + "* initPointer(" +
+                                         getTypeString() + " v);\n\n", computeFunction, "\n\n",
+                                         "int numInputs = " + str(len(self.ctx.ids.getVarsList()) + 1) + ";\n\n",
+                                         "void runTest(char** argv) {\n", "/* Program variables */\n\n",
+                                         self.printInputVariables(), self.printComputeCall("c", parameters),
+                                         self.printFreePointers(), "}\n"])
+                continue
+            c = [self.printHeader(target)]
+            if target != "c":
+                c.append("__global__\n")
+            c.append(computeFunction)
+            c.append("\n")
+            c.append(self.printPointerInitFunction(target))
+            c.append(driverStart)
+            c.append(self.printComputeCall(target, parameters))
+            if cfg.MULTI_INPUT_DRIVER:
+                c.append(self.printFreePointers(target))
+            c.append(driverEnd)
+            codes[target] = "".join(c)
+        allTypes = ",".join(self.ctx.ids.printAllTypes())
+        return (codes, allTypes)
 
     def printCode(self, device=False, hip=False) -> (str, str):
         self.device = device
         self.hip = hip
-        c = self.printHeader()
-        # call the function
-        if not self.device and not self.hip:
-            c = c + "  compute(" + self.printFunctionParameters() + ");\n"
-        elif self.device and not self.hip:  # here we call a device kernel for cuda
-            c = c + "  compute<<<1,1>>>(" + self.printFunctionParameters() + ");\n"
-            c = c + "  cudaDeviceSynchronize();\n"
-        else:  # here we call a device kernel for hip
-            c = c + "  hipLaunchKernelGGL(compute, dim3(1), dim3(1), 0, 0, " + self.printFunctionParameters() + ");\n"
-            c = c + "  hipError_t err = hipDeviceSynchronize();\n"
-            c = c + '  if (err != hipSuccess) {\n'
-            c = c + '    printf("hipDeviceSynchronize failed: %s\\n", hipGetErrorString(err));\n'
-            c = c + "  }\n"
-
-        # finalize main function
-        c = c + "\n  return 0;\n"
-        c = c + "}\n"
-        allTypes = ",".join(id_generator.IdGenerator.get().printAllTypes())
-        return (c, allTypes)
+        if hip:
+            target = "hip"
+        elif device:
+            target = "cuda"
+        else:
+            target = "c"
+        (codes, allTypes) = self.printTargets([target])
+        return (codes[target], allTypes)
+
+    # Code for the shared-library target: only the compute function,
+    # which returns its result instead of printing it.
+    def printLibraryCode(self) -> (str, str):
+        (codes, allTypes) = self.printTargets(["lib"])
+        return (codes["lib"], allTypes)
 
     def compileProgram(self, device=False):
         (code, allTypes) = self.printCode(device)
@@ -579,19 +965,32 @@ class Program():
             print("Error at runtime:", outexc.returncode, outexc.output)
 
     def getInput(self):
-        allTypes = ",".join(id_generator.IdGenerator.get().printAllTypes())
+        allTypes = ",".join(self.ctx.ids.printAllTypes())
         print("ALL TYPES", allTypes)
         # inGen = gen_inputs.InputGenerator()
-        input = gen_inputs.InputGenerator.genInput() + " "
+        input = gen_inputs.InputGenerator.genInput(self.ctx.rng) + " "
         typeList = allTypes.split(",")
         for type in typeList:
             if isTypeReal(type) or isTypeRealPointer(type):
-                input = input + gen_inputs.InputGenerator.genInput() + " "
+                input = input + gen_inputs.InputGenerator.genInput(self.ctx.rng) + " "
             elif isTypeInt(type):
                 input = input + "5 "
         return input
 
 
+# Generates the program of test index of a campaign from its own random
+# stream, so the same (campaignSeed, index, retry) always gives the same program.
+def generateProgram(campaignSeed, index, retry=0):
+    rng = random_functions.newTestRandom(campaignSeed, index, retry)
+    return Program(id_generator.GenerationContext(rng))
+
+
+# Lazily yields (index, program) for the tests indices of a campaign.
+def generatePrograms(campaignSeed, indices):
+    for index in indices:
+        yield (index, generateProgram(campaignSeed, index))
+
+
 if __name__ == "__main__":
     # for i in range(3):
     p = Program()
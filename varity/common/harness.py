@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import atexit
+import ctypes
+import _ctypes
+import select
+import tempfile
+import threading
+import subprocess
+
+import cfg
+import output_format
+import process_limits
+from type_checking import areRealsDouble, isTypeReal, isTypeRealPointer, isTypeInt
+
+# Execution harness for the shared-library target.
+# Each library exports the compute function of a test, which returns
+# its result; the harness loads the library and calls compute directly
+# for every input vector, so no process is spawned per input. The calls
+# run in long-lived worker processes (one per concurrent run) with the
+# limits of the test executables for every input (see process_limits).
+# A worker is only restarted after an input hangs or crashes it, so that
+# a bad kernel fails its own run and not the campaign.
+
+# Program of the worker processes: see serve()
+WORKER_PROGRAM = "import sys; sys.path[:0] = {paths!r}; import harness; harness.serve()"
+
+# Idle workers of this process, shared by the threads of the runners
+HARNESS_WORKERS = []
+HARNESS_WORKERS_PID = None
+HARNESS_WORKERS_LOCK = threading.Lock()
+
+
+def getRealCType():
+    if areRealsDouble():
+        return ctypes.c_double
+    return ctypes.c_float
+
+
+def getArgumentTypes(types):
+    real = getRealCType()
+    ret = []
+    for t in types:
+        if isTypeReal(t):
+            ret.append(real)
+        elif isTypeRealPointer(t):
+            ret.append(ctypes.POINTER(real))
+        elif isTypeInt(t):
+            ret.append(ctypes.c_int)
+    return ret
+
+
+def parseReal(value):
+    # Single-precision inputs carry an 'f' suffix
+    return float(value.rstrip("fF"))
+
+
+def getArguments(types, inputs):
+    real = getRealCType()
+    ret = []
+    for t, value in zip(types, inputs.split()):
+        if isTypeReal(t):
+            ret.append(real(parseReal(value)))
+        elif isTypeRealPointer(t):
+            # Same as initPointer() in the generated drivers
+            array = (real * cfg.ARRAY_SIZE)(*([parseReal(value)] * cfg.ARRAY_SIZE))
+            ret.append(ctypes.cast(array, ctypes.POINTER(real)))
+        elif isTypeInt(t):
+            ret.append(ctypes.c_int(int(value)))
+    return ret
+
+
+# Formats a result like the print statement of the generated drivers
+def formatResult(value):
+    return output_format.formatValue(value)
+
+
+def runSharedLibrary(lib_file, types, inputsList):
+    """Calls compute from lib_file on every input vector of inputsList, in
+    a worker process.
+
+    types is the list of types of the compute parameters (see
+    run.getInputTypes). Returns (inputs, output, runtime) tuples like
+    run.runExecutable, with runtimes in microseconds; failed runs get a
+    process_limits.RunFailure as output.
+    """
+    ret = []
+    while len(ret) < len(inputsList):
+        remaining = inputsList[len(ret):]
+        worker = acquireWorker()
+        try:
+            (results, failure) = worker.run(lib_file, types, remaining)
+        except BaseException:
+            worker.close()
+            raise
+        ret += results
+        if failure is None:
+            releaseWorker(worker)
+            continue
+        # The worker died on the next input: the rest go to a new one
+        worker.close()
+        if failure.kind == "exit":
+            # The worker could not run the library at all (e.g., it does
+            # not load), so it would fail every input in the same way
+            ret += [(inputs, failure, None) for inputs in remaining[len(results):]]
+        else:
+            ret.append((remaining[len(results)], failure, None))
+    return ret
+
+
+def acquireWorker():
+    global HARNESS_WORKERS, HARNESS_WORKERS_PID
+    with HARNESS_WORKERS_LOCK:
+        if HARNESS_WORKERS_PID != os.getpid():
+            # The workers of the parent of a forked runner are not ours
+            HARNESS_WORKERS = []
+            HARNESS_WORKERS_PID = os.getpid()
+        while HARNESS_WORKERS:
+            worker = HARNESS_WORKERS.pop()
+            if worker.isAlive():
+                return worker
+            worker.close()
+    return HarnessWorker()
+
+
+def releaseWorker(worker):
+    with HARNESS_WORKERS_LOCK:
+        HARNESS_WORKERS.append(worker)
+
+
+@atexit.register
+def closeWorkers():
+    with HARNESS_WORKERS_LOCK:
+        if HARNESS_WORKERS_PID == os.getpid():
+            for worker in HARNESS_WORKERS:
+                worker.close()
+        del HARNESS_WORKERS[:]
+
+
+class HarnessWorker:
+    """A worker process of the harness.
+
+    It reads one request per line on stdin (the library, its types, the
+    settings they depend on and the input vectors, in JSON), and prints
+    "output runtime" for each input as soon as compute returns, so that
+    the parent knows which input a hang or a crash belongs to."""
+
+    def __init__(self):
+        paths = [os.path.dirname(os.path.abspath(cfg.__file__)), os.path.dirname(os.path.abspath(__file__))]
+        self.stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen([sys.executable, "-c", WORKER_PROGRAM.format(paths=paths)],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.stderr,
+                                     start_new_session=True)
+        self.buffer = b""
+
+    def isAlive(self):
+        return self.proc.poll() is None
+
+    def run(self, lib_file, types, inputsList):
+        """Runs inputsList on lib_file. Returns the results of the inputs
+        that ran, and None or the RunFailure of the next input."""
+        request = {"lib": os.path.abspath(lib_file), "types": types, "inputs": [i.strip() for i in inputsList],
+                   "realType": cfg.REAL_TYPE, "arraySize": cfg.ARRAY_SIZE, "outputFormat": cfg.OUTPUT_FORMAT,
+                   "cpuLimit": process_limits.getCPULimit(1)}
+        errorStart = os.fstat(self.stderr.fileno()).st_size
+        try:
+            self.proc.stdin.write((json.dumps(request) + "\n").encode('ascii'))
+            self.proc.stdin.flush()
+        except BrokenPipeError:
+            # The worker exited: reading gets the end of its output
+            pass
+
+        ret = []
+        for inputs in inputsList:
+            start_time = time.perf_counter()
+            line = self.readLine(process_limits.getTimeout(1))
+            seconds = time.perf_counter() - start_time
+            if line is None:
+                process_limits.killGroup(self.proc.pid)
+                self.proc.wait()
+                return (ret, process_limits.RunFailure("timeout", self.proc.returncode, seconds,
+                                                       self.getErrors(errorStart)))
+            if not line:
+                self.proc.wait()
+                return (ret, process_limits.getFailure(self.proc.returncode, seconds, self.getErrors(errorStart)))
+            (res, runtime) = line.decode('ascii').split()
+            ret.append((inputs, res, int(runtime)))
+        return (ret, None)
+
+    # Next line printed by the worker, b"" if it exited, or None after
+    # timeout seconds
+    def readLine(self, timeout):
+        fd = self.proc.stdout.fileno()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while b"\n" not in self.buffer:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                    return None
+            data = os.read(fd, 65536)
+            if not data:
+                return b""
+            self.buffer += data
+        (line, self.buffer) = self.buffer.split(b"\n", 1)
+        return line
+
+    # What the worker printed on stderr since the request started
+    def getErrors(self, errorStart):
+        self.stderr.seek(errorStart)
+        return self.stderr.read()
+
+    def close(self):
+        if self.isAlive():
+            # The worker exits at the end of its input
+            self.proc.stdin.close()
+            try:
+                self.proc.wait(1)
+            except subprocess.TimeoutExpired:
+                process_limits.killGroup(self.proc.pid)
+                self.proc.wait()
+        self.proc.stdout.close()
+        self.stderr.close()
+
+
+def serve():
+    """Main loop of the worker processes (see HarnessWorker)."""
+    for line in sys.stdin:
+        request = json.loads(line)
+        cfg.REAL_TYPE = request["realType"]
+        cfg.ARRAY_SIZE = request["arraySize"]
+        cfg.OUTPUT_FORMAT = request["outputFormat"]
+        for (inputs, res, runtime) in callSharedLibrary(request["lib"], request["types"], request["inputs"],
+                                                        request["cpuLimit"]):
+            sys.stdout.write(res + " " + str(runtime) + "\n")
+            sys.stdout.flush()
+
+
+# A worker runs many inputs: its CPU-time limit is the time it used so far
+# plus the limit of one input
+def limitCPU(seconds):
+    if seconds is None or process_limits.resource is None:
+        return
+    resource = process_limits.resource
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    limit = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+    (soft, hard) = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    # The soft limit sends SIGXCPU
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+
+def callSharedLibrary(lib_file, types, inputsList, cpuLimit=None):
+    """Calls compute from lib_file in this process, with a CPU-time limit
+    in seconds for each input. Yields the results of runSharedLibrary."""
+    lib = ctypes.CDLL(os.path.abspath(lib_file))
+    try:
+        compute = lib.compute
+        compute.argtypes = getArgumentTypes(types)
+        compute.restype = getRealCType()
+
+        for inputs in inputsList:
+            args = getArguments(types, inputs)
+            limitCPU(cpuLimit)
+            start_time = time.perf_counter()
+            value = compute(*args)
+            end_time = time.perf_counter()
+            runtime = int((end_time - start_time) * 1e6)
+            yield (inputs, formatResult(value), runtime)
+    finally:
+        # Do not keep thousands of libraries mapped in long campaigns
+        _ctypes.dlclose(lib._handle)
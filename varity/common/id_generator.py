@@ -1,30 +1,28 @@
+import random
 
 from type_checking import getTypeString
 
 class IdGenerator():
     __instance = None
     
-    # ---- singleton accesor ------
+    # ---- shared instance ------
+    # Programs use the id generator of their GenerationContext; the shared
+    # instance is kept for code that generates variables on its own.
     @staticmethod 
     def get(): # gets instance
         """ Static access method. """
         if IdGenerator.__instance == None:
-            IdGenerator()
+            IdGenerator.__instance = IdGenerator()
         return IdGenerator.__instance
     
     def __init__(self):
-        """ Virtually private constructor. """
-        if IdGenerator.__instance != None:
-            raise Exception("This class is a singleton!")
-        else:
-            IdGenerator.__instance = self
-            self.varNames = {}
-            self.lastId = 0
-            self.pointers = set({})
-            # Only used locally in functions
-            self.tempVarNames = {}
-            self.tempLastId = 0
-    # ---- singleton accesor ------
+        self.varNames = {}
+        self.lastId = 0
+        self.pointers = set({})
+        # Only used locally in functions
+        self.tempVarNames = {}
+        self.tempLastId = 0
+    # ---- shared instance ------
     
     def genID(self):
         self.lastId = self.lastId + 1
@@ -78,3 +76,21 @@ class IdGenerator():
     def clear(self):
         self.varNames.clear()
         self.lastId = 0
+        self.pointers.clear()
+        self.tempVarNames.clear()
+        self.tempLastId = 0
+
+
+# The state of the generation of one program: its variables and the
+# random stream it draws from. Each Program has its own context, so
+# several programs can be generated at the same time.
+class GenerationContext():
+    def __init__(self, rng=None):
+        # Without an rng the program draws from the random module
+        if rng is None:
+            rng = random
+        self.rng = rng
+        self.ids = IdGenerator()
+
+    def clear(self):
+        self.ids.clear()
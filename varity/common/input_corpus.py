@@ -0,0 +1,101 @@
+import os
+import ast
+import mmap
+import struct
+
+import cfg
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Binary input corpus of a test.
+# The real inputs of all the samples of a test are saved next to its
+# .input type file as a .npy file (samples x real parameters, with the
+# exact bits of cfg.REAL_TYPE), the first time the test is run. Every
+# executable, rerun and machine then reads the same values, and a sample
+# is identified by its row (its input index).
+#
+# The .npy format (version 1.0) is written and read without NumPy; with
+# NumPy the file is memory-mapped with np.load.
+
+MAGIC = b"\x93NUMPY\x01\x00"
+# Headers are padded so that the data starts at a multiple of this
+HEADER_ALIGNMENT = 64
+
+
+def getCorpusFileName(fullProgName):
+    return fullProgName + ".npy"
+
+
+def exists(fullProgName):
+    return os.path.exists(getCorpusFileName(fullProgName))
+
+
+# (npy descr, struct format) of cfg.REAL_TYPE
+def getFormat():
+    if cfg.REAL_TYPE == "float":
+        return ("<f4", "f")
+    return ("<f8", "d")
+
+
+def getHeader(descr, shape):
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d, %d), }" % (descr, shape[0], shape[1])
+    # 2 bytes of header length, and the header ends with a newline
+    padding = HEADER_ALIGNMENT - (len(MAGIC) + 2 + len(header) + 1) % HEADER_ALIGNMENT
+    header = header + " " * (padding % HEADER_ALIGNMENT) + "\n"
+    return MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def write(fullProgName, rows):
+    """Saves rows (a matrix or a list of rows of reals) as the corpus of
+    the test."""
+    (descr, code) = getFormat()
+    if np is not None:
+        data = np.ascontiguousarray(rows, dtype=descr)
+        shape = data.shape
+        data = data.tobytes()
+    else:
+        shape = (len(rows), len(rows[0]) if rows else 0)
+        data = b"".join([struct.pack("<%d%s" % (len(row), code), *row) for row in rows])
+
+    # Written under a private name first: the executables of a test can be
+    # run from several processes
+    fileName = getCorpusFileName(fullProgName)
+    tmp = fileName + "." + str(os.getpid()) + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(getHeader(descr, shape))
+        f.write(data)
+    os.replace(tmp, fileName)
+
+
+def readHeader(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        return None
+    (length,) = struct.unpack("<H", f.read(2))
+    header = ast.literal_eval(f.read(length).decode("latin1"))
+    return (header["descr"], header["shape"], len(MAGIC) + 2 + length)
+
+
+def load(fullProgName):
+    """Returns the corpus of the test, or None if it has none: a read-only
+    memory-mapped matrix with NumPy, a list of rows otherwise."""
+    fileName = getCorpusFileName(fullProgName)
+    if not os.path.exists(fileName):
+        return None
+    if np is not None:
+        return np.load(fileName, mmap_mode="r")
+
+    with open(fileName, "rb") as f:
+        header = readHeader(f)
+        if header is None:
+            print("Invalid input corpus:", fileName)
+            return None
+        (descr, shape, offset) = header
+        code = "f" if descr == "<f4" else "d"
+        if shape[0] * shape[1] == 0:
+            return [[] for n in range(shape[0])]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            values = struct.unpack_from("<%d%s" % (shape[0] * shape[1], code), data, offset)
+    return [list(values[i * shape[1]:(i + 1) * shape[1]]) for i in range(shape[0])]
@@ -0,0 +1,53 @@
+import re
+
+import cfg
+import gen_inputs
+
+# Classes of the real literals of the generator (ZERO, NORMAL, SUBNORMAL,
+# ...), by exponent. The structural hash of a program (gen_program) and the
+# canonical form of the de-duplication database (program_db) replace each
+# literal with its class.
+
+# Real literals (single-precision constants carry an 'f' suffix) and the
+# names of variables
+CANONICAL_TOKENS = re.compile(r"[-+](\d+(?:\.\d*)?|\.\d+)(?:[eE]([-+]?\d+))?[fF]?|var_[0-9]+|tmp_[0-9]+")
+
+CLASS_NAMES = {
+    gen_inputs.FPNumberType.zero: "ZERO",
+    gen_inputs.FPNumberType.normal: "NORMAL",
+    gen_inputs.FPNumberType.subnormal: "SUBNORMAL",
+    gen_inputs.FPNumberType.almost_overflow: "ALMOST_OVER",
+    gen_inputs.FPNumberType.almost_underflow: "ALMOST_UNDER",
+}
+
+# Class name of the literals with each exponent, per real type, built
+# once from gen_inputs.InputGenerator.getRealType
+EXPONENT_CLASSES = {}
+
+def getClassName(classes, mantissa, exponent):
+    if exponent is None:
+        if float(mantissa) == 0.0:
+            return "ZERO"
+        return "UNDEFINED"
+    name = classes.get(exponent)
+    if name is None:
+        name = classes.get(str(int(exponent)), "UNDEFINED")
+    return name
+
+# Class name (ZERO, NORMAL, ...) of a real literal of the generator
+def getLiteralClass(literal):
+    m = CANONICAL_TOKENS.fullmatch(literal)
+    if m is None or m.group(1) is None:
+        return "UNDEFINED"
+    return getClassName(getExponentClasses(), m.group(1), m.group(2))
+
+def getExponentClasses():
+    realType = cfg.REAL_TYPE
+    if realType not in EXPONENT_CLASSES:
+        suffix = "f" if realType == "float" else ""
+        classes = {}
+        for e in range(-400, 401):
+            t = gen_inputs.InputGenerator.getRealType("+1.0E" + str(e) + suffix)
+            classes[str(e)] = CLASS_NAMES.get(t, "UNDEFINED")
+        EXPONENT_CLASSES[realType] = classes
+    return EXPONENT_CLASSES[realType]
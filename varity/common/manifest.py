@@ -0,0 +1,152 @@
+import os
+import json
+
+# The manifest of a campaign indexes its tests: the sources and input-type
+# file of every test, and the executables built for it with their compiler
+# and opt level. It is written by the generate and compile stages, so the
+# run stages do not need to scan the file system or parse file names.
+#
+# Paths are stored relative to the campaign directory. Each test keeps the
+# index it was generated from, so with the campaign seed its sources can be
+# regenerated (tests whose first program was a duplicate also keep the
+# retry they were generated from):
+# {
+#   "seed": 1234,
+#   "tests": {
+#     "_tests/_group_1/_test_1": {
+#       "index": 0,
+#       "retry": 0,
+#       "sources": {"c": "_tests/_group_1/_test_1.c", ...},
+#       "input": "_tests/_group_1/_test_1.input",
+#       "executables": [{"path": "...", "compiler": "gcc", "opt": "O0", "target": "exe",
+#                        "sha256": "..."}, ...]
+#     }, ...
+#   },
+#   "batches": {
+#     "_tests/_group_1/_batch_1": {
+#       "source": "_tests/_group_1/_batch_1.c",
+#       "tests": ["_tests/_group_1/_test_1", ...]
+#     }, ...
+#   }
+# }
+#
+# Batches (cfg.BATCH_SIZE) are built once per compiler and opt level, and
+# their executable is linked as an executable of each of their tests, with
+# the target "batch".
+
+MANIFEST_FILE = "manifest.json"
+
+
+def getManifestFileName(rootDir):
+    return os.path.join(rootDir, MANIFEST_FILE)
+
+
+def newManifest(seed=None):
+    return {"seed": seed, "tests": {}}
+
+
+def load(rootDir):
+    fileName = getManifestFileName(rootDir)
+    if not os.path.exists(fileName):
+        return None
+    with open(fileName, "r") as f:
+        return json.load(f)
+
+
+def loadOrCreate(rootDir):
+    m = load(rootDir)
+    if m is None:
+        m = newManifest()
+    return m
+
+
+def save(rootDir, m):
+    fileName = getManifestFileName(rootDir)
+    tmp = fileName + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(m, f, indent=1)
+    os.replace(tmp, fileName)
+
+
+def getTestEntry(m, rootDir, base_name):
+    key = os.path.relpath(base_name, rootDir)
+    if key not in m["tests"]:
+        m["tests"][key] = {"sources": {}, "input": key + ".input", "executables": []}
+    return m["tests"][key]
+
+
+# sources maps a target name ("c", "cuda", "hip", ...) to a source file
+def addTest(m, rootDir, base_name, sources, index=None, retry=0):
+    entry = getTestEntry(m, rootDir, base_name)
+    if index is not None:
+        entry["index"] = index
+        entry["retry"] = retry
+    for target, fileName in sources.items():
+        entry["sources"][target] = os.path.relpath(fileName, rootDir)
+
+
+def addExecutable(m, rootDir, base_name, path, compiler, opt, target="exe", sha256=None):
+    entry = getTestEntry(m, rootDir, base_name)
+    rel = os.path.relpath(path, rootDir)
+    entry["executables"] = [e for e in entry["executables"] if e["path"] != rel]
+    exe = {"path": rel, "compiler": compiler, "opt": opt, "target": target}
+    if sha256 is not None:
+        exe["sha256"] = sha256
+    entry["executables"].append(exe)
+
+
+def addBatch(m, rootDir, fileName, base_names):
+    key = os.path.relpath(os.path.splitext(fileName)[0], rootDir)
+    if "batches" not in m:
+        m["batches"] = {}
+    m["batches"][key] = {"source": os.path.relpath(fileName, rootDir),
+                         "tests": [os.path.relpath(base_name, rootDir) for base_name in base_names]}
+
+
+# Returns (source, base_names) for every batch, joined to rootDir
+def getBatches(m, rootDir):
+    ret = []
+    for key, entry in m.get("batches", {}).items():
+        ret.append((os.path.join(rootDir, entry["source"]), [os.path.join(rootDir, t) for t in entry["tests"]]))
+    return ret
+
+
+# Paths of the executables linked from batches, joined to rootDir
+def getBatchedExecutables(m, rootDir):
+    return [os.path.join(rootDir, e["path"]) for entry in m["tests"].values() for e in entry["executables"]
+            if e.get("target") == "batch"]
+
+
+# Returns the executables of a test grouped by content (lists of paths joined
+# to rootDir); executables without a hash are alone in their group
+def getIdenticalExecutables(m, rootDir, base_name):
+    entry = getTestEntry(m, rootDir, base_name)
+    groups = {}
+    for e in entry["executables"]:
+        key = e.get("sha256", e["path"])
+        if key not in groups:
+            groups[key] = []
+        groups[key].append(os.path.join(rootDir, e["path"]))
+    return list(groups.values())
+
+
+# Returns (base_name, executables) for every test, where executables is a
+# list of (path, compiler, opt) tuples. Paths are joined to rootDir.
+def getTests(m, rootDir):
+    ret = []
+    for key, entry in m["tests"].items():
+        exes = [(os.path.join(rootDir, e["path"]), e["compiler"], e["opt"]) for e in entry["executables"]]
+        ret.append((os.path.join(rootDir, key), exes))
+    return ret
+
+
+# Returns (index, retry, sources) for every test generated from the campaign seed,
+# where sources maps a target name to a source file joined to rootDir.
+def getGeneratedTests(m, rootDir):
+    ret = []
+    for key, entry in m["tests"].items():
+        if entry.get("index") is None:
+            continue
+        sources = {t: os.path.join(rootDir, f) for t, f in entry["sources"].items()}
+        ret.append((entry["index"], entry.get("retry", 0), sources))
+    return ret
@@ -0,0 +1,134 @@
+import math
+import struct
+
+import cfg
+
+# Output formats of the generated programs (cfg.OUTPUT_FORMAT):
+#   "decimal":  printf("%.17g") (default)
+#   "hexfloat": printf("%a"), exact
+#   "bits":     the bit pattern of comp (64 or 32 bits) as fixed-width hex
+# Outputs are stored as printed. With the exact formats, outputs are
+# compared by bit pattern, so they do not depend on how the libc formats
+# decimals (e.g., "nan" vs "-nan").
+
+FORMATS = ("decimal", "hexfloat", "bits")
+
+
+def getFormat():
+    if cfg.OUTPUT_FORMAT not in FORMATS:
+        print("Unknown output format:", cfg.OUTPUT_FORMAT)
+        return "decimal"
+    return cfg.OUTPUT_FORMAT
+
+
+def isSingle():
+    return cfg.REAL_TYPE == "float"
+
+
+# ---- Formatting (the generated drivers and the shared-library harness) ----
+
+# C statement printing comp in the output format
+def getPrintStatement():
+    f = getFormat()
+    if f == "hexfloat":
+        return '\n   printf("%a\\n", comp);\n'
+    if f == "bits":
+        if isSingle():
+            return ('\n   { union { float v; unsigned int b; } out; out.v = comp; '
+                    'printf("0x%08x\\n", out.b); }\n')
+        return ('\n   { union { double v; unsigned long long b; } out; out.v = comp; '
+                'printf("0x%016llx\\n", out.b); }\n')
+    return '\n   printf("%.17g\\n", comp);\n'
+
+
+# Same as printf("%a") in glibc
+def formatHexFloat(value):
+    if math.isnan(value):
+        return "-nan" if math.copysign(1.0, value) < 0 else "nan"
+    if math.isinf(value):
+        return "-inf" if value < 0 else "inf"
+    if value == 0.0:
+        return "-0x0p+0" if math.copysign(1.0, value) < 0 else "0x0p+0"
+    (mantissa, exponent) = value.hex().split("p")
+    mantissa = mantissa.rstrip("0").rstrip(".")
+    return mantissa + "p" + exponent
+
+
+def getBits(value):
+    if isSingle():
+        return struct.unpack("<I", struct.pack("<f", value))[0]
+    return struct.unpack("<Q", struct.pack("<d", value))[0]
+
+
+def formatBits(bits):
+    if isSingle():
+        return "0x%08x" % bits
+    return "0x%016x" % bits
+
+
+# Formats a result like the generated drivers (glibc prints the sign of NaNs)
+def formatValue(value):
+    f = getFormat()
+    if f == "hexfloat":
+        return formatHexFloat(value)
+    if f == "bits":
+        return formatBits(getBits(value))
+    return formatDecimal(value)
+
+
+def formatDecimal(value):
+    if math.isnan(value):
+        if math.copysign(1.0, value) < 0:
+            return "-nan"
+        return "nan"
+    return "%.17g" % value
+
+
+# ---- Decoding ----
+
+def parseFloat(output):
+    output = output.strip()
+    if output.lower() in ("nan", "+nan", "-nan"):
+        # Keep the sign printed by glibc
+        return math.copysign(math.nan, -1.0 if output.startswith("-") else 1.0)
+    if output.startswith("0x") and "p" not in output:
+        bits = int(output, 16)
+        if isSingle():
+            return struct.unpack("<f", struct.pack("<I", bits))[0]
+        return struct.unpack("<d", struct.pack("<Q", bits))[0]
+    if "0x" in output:
+        return float.fromhex(output)
+    return float(output)
+
+
+def toBits(output):
+    """Bit pattern (of cfg.REAL_TYPE) of an output in any format. Raises
+    ValueError if the output is not a number."""
+    output = output.strip()
+    if output.startswith("0x") and "p" not in output:
+        return int(output, 16)
+    return getBits(parseFloat(output))
+
+
+def toDecimal(output):
+    """An output in any format, printed like the decimal format."""
+    if getFormat() == "decimal":
+        return output
+    try:
+        value = parseFloat(output)
+    except ValueError:
+        return output
+    return formatDecimal(value)
+
+
+def sameOutput(one, two):
+    """True if the outputs are the same: the same strings with the decimal
+    format, the same bit patterns otherwise."""
+    if one == two:
+        return True
+    if getFormat() == "decimal":
+        return False
+    try:
+        return toBits(one) == toBits(two)
+    except (ValueError, OverflowError):
+        return False
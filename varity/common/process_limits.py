@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import signal
+import asyncio
+import tempfile
+import threading
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import cfg
+
+# Execution of the test programs (and compilers) with limits.
+# Each process runs in its own process group (so that whatever it forks is
+# killed with it) with a wall-clock timeout and a CPU-time limit
+# (cfg.RUN_TIMEOUT and cfg.RUN_CPU_LIMIT per input for the test programs).
+# A run that does not finish normally is returned as a RunFailure instead
+# of raising, so that one bad executable does not stop a campaign.
+
+# Bytes of stderr kept in failure records
+STDERR_TAIL = 2000
+
+
+class RunFailure:
+    """A run that did not print a result: "timeout" (killed after the
+    wall-clock timeout), "cpu_limit" (killed after the CPU-time limit),
+    "crash" (killed by a signal) or "exit" (non-zero exit status)."""
+
+    def __init__(self, kind, returncode=None, seconds=None, stderr=b""):
+        self.kind = kind
+        self.returncode = returncode
+        self.seconds = seconds
+        self.stderr = stderr[-STDERR_TAIL:].decode('ascii', 'replace') if stderr else ""
+
+    def getSignal(self):
+        if self.returncode is None or self.returncode >= 0:
+            return None
+        try:
+            return signal.Signals(-self.returncode).name
+        except ValueError:
+            return str(-self.returncode)
+
+    def toRecord(self):
+        return {"kind": self.kind, "returncode": self.returncode, "signal": self.getSignal(),
+                "seconds": self.seconds, "stderr": self.stderr}
+
+    def __str__(self):
+        if self.kind == "exit":
+            return "exit status " + str(self.returncode)
+        if self.kind == "crash":
+            return "killed by " + str(self.getSignal())
+        return self.kind
+
+
+def isFailure(output):
+    return isinstance(output, RunFailure)
+
+
+def getTimeout(samples):
+    if cfg.RUN_TIMEOUT is None:
+        return None
+    return cfg.RUN_TIMEOUT * samples
+
+
+def getCPULimit(samples):
+    if cfg.RUN_CPU_LIMIT is None:
+        return None
+    return cfg.RUN_CPU_LIMIT * samples
+
+
+# The CPU-time limit is set on the running process (prlimit) rather than in
+# a preexec_fn, which is not safe with the pipeline threads
+def limitCPU(pid, seconds):
+    if seconds is None or resource is None or not hasattr(resource, "prlimit"):
+        return
+    limit = int(seconds) + 1
+    try:
+        # The soft limit sends SIGXCPU, the hard one SIGKILL
+        resource.prlimit(pid, resource.RLIMIT_CPU, (limit, limit + 1))
+    except (OSError, ValueError):
+        # The process already exited
+        pass
+
+
+def killGroup(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def getFailure(returncode, seconds, stderr):
+    if returncode == -signal.SIGXCPU:
+        return RunFailure("cpu_limit", returncode, seconds, stderr)
+    if returncode < 0:
+        return RunFailure("crash", returncode, seconds, stderr)
+    return RunFailure("exit", returncode, seconds, stderr)
+
+
+def spawn(args, stdin_data=None, samples=1):
+    """Runs args with the limits of samples inputs.
+
+    Returns (stdout, failure, seconds), where failure is None or a
+    RunFailure."""
+    return spawnWithLimits(args, stdin_data, getTimeout(samples), getCPULimit(samples))
+
+
+def spawnWithLimits(args, stdin_data=None, timeout=None, cpuLimit=None):
+    """Runs args with a wall-clock timeout and a CPU-time limit in seconds
+    (None for no limit). Returns like spawn."""
+    start_time = time.perf_counter()
+    proc = subprocess.Popen(args, stdin=subprocess.PIPE if stdin_data is not None else subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+    limitCPU(proc.pid, cpuLimit)
+    try:
+        out, err = proc.communicate(stdin_data, timeout)
+    except subprocess.TimeoutExpired:
+        killGroup(proc.pid)
+        out, err = proc.communicate()
+        seconds = time.perf_counter() - start_time
+        return (out, RunFailure("timeout", proc.returncode, seconds, err), seconds)
+    seconds = time.perf_counter() - start_time
+    if proc.returncode != 0:
+        return (out, getFailure(proc.returncode, seconds, err), seconds)
+    return (out, None, seconds)
+
+
+def spawnMeasured(args, timeout=None, cpuLimit=None):
+    """Like spawnWithLimits (without stdin), and also measures the peak
+    resident memory of the process in bytes: the largest of the process and
+    the children it waited for (e.g., cc1 for gcc), from wait4.
+
+    Returns (stdout, failure, seconds, peakRSS)."""
+    start_time = time.perf_counter()
+    # The outputs go to files: the process is reaped with wait4 instead of
+    # communicate, so that its resource usage is not lost
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=out, stderr=err, start_new_session=True)
+        limitCPU(proc.pid, cpuLimit)
+        timedOut = threading.Event()
+
+        def onTimeout():
+            timedOut.set()
+            killGroup(proc.pid)
+
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, onTimeout)
+            timer.start()
+        (pid, status, usage) = os.wait4(proc.pid, 0)
+        if timer is not None:
+            timer.cancel()
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        seconds = time.perf_counter() - start_time
+        out.seek(0)
+        err.seek(0)
+        (stdout, stderr) = (out.read(), err.read())
+
+    peakRSS = getPeakRSS(usage)
+    if timedOut.is_set():
+        return (stdout, RunFailure("timeout", proc.returncode, seconds, stderr), seconds, peakRSS)
+    if proc.returncode != 0:
+        return (stdout, getFailure(proc.returncode, seconds, stderr), seconds, peakRSS)
+    return (stdout, None, seconds, peakRSS)
+
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS. It includes the
+# memory of the process before exec, so it is at least the size of the
+# Python process that started it.
+def getPeakRSS(usage):
+    if sys.platform == "darwin":
+        return usage.ru_maxrss
+    return usage.ru_maxrss * 1024
+
+
+async def spawnAsync(args, stdin_data=None, samples=1):
+    """Asynchronous version of spawn."""
+    start_time = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(*args, stdin=asyncio.subprocess.PIPE if stdin_data is not None
+                                                else asyncio.subprocess.DEVNULL,
+                                                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                                                start_new_session=True)
+    limitCPU(proc.pid, getCPULimit(samples))
+    timeout = getTimeout(samples)
+    communicate = asyncio.ensure_future(proc.communicate(stdin_data))
+    try:
+        out, err = await asyncio.wait_for(asyncio.shield(communicate), timeout)
+    except asyncio.TimeoutError:
+        killGroup(proc.pid)
+        out, err = await communicate
+        seconds = time.perf_counter() - start_time
+        return (out, RunFailure("timeout", proc.returncode, seconds, err), seconds)
+    seconds = time.perf_counter() - start_time
+    if proc.returncode != 0:
+        return (out, getFailure(proc.returncode, seconds, err), seconds)
+    return (out, None, seconds)
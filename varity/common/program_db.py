@@ -1,7 +1,15 @@
 import gen_program
 import gen_inputs
+import literal_classes
+import cfg
 import re
 import sys
+import os
+import math
+import mmap
+import fcntl
+import hashlib
+import sqlite3
 
 class ProgramDB:
     def __init__(self):
@@ -22,57 +30,151 @@ class ProgramDB:
         return ret
             
     def extractComputeFunction(p: str):
-        # Remove only the main function
-        lines = p.split("\n")
-        beginLine = 0
-        endLine = 0
-        for i in range(len(lines)):
-            if "compute(" in lines[i] and "{" in lines[i]:
-                beginLine = i
-            
-            if "initPointer(" in lines[i] and "{" in lines[i]:
-                endLine = i-1
-        
-        newProg = lines[beginLine:endLine]
-        newProg = "\n".join(newProg)
-        return newProg
+        # Remove only the main function: keep from the compute header to the
+        # line before the closing brace of compute, which is followed by the
+        # definition of initPointer
+        header = p.find("compute(")
+        init = p.find("initPointer(")
+        if header < 0 or init < 0:
+            return ""
+        begin = p.rfind("\n", 0, header) + 1
+        initLine = p.rfind("\n", 0, init) + 1
+        end = p.rfind("\n", 0, initLine - 1) + 1
+        return p[begin:end]
 
     def formatProgram(p: str) -> str:
         p = ProgramDB.extractComputeFunction(p)
         # Transform spaces
-        ret = re.sub('\s+', ' ', p).strip()
-        #print("\n\nnew str:", ret)
-        reals = re.findall(r"([-+]){1}(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?", ret)
-        values = []
-        for r in reals:
-            val = [r[0],r[1],r[3]]
-            f = "".join(val)
-            values.append(f)
-            #print(f)
-            
-        for v in values:
-            t = gen_inputs.InputGenerator.getRealType(v)
-            #print(t, gen_inputs.FPNumberType.zero)
-            if t == gen_inputs.FPNumberType.zero:
-                name = "ZERO"
-            elif t == gen_inputs.FPNumberType.normal:
-                name = "NORMAL"
-            elif t == gen_inputs.FPNumberType.subnormal:
-                name = "SUBNORMAL"
-            elif t == gen_inputs.FPNumberType.almost_overflow:
-                name = "ALMOST_OVER"
-            elif t == gen_inputs.FPNumberType.almost_underflow:
-                name = "ALMOST_UNDER"
-            else:
-                name = "UNDEFINED"
-            ret = ret.replace(v, name)
-
-        # Replace variables
-        ret = re.sub(r'var_[0-9]+', 'VAR', ret)
-        ret = re.sub(r'tmp_[0-9]+', 'TMP', ret)
-        
-        return ret
-        
+        ret = " ".join(p.split())
+        # Real literals and variables are replaced in a single pass
+        classes = literal_classes.getExponentClasses()
+        def replace(m):
+            t = m.group(0)
+            if t[0] == "v":
+                return "VAR"
+            if t[0] == "t":
+                return "TMP"
+            return literal_classes.getClassName(classes, m.group(1), m.group(2))
+        return literal_classes.CANONICAL_TOKENS.sub(replace, ret)
+
+
+# Structural hash of a program: the hash of its canonical compute function
+def programKey(code: str) -> bytes:
+    return hashlib.sha256(ProgramDB.formatProgram(code).encode()).digest()
+
+
+# ---- Persistent de-duplication index -----------------------------------------
+# The index outlives campaigns, so a program generated in any earlier
+# campaign is detected as a duplicate. Several generation workers can use
+# the same index at the same time; each one opens its own handle.
+
+class ProgramIndex:
+    # Adds key and returns True if it was not in the index
+    def add(self, key: bytes, name=None) -> bool:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteProgramIndex(ProgramIndex):
+    def __init__(self, fileName):
+        self.db = sqlite3.connect(fileName, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS programs (hash BLOB PRIMARY KEY, test TEXT) WITHOUT ROWID")
+        self.db.commit()
+
+    def add(self, key, name=None):
+        # The insert is atomic, so only one of two workers that generate
+        # the same program gets to keep it
+        cur = self.db.execute("INSERT OR IGNORE INTO programs (hash, test) VALUES (?, ?)", (key, name))
+        self.db.commit()
+        return cur.rowcount == 1
+
+    def close(self):
+        self.db.close()
+
+
+# A Bloom filter in a memory-mapped file, for endless campaigns: its size
+# is fixed by the capacity and error rate given when the file is created.
+# A new program is reported as a duplicate with probability error_rate.
+class BloomProgramIndex(ProgramIndex):
+    MAGIC = b"VBLOOM01"
+    HEADER_SIZE = 24
+
+    def __init__(self, fileName, capacity=None, error_rate=None):
+        if capacity is None:
+            capacity = cfg.DEDUP_BLOOM_CAPACITY
+        if error_rate is None:
+            error_rate = cfg.DEDUP_BLOOM_ERROR_RATE
+        self.fd = os.open(fileName, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self.fd).st_size == 0:
+                (bits, hashes) = BloomProgramIndex.getParameters(capacity, error_rate)
+                header = BloomProgramIndex.MAGIC + bits.to_bytes(8, "little") + hashes.to_bytes(8, "little")
+                os.write(self.fd, header)
+                os.ftruncate(self.fd, BloomProgramIndex.HEADER_SIZE + (bits + 7) // 8)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.map = mmap.mmap(self.fd, 0)
+        if self.map[:8] != BloomProgramIndex.MAGIC:
+            raise ValueError(fileName + " is not a program index")
+        self.bits = int.from_bytes(self.map[8:16], "little")
+        self.hashes = int.from_bytes(self.map[16:24], "little")
+
+    def getParameters(capacity, error_rate):
+        bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        hashes = max(1, int(round(bits / capacity * math.log(2))))
+        return (bits, hashes)
+
+    # Double hashing on two 64-bit words of the key
+    def getPositions(self, key):
+        h1 = int.from_bytes(key[0:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key, name=None):
+        new = False
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            for pos in self.getPositions(key):
+                byte = BloomProgramIndex.HEADER_SIZE + pos // 8
+                mask = 1 << (pos % 8)
+                if not self.map[byte] & mask:
+                    self.map[byte] = self.map[byte] | mask
+                    new = True
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return new
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+
+def openIndex(fileName=None, backend=None):
+    if fileName is None:
+        fileName = cfg.DEDUP_INDEX
+    if backend is None:
+        backend = cfg.DEDUP_BACKEND
+    if backend == "bloom":
+        return BloomProgramIndex(fileName)
+    return SQLiteProgramIndex(fileName)
+
+
+# The index of the current process; workers forked with an open index
+# open their own one
+PROGRAM_INDEX = None
+PROGRAM_INDEX_PID = None
+
+def getProgramIndex():
+    global PROGRAM_INDEX, PROGRAM_INDEX_PID
+    if PROGRAM_INDEX is None or PROGRAM_INDEX_PID != os.getpid():
+        PROGRAM_INDEX = openIndex()
+        PROGRAM_INDEX_PID = os.getpid()
+    return PROGRAM_INDEX
+
 
 if __name__ == "__main__":
     db = ProgramDB()
@@ -1,14 +1,40 @@
 import random
+import hashlib
 import cfg
 
+# The functions draw from rng, the random module by default
+# (generation code passes the rng of its generation context).
+
 # This function return True or False randomly
-def lucky():
-    return random.randrange(0, 2) == 0
+def lucky(rng=random):
+    return rng.randrange(0, 2) == 0
 # 1/4 probability of success
-def veryLucky():
-    return random.randrange(0, 5) == 4
+def veryLucky(rng=random):
+    return rng.randrange(0, 5) == 4
 
 # Chance of generating a math function
-def generateMathExpression():
-    return random.random() <= cfg.MATH_FUNC_PROBABILITY
+def generateMathExpression(rng=random):
+    return rng.random() <= cfg.MATH_FUNC_PROBABILITY
+
+# ---- Seeded generation ------------------------------------------------------
+# Every test of a campaign draws from its own random stream, derived from
+# the campaign seed and the index of the test, so a test can be generated
+# in any worker, in any order, and regenerated later from (seed, index).
+
+def newCampaignSeed():
+    if cfg.SEED is not None:
+        return cfg.SEED
+    return random.SystemRandom().getrandbits(64)
+
+# Hashing (seed, index) keeps the streams of consecutive tests independent,
+# unlike seeding with seed + index. A test that is generated again because
+# its first program was a duplicate uses the stream (seed, index, retry).
+def getTestSeed(campaignSeed, index, retry=0):
+    name = str(campaignSeed) + ":" + str(index)
+    if retry > 0:
+        name = name + ":" + str(retry)
+    h = hashlib.sha256(name.encode())
+    return int.from_bytes(h.digest()[:8], "little")
 
+def newTestRandom(campaignSeed, index, retry=0):
+    return random.Random(getTestSeed(campaignSeed, index, retry))
@@ -0,0 +1,156 @@
+import os
+import json
+import sqlite3
+
+import cfg
+
+# Streaming results stores.
+# Each run of a test on one input is appended as one record
+# (test, input, compiler, opt, output, runtime, index) while the campaign
+# runs, so nothing is kept in memory and a crashed run keeps everything
+# written so far. index is the row of the input in the input corpus of the
+# test (see input_corpus). The legacy results.json layout is produced by
+# exportLegacyJSON.
+
+
+class ResultsStore:
+    def add(self, test, inputs, compiler, opt, output, runtime=None, index=None):
+        raise NotImplementedError
+
+    # Yields (test, records) in the order the tests were first recorded,
+    # where records are the (inputs, compiler, opt, output, runtime) of the test
+    def groupedRecords(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JSONLResultsStore(ResultsStore):
+    def __init__(self, fileName, reset=False):
+        # The file is read again when exporting, after saveResults changed
+        # to the campaign directory
+        self.fileName = os.path.abspath(fileName)
+        self.fd = open(self.fileName, "w" if reset else "a")
+
+    def add(self, test, inputs, compiler, opt, output, runtime=None, index=None):
+        record = {"test": test, "input": inputs, "compiler": compiler, "opt": opt,
+                  "output": output, "runtime": runtime, "index": index}
+        self.fd.write(json.dumps(record) + "\n")
+        self.fd.flush()
+
+    def readRecords(self):
+        self.fd.flush()
+        with open(self.fileName, "r") as f:
+            for line in f:
+                # A crash can leave a truncated last line
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    # Records of a test are not contiguous in the file, so this groups the
+    # whole file in memory. Use the sqlite backend for large campaigns.
+    def groupedRecords(self):
+        tests = {}
+        for r in self.readRecords():
+            if r["test"] not in tests:
+                tests[r["test"]] = []
+            tests[r["test"]].append((r["input"], r["compiler"], r["opt"], r["output"], r["runtime"]))
+        for test, records in tests.items():
+            yield (test, records)
+
+    def close(self):
+        self.fd.close()
+
+
+class SQLiteResultsStore(ResultsStore):
+    def __init__(self, fileName, reset=False):
+        self.fileName = fileName
+        if reset and os.path.exists(fileName):
+            os.remove(fileName)
+        # Records can be added from the pipeline threads; callers serialize the access
+        self.db = sqlite3.connect(fileName, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, test TEXT, input TEXT, "
+                        "compiler TEXT, opt TEXT, output TEXT, runtime INTEGER, input_index INTEGER)")
+        # Stores written before the input corpus have no input_index
+        columns = [r[1] for r in self.db.execute("PRAGMA table_info(runs)")]
+        if "input_index" not in columns:
+            self.db.execute("ALTER TABLE runs ADD COLUMN input_index INTEGER")
+        self.db.execute("CREATE INDEX IF NOT EXISTS runs_test ON runs (test, input)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS runs_compiler ON runs (compiler, opt)")
+        self.db.commit()
+        self.pending = 0
+
+    def add(self, test, inputs, compiler, opt, output, runtime=None, index=None):
+        self.db.execute("INSERT INTO runs (test, input, compiler, opt, output, runtime, input_index) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", (test, inputs, compiler, opt, output, runtime, index))
+        self.pending += 1
+        if self.pending >= cfg.RESULTS_COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self.pending = 0
+
+    def groupedRecords(self):
+        self.commit()
+        tests = [r[0] for r in self.db.execute("SELECT test FROM runs GROUP BY test ORDER BY MIN(id)")]
+        for test in tests:
+            rows = self.db.execute("SELECT input, compiler, opt, output, runtime FROM runs WHERE test = ? "
+                                   "ORDER BY id", (test,))
+            yield (test, rows.fetchall())
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+
+def getStoreFileName(rootDir, backend=None):
+    if backend is None:
+        backend = cfg.RESULTS_BACKEND
+    if backend == "jsonl":
+        return os.path.join(rootDir, "results.jsonl")
+    return os.path.join(rootDir, "results.db")
+
+
+def openStore(rootDir, reset=False, backend=None):
+    if backend is None:
+        backend = cfg.RESULTS_BACKEND
+    fileName = getStoreFileName(rootDir, backend)
+    if backend == "jsonl":
+        return JSONLResultsStore(fileName, reset)
+    return SQLiteResultsStore(fileName, reset)
+
+
+def formatValue(output, runtime):
+    if runtime is None:
+        return output
+    return output + " time:" + str(runtime)
+
+
+def exportLegacyJSON(store, results_file):
+    """Writes the records of store with the layout of results.json:
+    test -> input -> compiler -> opt -> "output time:runtime".
+
+    With the sqlite backend only the records of one test are held in memory.
+    """
+    with open(results_file, "w") as f:
+        f.write("{")
+        first = True
+        for (test, records) in store.groupedRecords():
+            key_input = {}
+            for (inputs, compiler, opt, output, runtime) in records:
+                if inputs not in key_input:
+                    key_input[inputs] = {}
+                if compiler not in key_input[inputs]:
+                    key_input[inputs][compiler] = {}
+                key_input[inputs][compiler][opt] = formatValue(output, runtime)
+
+            if not first:
+                f.write(",")
+            first = False
+            body = json.dumps(key_input, indent=2).replace("\n", "\n  ")
+            f.write("\n  " + json.dumps(test) + ": " + body)
+        f.write("\n}\n")
@@ -3,8 +3,17 @@ import sys
 import glob
 import subprocess
 import time
+import asyncio
 
 import gen_inputs
+import input_corpus
+import output_format
+import exec_cache
+import process_limits
+import failure_log
+import harness
+import results_store
+import manifest
 import cfg
 import json
 import multiprocessing as mp
@@ -12,7 +21,11 @@ import multiprocessing as mp
 from type_checking import isTypeReal, isTypeRealPointer
 
 PROG_PER_TEST = {}
-PROG_RESULTS = {}
+# Compiler and opt level of each executable, from the campaign manifest
+EXE_INFO = {}
+RESULTS_STORE = None
+# Failures (timeouts, crashes, non-zero exits) of the runs of the campaign
+FAILURE_LOG = None
 RECORD_RUNTIME = cfg.RECORD_RUNTIME
 
 
@@ -35,56 +48,115 @@ def generateInputs(fullProgName):
     return ret
 
 
+# Returns the input strings of the samples of a test. With cfg.INPUT_CORPUS
+# they are read from the input corpus of the test, which is created (or
+# extended) on the first run.
+def generateInputsList(fullProgName, samples=None):
+    if samples is None:
+        samples = cfg.INPUT_SAMPLES_PER_RUN
+    if not cfg.INPUT_CORPUS and not cfg.BATCHED_INPUTS:
+        return [generateInputs(fullProgName) for n in range(samples)]
+    types = getInputTypes(fullProgName)
+    generator = gen_inputs.BatchInputGenerator
+    if not cfg.INPUT_CORPUS:
+        return generator.formatInputs(types, generator.genRows(types, samples))
+
+    rows = input_corpus.load(fullProgName)
+    if rows is None or len(rows) < samples:
+        saved = 0 if rows is None else len(rows)
+        new = generator.genRows(types, samples - saved, batched=cfg.BATCHED_INPUTS)
+        if saved > 0:
+            rows = [list(row) for row in rows] + [list(row) for row in new]
+        else:
+            rows = new
+        input_corpus.write(fullProgName, rows)
+    return generator.formatInputs(types, rows[:samples])
+
+
+# Returns the input strings of all the samples of the input corpus of a
+# test, or None if it has none
+def loadInputsList(fullProgName):
+    rows = input_corpus.load(fullProgName)
+    if rows is None:
+        return None
+    return gen_inputs.BatchInputGenerator.formatInputs(getInputTypes(fullProgName), rows)
+
+
+# Test sources are the .c files, except the shared-library sources (.lib.c)
+def isTestSource(fname):
+    return (fname.endswith('.c') and not fname.endswith(('.lib.c', '.kernel.c', '.batch.c')) and
+            not fname.startswith('_batch_'))
+
+
 def getAllTests(fullProgName):
     global PROG_PER_TEST
     base_name = os.path.splitext(fullProgName)[0]
-    allTests = [test for test in glob.glob(base_name + "*.exe") if
+    allTests = [test for test in glob.glob(base_name + "*.exe") + glob.glob(base_name + "*.so") if
                 os.path.basename(test).startswith(os.path.basename(base_name) + ".")]
     PROG_PER_TEST[base_name] = allTests
 
 
+def registerExecutable(exe_file, compiler, opt):
+    EXE_INFO[exe_file] = (compiler, opt)
+
+
+# Finds the tests of a campaign and their executables. Campaigns without
+# a manifest are found by scanning the directory.
+def discoverTests(dir):
+    global PROG_PER_TEST
+
+    m = manifest.load(dir)
+    if m is not None:
+        for (base_name, exes) in manifest.getTests(m, dir):
+            PROG_PER_TEST[base_name] = [path for (path, compiler, opt) in exes]
+            for (path, compiler, opt) in exes:
+                registerExecutable(path, compiler, opt)
+        for path in manifest.getBatchedExecutables(m, dir):
+            exec_cache.addBatchedExecutable(path)
+        return
+
+    for dirName, subdirList, fileList in os.walk(dir):
+        for fname in fileList:
+            if isTestSource(fname):
+                fullPath = dirName + "/" + fname
+                getAllTests(fullPath)
+
+
 def spawnProc(config):
     if RECORD_RUNTIME:
         (cmd, results, lock, batch_runtime) = config
-        compiler_name = cmd.split()[0].split('-')[1]
+        compiler_name = getCompilerAndOpt(cmd.split()[0])[0]
     else:
         (cmd, results, lock) = config
 
+    (out, failure, seconds) = process_limits.spawn(cmd.split())
+    if failure is not None:
+        # Recorded by the parent process
+        results.append((cmd, failure))
+        return
+
+    res = out.decode('ascii')[:-1]
+    runtime = int(seconds * 1e6)  # Calculate runtime in microseconds
+    lock.acquire()
+
     try:
         if RECORD_RUNTIME:
-            start_time = time.perf_counter()
-            out = subprocess.check_output(cmd, shell=True)
-            end_time = time.perf_counter()
-            runtime = int((end_time - start_time) * 1e6)  # Calculate runtime in microseconds
+            if compiler_name not in batch_runtime:
+                batch_runtime[compiler_name] = 0
+            batch_runtime[compiler_name] += runtime
+            results.append(cmd + " " + res + " time:" + str(runtime))
         else:
-            out = subprocess.check_output(cmd, shell=True)
-
-        res = out.decode('ascii')[:-1]
-        lock.acquire()
-
-        try:
-            if RECORD_RUNTIME:
-                if compiler_name not in batch_runtime:
-                    batch_runtime[compiler_name] = 0
-                batch_runtime[compiler_name] += runtime
-                results.append(cmd + " " + res + " time:" + str(runtime))
-            else:
-                results.append(cmd + " " + res)
-        finally:
-            lock.release()
-
-    except subprocess.CalledProcessError as outexc:
-        print("\nError at runtime:", outexc.returncode, outexc.output.decode('ascii'))
-        print("CMD", cmd)
-        exit(1)
+            results.append(cmd + " " + res)
+    finally:
+        lock.release()
 
 
 def runTests():
-    global PROG_PER_TEST, PROG_RESULTS
+    global PROG_PER_TEST
     print("Total programs: ", len(PROG_PER_TEST.keys()))
     manager = mp.Manager()
     lock = manager.Lock()
-    cpuCount = 16
+    cpuCount = mp.cpu_count()
     c = 1
     batch_runtime = manager.dict()
 
@@ -92,8 +164,9 @@ def runTests():
         fullProgName = k
         results = manager.list()
         inputsList = []
-        for n in range(cfg.INPUT_SAMPLES_PER_RUN):
-            inputs = generateInputs(fullProgName)
+        indices = {}
+        for inputs in generateInputsList(fullProgName):
+            indices[" ".join(inputs.split())] = len(indices)
             for t in PROG_PER_TEST[k]:
                 cmd = t + " " + inputs
                 if RECORD_RUNTIME:
@@ -109,14 +182,146 @@ def runTests():
             with mp.Pool(cpuCount) as myPool:
                 myPool.map(spawnProc, workLoad)
 
-        PROG_RESULTS[k] = results
+        for r in results:
+            if isinstance(r, tuple):
+                (cmd, failure) = r
+                inputs = " ".join(cmd.split()[1:])
+                recordFailure(k, cmd.split()[0], inputs, failure, indices.get(inputs))
+            else:
+                recordResultString(k, r, indices)
         c = c + 1
     print("")
     return dict(batch_runtime)
 
 
+def runExecutable(exe_file, inputsList, types=None):
+    """Runs exe_file on every input vector of inputsList.
+
+    Returns a list of (inputs, output, runtime) tuples, one per input vector,
+    where runtime is in microseconds (None if runtimes are not recorded).
+    With cfg.MULTI_INPUT_DRIVER all the vectors are streamed through the
+    stdin of a single process; each sample is then charged the average
+    runtime of the process. Shared libraries (.so) are called through the
+    harness and need the parameter types of the test. With cfg.EXEC_CACHE_FILE,
+    only the inputs missing from the execution cache are run.
+    """
+    if not exec_cache.isEnabled():
+        return executeInputs(exe_file, inputsList, types)
+    (cached, missing) = exec_cache.lookup(exe_file, inputsList)
+    results = executeInputs(exe_file, missing, types) if len(missing) > 0 else []
+    exec_cache.store(exe_file, results)
+    return exec_cache.merge(inputsList, cached, results)
+
+
+def executeInputs(exe_file, inputsList, types=None):
+    if exe_file.endswith(".so"):
+        return harness.runSharedLibrary(exe_file, types, inputsList)
+
+    if cfg.MULTI_INPUT_DRIVER and len(inputsList) > 1:
+        stdin_data = "\n".join([inputs.strip() for inputs in inputsList]) + "\n"
+        (out, failure, seconds) = process_limits.spawn([exe_file], stdin_data.encode('ascii'), len(inputsList))
+        results = getMultiInputResults(inputsList, out, failure, seconds)
+        if results is not None:
+            return results
+        # The outputs buffered by a failed process are lost: run each input
+        # alone to find the ones that fail
+
+    ret = []
+    for inputs in inputsList:
+        (out, failure, seconds) = process_limits.spawn([exe_file] + inputs.split())
+        ret.append(getSingleInputResult(inputs, out, failure, seconds))
+    return ret
+
+
+# Results of a multi-input process, or None if it failed
+def getMultiInputResults(inputsList, out, failure, seconds):
+    if failure is not None:
+        return None
+    outputs = out.decode('ascii', 'replace').splitlines()
+    if len(outputs) != len(inputsList):
+        return None
+    runtime = None
+    if RECORD_RUNTIME:
+        runtime = int(seconds * 1e6 / len(inputsList))
+    return [(inputs, res, runtime) for inputs, res in zip(inputsList, outputs)]
+
+
+# Failed runs get a process_limits.RunFailure as output
+def getSingleInputResult(inputs, out, failure, seconds):
+    if failure is not None:
+        return (inputs, failure, None)
+    runtime = None
+    if RECORD_RUNTIME:
+        runtime = int(seconds * 1e6)
+    return (inputs, out.decode('ascii')[:-1], runtime)
+
+
+def openResultsStore(rootDir, reset=True):
+    global RESULTS_STORE, FAILURE_LOG
+    RESULTS_STORE = results_store.openStore(rootDir, reset)
+    FAILURE_LOG = failure_log.FailureLog(failure_log.getFailureLogFileName(rootDir, "run"), reset)
+    return RESULTS_STORE
+
+
+# Groups the executables of a test so that identical ones are run once (the
+# first executable of each group); see cfg.RUN_IDENTICAL_ONCE
+def getExecutableGroups(exes):
+    if not cfg.RUN_IDENTICAL_ONCE:
+        return [[exe_file] for exe_file in exes]
+    return exec_cache.groupIdentical(exes)
+
+
+def getCompilerAndOpt(exe_file):
+    if exe_file in EXE_INFO:
+        return EXE_INFO[exe_file]
+    compiler = exe_file.split('-')[1]
+    opt = exe_file.split('-')[2].split('.')[0]
+    return (compiler, opt)
+
+
+# index is the position of inputs in the inputs list of the test. Failed runs
+# (res is a process_limits.RunFailure) go to the failure log.
+def appendResult(base_name, exe_file, inputs, res, runtime, batch_runtime, index=None):
+    if process_limits.isFailure(res):
+        recordFailure(base_name, exe_file, inputs, res, index)
+        return
+    (compiler, opt) = getCompilerAndOpt(exe_file)
+    if RECORD_RUNTIME:
+        if compiler not in batch_runtime:
+            batch_runtime[compiler] = 0
+        batch_runtime[compiler] += runtime
+    else:
+        runtime = None
+    RESULTS_STORE.add(base_name, " ".join(inputs.split()), compiler, opt, res, runtime, index)
+
+
+def recordFailure(base_name, exe_file, inputs, failure, index=None, log=None):
+    if log is None:
+        log = FAILURE_LOG
+    (compiler, opt) = getCompilerAndOpt(exe_file)
+    record = {"test": base_name, "input": " ".join(inputs.split()), "index": index, "compiler": compiler,
+              "opt": opt, "executable": exe_file}
+    record.update(failure.toRecord())
+    log.add(record)
+    print("\nRun failed ({}): {} {}".format(failure, exe_file, record["input"]))
+
+
+# Records a result line of the pool runner: "exe inputs output [time:runtime]".
+# indices maps the inputs of the test to their index.
+def recordResultString(base_name, r, indices=None):
+    indices = indices or {}
+    parts = r.split()
+    (compiler, opt) = getCompilerAndOpt(parts[0])
+    runtime = None
+    if RECORD_RUNTIME:
+        runtime = int(parts[-1].split(":")[1])
+        parts = parts[:-1]
+    inputs = " ".join(parts[1:-1])
+    RESULTS_STORE.add(base_name, inputs, compiler, opt, parts[-1], runtime, indices.get(inputs))
+
+
 def runTestsSerial():
-    global PROG_PER_TEST, PROG_RESULTS
+    global PROG_PER_TEST
 
     print("Total programs: ", len(PROG_PER_TEST.keys()))
     count = 1
@@ -130,111 +335,110 @@ def runTestsSerial():
         count = count + 1
 
         # ----------------------
-        results = []
-        for n in range(cfg.INPUT_SAMPLES_PER_RUN):
-            inputs = generateInputs(base_name)
-            for exe_file in PROG_PER_TEST[base_name]:
-                try:
-                    cmd = exe_file + " " + inputs
-                    if RECORD_RUNTIME:
-                        start_time = time.perf_counter()
-                        out = subprocess.check_output(cmd, shell=True)
-                        end_time = time.perf_counter()
-                        runtime = int((end_time - start_time) * 1e6)
-                        compiler_name = cmd.split()[0].split('-')[1]
-                        if compiler_name not in batch_runtime:
-                            batch_runtime[compiler_name] = 0
-                        batch_runtime[compiler_name] += runtime
+        inputsList = generateInputsList(base_name)
+        types = getInputTypes(base_name)
+        for group in getExecutableGroups(PROG_PER_TEST[base_name]):
+            results = runExecutable(group[0], inputsList, types)
+            for exe_file in group:
+                for index, (inputs, res, runtime) in enumerate(results):
+                    appendResult(base_name, exe_file, inputs, res, runtime, batch_runtime, index)
+
+    print("")
+    return batch_runtime
 
-                    else:
-                        out = subprocess.check_output(cmd, shell=True)
 
-                    res = out.decode('ascii')[:-1]
-                    if RECORD_RUNTIME:
-                        results.append(exe_file + " " + inputs + " " + res + " time:" + str(runtime))
-                    else:
-                        results.append(exe_file + " " + inputs + " " + res)
+async def runExecutableAsync(exe_file, inputsList, types=None):
+    """Asynchronous version of runExecutable (no shell is used)."""
+    if not exec_cache.isEnabled():
+        return await executeInputsAsync(exe_file, inputsList, types)
+    (cached, missing) = exec_cache.lookup(exe_file, inputsList)
+    results = await executeInputsAsync(exe_file, missing, types) if len(missing) > 0 else []
+    exec_cache.store(exe_file, results)
+    return exec_cache.merge(inputsList, cached, results)
+
+
+async def executeInputsAsync(exe_file, inputsList, types=None):
+    if exe_file.endswith(".so"):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, harness.runSharedLibrary, exe_file, types, inputsList)
+
+    if cfg.MULTI_INPUT_DRIVER and len(inputsList) > 1:
+        stdin_data = "\n".join([inputs.strip() for inputs in inputsList]) + "\n"
+        (out, failure, seconds) = await process_limits.spawnAsync([exe_file], stdin_data.encode('ascii'),
+                                                                  len(inputsList))
+        results = getMultiInputResults(inputsList, out, failure, seconds)
+        if results is not None:
+            return results
+
+    ret = []
+    for inputs in inputsList:
+        (out, failure, seconds) = await process_limits.spawnAsync([exe_file] + inputs.split())
+        ret.append(getSingleInputResult(inputs, out, failure, seconds))
+    return ret
+
 
-                except subprocess.CalledProcessError as outexc:
-                    print("\nError at runtime:", outexc.returncode, outexc.output)
-                    print("CMD", cmd)
-                    exit()
+async def runAllTestsAsync():
+    global PROG_PER_TEST
+
+    total = sum([len(exes) for exes in PROG_PER_TEST.values()])
+    print("Total programs: ", len(PROG_PER_TEST.keys()))
+    batch_runtime = {}
+    finished = [0]
+    # Bounds the number of executables running at the same time
+    semaphore = asyncio.Semaphore(mp.cpu_count())
 
-        PROG_RESULTS[base_name] = results
+    # group is a list of identical executables; the first one is run
+    async def runOne(base_name, group, inputsList, types):
+        try:
+            results = await runExecutableAsync(group[0], inputsList, types)
+            for exe_file in group:
+                for index, (inputs, res, runtime) in enumerate(results):
+                    appendResult(base_name, exe_file, inputs, res, runtime, batch_runtime, index)
+        finally:
+            semaphore.release()
+            finished[0] += len(group)
+            print("\r--> Finished executable: {}/{}".format(finished[0], total), end='')
+            sys.stdout.flush()
 
+    tasks = set()
+    for base_name in PROG_PER_TEST.keys():
+        inputsList = generateInputsList(base_name)
+        types = getInputTypes(base_name)
+        for group in getExecutableGroups(PROG_PER_TEST[base_name]):
+            await semaphore.acquire()
+            task = asyncio.create_task(runOne(base_name, group, inputsList, types))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
     print("")
     return batch_runtime
 
 
+def runTestsAsync():
+    return asyncio.run(runAllTestsAsync())
+
+
 def saveResults(rootDir):
-    global PROG_RESULTS
+    global RESULTS_STORE, FAILURE_LOG
 
     os.chdir(rootDir)
-    with open("./results.json", "w") as f:
-        print("{", file=f)
-        for k in PROG_RESULTS.keys():
-            lastTest = list(PROG_RESULTS.keys())[-1]
-            print('  "' + k + '": {', file=f)
-            key_input = {}
-            for r in PROG_RESULTS[k]:
-                if RECORD_RUNTIME:
-                    parts = r.split()
-                    compiler = parts[0].split('-')[1]
-                    opt = parts[0].split('-')[2].split('.')[0]
-                    input = " ".join(parts[1:-2])
-                    output = parts[-2]
-                    runtime = parts[-1]
-                else:
-                    compiler = r.split()[0].split('-')[1]
-                    opt = r.split()[0].split('-')[2].split('.')[0]
-                    input = " ".join(r.split()[1:-1])
-                    output = r.split()[-1:][0]
-
-                if input in key_input.keys():
-                    key_comp = key_input[input]
-                    if compiler in key_comp.keys():
-                        if RECORD_RUNTIME:
-                            key_input[input][compiler][opt] = output + " " + runtime
-                        else:
-                            key_input[input][compiler][opt] = output
-                    else:
-                        if RECORD_RUNTIME:
-                            key_input[input][compiler] = {opt: output + " " + runtime}
-                        else:
-                            key_input[input][compiler] = {opt: output}
-                else:
-                    if RECORD_RUNTIME:
-                        key_input[input] = {compiler: {opt: output + " " + runtime}}
-                    else:
-                        key_input[input] = {compiler: {opt: output}}
-
-            for i in key_input.keys():
-                lastInput = list(key_input.keys())[-1]
-                print('    "' + i + '": {', file=f)
-                for c in key_input[i].keys():
-                    lastComp = list(key_input[i].keys())[-1]
-                    print('      "' + c + '": {', file=f)
-                    for o in key_input[i][c].keys():
-                        val = key_input[i][c][o]
-                        lastOpt = list(key_input[i][c].keys())[-1]
-                        line = '        "' + o + '": "' + val
-                        if o != lastOpt:
-                            print(line + '",', file=f)
-                        else:
-                            print(line + '"', file=f)
-                    if c != lastComp:
-                        print('      },', file=f)
-                    else:
-                        print('      }', file=f)
-                if i != lastInput:
-                    print('    },', file=f)
-                else:
-                    print('    }', file=f)
-            if k != lastTest:
-                print('  },', file=f)
-            else:
-                print('  }', file=f)
-        print("}", file=f)
+    results_store.exportLegacyJSON(RESULTS_STORE, "./results.json")
+    RESULTS_STORE.close()
+    RESULTS_STORE = None
+    if FAILURE_LOG is not None:
+        printFailures(FAILURE_LOG)
+        FAILURE_LOG.close()
+        FAILURE_LOG = None
+
+
+def printFailures(log):
+    if log.count == 0:
+        return
+    counts = failure_log.countByKind(log.fileName)
+    print("Failed runs: {} ({}), see {}".format(
+        log.count, ", ".join([k + ": " + str(n) for k, n in sorted(counts.items())]), os.path.basename(log.fileName)))
 
 
 def saveRunData(rootDir, batch_runtime=None, rerun=False):
@@ -304,12 +508,14 @@ def saveRunData(rootDir, batch_runtime=None, rerun=False):
 def run(dir):
     global PROG_PER_TEST
 
-    for dirName, subdirList, fileList in os.walk(dir):
-        for fname in fileList:
-            if fname.endswith('.c'):
-                fullPath = dirName + "/" + fname
-                getAllTests(fullPath)
-    batch_runtime = runTestsSerial()
+    discoverTests(dir)
+    openResultsStore(dir)
+    if cfg.RUNNER == "serial":
+        batch_runtime = runTestsSerial()
+    elif cfg.RUNNER == "pool":
+        batch_runtime = runTests()
+    else:
+        batch_runtime = runTestsAsync()
     print("Saving runs results...")
     saveResults(dir)
     saveRunData(dir, batch_runtime=batch_runtime)
@@ -329,57 +535,101 @@ def saved_run(dir):
 
     print("Looking for new executables...")
 
-    for dirName, subdirList, fileList in os.walk(dir):
-        for fname in fileList:
-            if fname.endswith('.c'):
-                fullPath = dirName + "/" + fname
-                getAllTests(fullPath)
+    discoverTests(dir)
 
     manager = mp.Manager()
     lock = manager.Lock()
     batch_runtime = manager.dict()
     cpuCount = mp.cpu_count()
 
+    # New results are also appended to the results store of the campaign
+    store = None
+    if os.path.exists(results_store.getStoreFileName(dir)):
+        store = results_store.openStore(dir)
+    failures = failure_log.FailureLog(failure_log.getFailureLogFileName(dir, "run"))
+
     for fullProgName in PROG_PER_TEST.keys():
         if fullProgName not in saved_results:
             continue
 
+        # The inputs are read from the input corpus when the test has one,
+        # otherwise they are recovered from the keys of the results
+        corpus = loadInputsList(fullProgName)
+        indices = {}
+        if corpus is not None:
+            savedInputs = [" ".join(inputs.split()) for inputs in corpus]
+            indices = {input_vals: i for i, input_vals in enumerate(savedInputs)}
+        else:
+            savedInputs = list(saved_results[fullProgName].keys())
+
         for t in PROG_PER_TEST[fullProgName]:
-            base_name = fullProgName.split("-")[0]
-            compiler_name = t.split("-")[1]
-            opt_level = t.split("-")[2].split(".")[0]
+            base_name = fullProgName
+            (compiler_name, opt_level) = getCompilerAndOpt(t)
 
             inputsList = []
-            for input_vals in saved_results[base_name].keys():
-                if compiler_name in saved_results[base_name][input_vals]:
-                    if opt_level in saved_results[base_name][input_vals][compiler_name]:
+            for input_vals in savedInputs:
+                saved = saved_results[base_name].get(input_vals, {})
+                if compiler_name in saved:
+                    if opt_level in saved[compiler_name]:
                         continue
                 cmd = t + " " + input_vals
                 inputsList.append((cmd, input_vals))
 
-            results = manager.list()
-            for i in range(0, len(inputsList), cpuCount):
-                workLoad = inputsList[i:i + cpuCount]
-                with mp.Pool(cpuCount) as myPool:
+            newResults = []
+            if cfg.MULTI_INPUT_DRIVER or t.endswith(".so"):
+                if len(inputsList) == 0:
+                    continue
+                types = getInputTypes(fullProgName)
+                for (input_vals, res, runtime) in runExecutable(t, [i for _, i in inputsList], types):
+                    if process_limits.isFailure(res):
+                        recordFailure(base_name, t, input_vals, res, indices.get(input_vals), failures)
+                        continue
                     if RECORD_RUNTIME:
-                        myPool.map(spawnProc, [(cmd, results, lock, batch_runtime) for cmd, _ in workLoad])
-                    else:
-                        myPool.map(spawnProc, [(cmd, results, lock) for cmd, _ in workLoad])
-
-            for cmd, input_vals in inputsList:
-                for result in results:
-                    if cmd in result:
+                        if compiler_name not in batch_runtime:
+                            batch_runtime[compiler_name] = 0
+                        batch_runtime[compiler_name] += runtime
+                        res = res + " time:" + str(runtime)
+                    newResults.append((input_vals, res))
+            else:
+                results = manager.list()
+                for i in range(0, len(inputsList), cpuCount):
+                    workLoad = inputsList[i:i + cpuCount]
+                    with mp.Pool(cpuCount) as myPool:
                         if RECORD_RUNTIME:
-                            parts = result.split(" ")
-                            res = parts[-2] + " " + parts[-1]
+                            myPool.map(spawnProc, [(cmd, results, lock, batch_runtime) for cmd, _ in workLoad])
                         else:
-                            res = result.split(" ")[-1]
+                            myPool.map(spawnProc, [(cmd, results, lock) for cmd, _ in workLoad])
 
-                        if input_vals not in saved_results[base_name]:
-                            saved_results[base_name][input_vals] = {}
-                        if compiler_name not in saved_results[base_name][input_vals]:
-                            saved_results[base_name][input_vals][compiler_name] = {}
-                        saved_results[base_name][input_vals][compiler_name][opt_level] = res
+                for cmd, input_vals in inputsList:
+                    for result in results:
+                        if isinstance(result, tuple):
+                            if result[0] == cmd:
+                                recordFailure(base_name, t, input_vals, result[1], indices.get(input_vals), failures)
+                            continue
+                        if cmd in result:
+                            if RECORD_RUNTIME:
+                                parts = result.split(" ")
+                                res = parts[-2] + " " + parts[-1]
+                            else:
+                                res = result.split(" ")[-1]
+                            newResults.append((input_vals, res))
+
+            for input_vals, res in newResults:
+                if input_vals not in saved_results[base_name]:
+                    saved_results[base_name][input_vals] = {}
+                if compiler_name not in saved_results[base_name][input_vals]:
+                    saved_results[base_name][input_vals][compiler_name] = {}
+                saved_results[base_name][input_vals][compiler_name][opt_level] = res
+                if store is not None:
+                    parts = res.split(" time:")
+                    runtime = int(parts[1]) if len(parts) > 1 else None
+                    store.add(base_name, input_vals, compiler_name, opt_level, parts[0], runtime,
+                              indices.get(input_vals))
+
+    if store is not None:
+        store.close()
+    printFailures(failures)
+    failures.close()
 
     with open(results_file, "w") as f:
         json.dump(saved_results, f, indent=2)
@@ -388,6 +638,112 @@ def saved_run(dir):
     print("The results.json is updated successfully after rerunning on different machine!")
 
 
+def is_skipped_value(first_op, second_op):
+    first_op = output_format.toDecimal(first_op)
+    second_op = output_format.toDecimal(second_op)
+    if first_op == "0" and second_op == "-0":
+        return True
+    if first_op == "-0" and second_op == "0":
+        return True
+    if first_op == "nan" and second_op == "-nan":
+        return True
+    if first_op == "-nan" and second_op == "nan":
+        return True
+    if first_op == "inf" and second_op == "-inf":
+        return True
+    if first_op == "-inf" and second_op == "inf":
+        return True
+    return False
+
+
+def iter_results(folder_path):
+    """Yields (base_name, input_vals, compilers) for every test input of a
+    campaign, where compilers maps compiler -> opt -> result.
+
+    Reads the results store when the campaign has one (one test in memory
+    at a time), and results.json otherwise.
+    """
+    if os.path.exists(results_store.getStoreFileName(folder_path)):
+        store = results_store.openStore(folder_path)
+        try:
+            for (base_name, records) in store.groupedRecords():
+                inputs = {}
+                for (input_vals, compiler, opt, output, runtime) in records:
+                    if input_vals not in inputs:
+                        inputs[input_vals] = {}
+                    if compiler not in inputs[input_vals]:
+                        inputs[input_vals][compiler] = {}
+                    inputs[input_vals][compiler][opt] = results_store.formatValue(output, runtime)
+                for input_vals, compilers in inputs.items():
+                    yield (base_name, input_vals, compilers)
+        finally:
+            store.close()
+        return
+
+    with open(os.path.join(folder_path, "results.json"), "r") as f:
+        results = json.load(f)
+    for base_name, inputs in results.items():
+        for input_vals, compilers in inputs.items():
+            yield (base_name, input_vals, compilers)
+
+
+def check_divergence_matrix(folder_path):
+    """Computes the divergences between every pair of (compiler, opt)
+    variants, including different opt levels of the same compiler, in a
+    single pass over the results.
+
+    Writes the pairwise count matrix to divergence_matrix.json and one
+    record per divergence to divergence_pairs.jsonl.
+    """
+    if not os.path.exists(results_store.getStoreFileName(folder_path)) and \
+            not os.path.exists(os.path.join(folder_path, "results.json")):
+        print("No results found in the specified folder!")
+        return
+
+    print("Looking for the differences...")
+    skip = cfg.SKIP_VALUES
+    compared = {}
+    diverged = {}
+    total = 0
+
+    with open(os.path.join(folder_path, "divergence_pairs.jsonl"), "w") as records:
+        for (base_name, input_vals, compilers) in iter_results(folder_path):
+            variants = []
+            for compiler in sorted(compilers.keys()):
+                for opt in sorted(compilers[compiler].keys()):
+                    result = compilers[compiler][opt]
+                    variants.append((compiler + ":" + opt, result, result.split(" time:")[0]))
+
+            for i in range(len(variants)):
+                (name_one, result_one, output_one) = variants[i]
+                for j in range(i + 1, len(variants)):
+                    (name_two, result_two, output_two) = variants[j]
+                    pair = (name_one, name_two)
+                    compared[pair] = compared.get(pair, 0) + 1
+                    if skip and is_skipped_value(output_one, output_two):
+                        continue
+                    if not output_format.sameOutput(output_one, output_two):
+                        diverged[pair] = diverged.get(pair, 0) + 1
+                        total += 1
+                        record = {"test": base_name, "input": input_vals,
+                                  name_one: result_one, name_two: result_two}
+                        records.write(json.dumps(record) + "\n")
+
+    names = sorted(set([n for pair in compared.keys() for n in pair]))
+    matrix = {n: {m: 0 for m in names} for n in names}
+    comparisons = {n: {m: 0 for m in names} for n in names}
+    for (one, two), n in compared.items():
+        comparisons[one][two] = comparisons[two][one] = n
+    for (one, two), n in diverged.items():
+        matrix[one][two] = matrix[two][one] = n
+
+    with open(os.path.join(folder_path, "divergence_matrix.json"), "w") as f:
+        json.dump({"Variants": names, "Total Divergences": total, "Comparisons": comparisons,
+                   "Divergences": matrix}, f, indent=2)
+
+    print("Divergence matrix saved to divergence_matrix.json!")
+
+
 def check_divergence(folder_path, compiler_one, compiler_two):
     results_file = os.path.join(folder_path, "results.json")
     divergences_file = os.path.join(folder_path, "divergences.json")
@@ -407,21 +763,6 @@ def check_divergence(folder_path, compiler_one, compiler_two):
 
     skip = cfg.SKIP_VALUES
 
-    def is_skipped_value(first_op, second_op):
-        if first_op == "0" and second_op == "-0":
-            return True
-        if first_op == "-0" and second_op == "0":
-            return True
-        if first_op == "nan" and second_op == "-nan":
-            return True
-        if first_op == "-nan" and second_op == "nan":
-            return True
-        if first_op == "inf" and second_op == "-inf":
-            return True
-        if first_op == "-inf" and second_op == "inf":
-            return True
-        return False
-
     for base_name, inputs in results.items():
         for input_vals, compilers in inputs.items():
             if compiler_one in compilers:
@@ -460,7 +801,7 @@ def check_divergence(folder_path, compiler_one, compiler_two):
                         if skip and is_skipped_value(output_one, output_two):
                             continue
 
-                        if output_one != output_two:
+                        if not output_format.sameOutput(output_one, output_two):
                             if base_name not in divergences:
                                 divergences[base_name] = {}
                             if input_vals not in divergences[base_name]:
@@ -480,7 +821,7 @@ def check_divergence(folder_path, compiler_one, compiler_two):
 
 def categorize_discrepancy(output_one, output_two):
     def categorize(value):
-        value_lower = value.lower()
+        value_lower = output_format.toDecimal(value).lower()
         if value_lower in ["nan", "-nan"]:
             return "nan"
         elif value_lower in ["inf", "+inf", "-inf"]:
@@ -7,32 +7,77 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'comm
 import gen_program
 import cfg
 import run
+import compile_cache
+import exec_cache
+import process_limits
+import compile_failures
+import compile_scheduler
+import manifest
+import analysis
 import type_checking
+import random_functions
+import program_db
 
 # Python modules
-import subprocess
 import socket
 import multiprocessing as mp
 import argparse
+import shutil
+import json
+import time
+import threading
+import concurrent.futures
 
 
-def writeProgramCode(fileName):
-    # Write C code
-    p = gen_program.Program()
-    (code, allTypes) = p.printCode()
+def writeProgramCode(fileName, p):
+    sources = getTestSources(fileName)
+    (codes, allTypes) = p.printTargets(list(sources.keys()), getTestNumber(fileName))
     writeInputFile(fileName, allTypes)
-    with open(fileName, "w") as f:
-        f.write(code)
-
-    # Write CUDA code
-    (code, allTypes) = p.printCode(True)
-    with open(fileName + "u", "w") as f:
-        f.write(code)
-
-    # Write HIP code
-    (code, allTypes) = p.printCode(True, hip=True)
-    with open(fileName.replace(".c", ".hip"), "w") as f:
-        f.write(code)
+    for target, code in codes.items():
+        with open(sources[target], "w") as f:
+            f.write(code)
+
+
+def getLibrarySourceName(fileName):
+    return fileName.replace(".c", ".lib.c")
+
+
+# The C source is always written, as the reference source of a test; the
+# CUDA, HIP and shared-library sources only when a configured compiler
+# builds them.
+def getTargets():
+    compiler_names = [name for (name, path) in cfg.COMPILERS]
+    targets = ["c"]
+    if any(isCUDACompiler(name) for name in compiler_names):
+        targets.append("cuda")
+    if any(isHIPCompiler(name) for name in compiler_names):
+        targets.append("hip")
+    if cfg.SHARED_LIBRARY_TARGET and any(isHostCompiler(name) for name in compiler_names):
+        targets.append("lib")
+    elif cfg.BATCH_SIZE > 1 and any(isHostCompiler(name) for name in compiler_names):
+        targets.append("batch")
+    elif cfg.SHARED_DRIVER and any(isHostCompiler(name) for name in compiler_names):
+        targets.append("kernel")
+    return targets
+
+
+def getTargetSourceName(fileName, target):
+    if target == "cuda":
+        return fileName + "u"
+    elif target == "hip":
+        return fileName.replace(".c", ".hip")
+    elif target == "lib":
+        return getLibrarySourceName(fileName)
+    elif target == "kernel":
+        return fileName.replace(".c", ".kernel.c")
+    elif target == "batch":
+        return fileName.replace(".c", ".batch.c")
+    return fileName
+
+
+# Sources written by writeProgramCode for a test, per target
+def getTestSources(fileName):
+    return {target: getTargetSourceName(fileName, target) for target in getTargets()}
 
 
 def writeInputFile(fileName, allTypes):
@@ -50,6 +95,126 @@ def isHIPCompiler(compiler_name):
     return "hipcc" in compiler_name
 
 
+def isHostCompiler(compiler_name):
+    return not isCUDACompiler(compiler_name) and not isHIPCompiler(compiler_name)
+
+
+def usesSharedDriver(compiler_name):
+    return (cfg.SHARED_DRIVER and cfg.BATCH_SIZE <= 1 and not cfg.SHARED_LIBRARY_TARGET and
+            isHostCompiler(compiler_name))
+
+
+def usesBatches(compiler_name):
+    return cfg.BATCH_SIZE > 1 and not cfg.SHARED_LIBRARY_TARGET and isHostCompiler(compiler_name)
+
+
+# Number of a test source (3 for _test_3.c)
+def getTestNumber(fileName):
+    return int(os.path.basename(fileName)[len("_test_"):].split(".")[0])
+
+
+def isBatchSource(fileName):
+    return os.path.basename(fileName).startswith("_batch_")
+
+
+# Batches hold cfg.BATCH_SIZE consecutive tests of a group
+def getBatchName(fileName):
+    batch = (getTestNumber(fileName) - 1) // cfg.BATCH_SIZE + 1
+    return os.path.join(os.path.dirname(fileName), "_batch_" + str(batch) + ".c")
+
+
+# Returns {batch source: test sources}
+def getBatches(fileNameList):
+    batches = {}
+    for fileName in fileNameList:
+        batchName = getBatchName(fileName)
+        if batchName not in batches:
+            batches[batchName] = []
+        batches[batchName].append(fileName)
+    return batches
+
+
+def writeBatchSource(batchName, fileNames):
+    kernels = []
+    for fileName in fileNames:
+        with open(getTargetSourceName(fileName, "batch"), "r") as f:
+            kernels.append((getTestNumber(fileName), f.read()))
+    with open(batchName, "w") as f:
+        f.write(gen_program.printBatchProgram(kernels))
+
+
+# Writes the batches of the generated tests (retries maps the tests dropped
+# as duplicates to None). Returns {batch source: test sources}.
+def writeBatchSources(fileNameList, retries):
+    if "batch" not in getTargets():
+        return {}
+    batches = {}
+    for batchName, fileNames in getBatches(fileNameList).items():
+        fileNames = [fileName for fileName in fileNames if retries.get(fileName) is not None]
+        if len(fileNames) > 0:
+            writeBatchSource(batchName, fileNames)
+            batches[batchName] = fileNames
+    return batches
+
+
+# Links the executable of a batch as the executable of each of its tests
+# (_batch_1.c-gcc-O2.exe as _test_1.c-gcc-O2.exe, ...). Returns
+# (base_name, executable) for each test.
+def linkBatchExecutable(exeName, fileNames):
+    suffix = os.path.basename(exeName).split("-", 1)[1]
+    ret = []
+    for fileName in fileNames:
+        testExeName = fileName + "-" + suffix
+        if os.path.lexists(testExeName):
+            os.remove(testExeName)
+        try:
+            os.link(exeName, testExeName)
+        except OSError:
+            shutil.copy2(exeName, testExeName)
+        ret.append((os.path.splitext(fileName)[0], testExeName))
+    return ret
+
+
+# The shared driver of a campaign is in its tests directory, the parent of
+# the group directories
+def getSharedDriverSourceName(testsDir):
+    return os.path.join(testsDir, "driver.c")
+
+
+def getSharedDriverObjectName(testsDir, compiler_name):
+    return os.path.join(testsDir, "driver-" + compiler_name + ".o")
+
+
+# Compiles the driver shared by the tests of campaign path once per host
+# compiler (see cfg.SHARED_DRIVER). The driver does not compute results, so
+# its optimization level does not matter.
+def compileSharedDrivers(path, compilers):
+    compilers = [(name, compiler_path) for (name, compiler_path) in compilers if usesSharedDriver(name)]
+    if len(compilers) == 0:
+        return
+    testsDir = os.path.join(path, cfg.TESTS_DIR)
+    os.makedirs(testsDir, exist_ok=True)
+    sourceName = getSharedDriverSourceName(testsDir)
+    with open(sourceName, "w") as f:
+        f.write(gen_program.printSharedDriver())
+    for (compiler_name, compiler_path) in compilers:
+        args = ([compiler_path, "-O2"] + getExtraOptimization(compiler_name, 0).split() +
+                ["-c", "-o", getSharedDriverObjectName(testsDir, compiler_name), sourceName])
+        (out, failure, seconds) = process_limits.spawnWithLimits(args, None, cfg.COMPILE_TIMEOUT)
+        if failure is not None:
+            print("Error compiling the shared driver ({}): {}".format(failure, " ".join(args)))
+            print(failure.stderr)
+
+
+# Options to build a shared library that can be loaded by the harness
+def getSharedLibraryOptions(compiler_name):
+    if "xlc" in compiler_name:
+        return "-qpic -qmkshrobj"
+    elif "pgi" in compiler_name:
+        return "-fpic -shared"
+    return "-fPIC -shared"
+
+
 def getExtraOptimization(compiler_name, e: int):
     ret = ""
     if "clang" in compiler_name:
@@ -95,68 +260,209 @@ def getExtraOptimization(compiler_name, e: int):
     return ret
 
 
+def getExtraName(other_op):
+    if other_op == 1:
+        return "_nofma"
+    elif other_op == 2:
+        return "_fast"
+    return ""
+
+
+# Name of an opt level in the results (e.g., "O0_nofma")
+def getOptName(op_level, other_op):
+    return op_level.lstrip("-") + getExtraName(other_op)
+
+
 def compileCode(config):
     (compiler_name, compiler_path, op_level, other_op, dirName, fileName) = config
+    pwd = os.getcwd()
+    start_time = time.perf_counter()
+    exeName = None
+    ok = True
+    cached = False
+    failure = None
+    peakRSS = None
     try:
-        pwd = os.getcwd()
         os.chdir(dirName)
         libs = " -lm "
         more_ops = getExtraOptimization(compiler_name, other_op)
-        extra_name = ""
-        if other_op == 1:
-            extra_name = "_nofma"
-        elif other_op == 2:
-            extra_name = "_fast"
+        extra_name = getExtraName(other_op)
 
         if isCUDACompiler(compiler_name):
-            fileName = fileName + "u"
+            fileName = getTargetSourceName(fileName, "cuda")
 
         if isHIPCompiler(compiler_name):
-            fileName = fileName.replace(".c", ".hip")
-
-        compilation_arguments = [compiler_path, op_level, more_ops, libs, "-o",
-                                 fileName + "-" + compiler_name + op_level + extra_name + ".exe", fileName]
-        cmd = " ".join(compilation_arguments)
-
-        out = subprocess.check_output(cmd, shell=True)
+            fileName = getTargetSourceName(fileName, "hip")
+
+        sourceName = fileName
+        suffix = ".exe"
+        if cfg.SHARED_LIBRARY_TARGET and isHostCompiler(compiler_name):
+            sourceName = getLibrarySourceName(fileName)
+            suffix = ".so"
+            more_ops = more_ops + " " + getSharedLibraryOptions(compiler_name)
+
+        # Only compute is compiled, and linked with the shared driver
+        objects = []
+        if usesSharedDriver(compiler_name):
+            sourceName = getTargetSourceName(fileName, "kernel")
+            objects = [getSharedDriverObjectName("..", compiler_name)]
+
+        exeName = fileName + "-" + compiler_name + op_level + extra_name + suffix
+        # Libraries go after the source, or the linker drops them
+        compilation_arguments = ([compiler_path] + op_level.split() + more_ops.split() +
+                                 ["-o", exeName, sourceName] + objects + libs.split())
+
+        key = None
+        if compile_cache.isEnabled():
+            extra_files = [getSharedDriverSourceName("..")] if objects else []
+            key = compile_cache.cacheKey(sourceName, compiler_path, " ".join([op_level, more_ops, libs]),
+                                         extra_files)
+            cached = compile_cache.fetch(key, exeName)
+
+        if not cached:
+            # Compilers run in their own process group, so that a hung
+            # compiler and the tools it started are killed on timeout
+            (out, compileFailure, seconds, peakRSS) = process_limits.spawnMeasured(compilation_arguments,
+                                                                                   cfg.COMPILE_TIMEOUT)
+            if compileFailure is not None:
+                ok = False
+                # The C source of the test, whatever the target
+                failure = compile_failures.newRecord(os.path.join(dirName, config[5]), compiler_name,
+                                                     compilation_arguments, compileFailure)
+                print("\nError at compile time ({}): {}".format(compileFailure, " ".join(compilation_arguments)))
+            elif key is not None:
+                compile_cache.store(key, exeName)
+    except OSError as outexc:
+        ok = False
+        print("\nError at compile time:", outexc)
+    finally:
+        # Workers are reused across jobs, so always restore the working directory
         os.chdir(pwd)
-    except subprocess.CalledProcessError as outexc:
-        print("Error at compile time:", outexc.returncode, outexc.output)
-        print("FAILED: ", cmd)
+    end_time = time.perf_counter()
+    if exeName is not None:
+        exeName = os.path.join(dirName, exeName)
+    return (config, end_time - start_time, ok, cached, exeName, failure, peakRSS)
 
 
-def generateTests():
-    dir = getTargetDirectory()
-    print("Generating {} groups, {} tests... ".format(cfg.NUM_GROUPS, cfg.TESTS_PER_GROUP))
+def getTestFileNames(dir):
     fileNameList = []
     for g in range(cfg.NUM_GROUPS):
-        # Create directory
         p = dir + "/" + cfg.TESTS_DIR + "/_group_" + str(g + 1)
-        try:
-            os.makedirs(p)
-        except FileExistsError:
-            pass  # directory already exists
-
-        # Write the program source code
         for t in range(cfg.TESTS_PER_GROUP):
             fileName = p + "/_test_" + str(t + 1) + ".c"
             fileNameList.append(fileName)
+    return fileNameList
+
+
+# Creates the group directories of the tests of fileNameList
+def makeTestDirectories(fileNameList):
+    for p in sorted(set([os.path.dirname(fileName) for fileName in fileNameList])):
+        os.makedirs(p, exist_ok=True)
+
+
+# A generation job is (campaign seed, test index, source file name, retry).
+# With retry None, the program is checked against the de-duplication index
+# and drawn again from the next retry while it is a duplicate. Returns
+# (fileName, retry), with retry None if the test was dropped.
+def writeTestProgram(job):
+    (campaignSeed, index, fileName, retry) = job
+    if retry is not None or cfg.DEDUP_INDEX is None:
+        if retry is None:
+            retry = 0
+        writeProgramCode(fileName, gen_program.generateProgram(campaignSeed, index, retry))
+        return (fileName, retry)
+
+    programIndex = program_db.getProgramIndex()
+    for retry in range(cfg.DEDUP_MAX_RETRIES + 1):
+        p = gen_program.generateProgram(campaignSeed, index, retry)
+        key = p.structuralHash()
+        if programIndex.add(key, os.path.splitext(fileName)[0]):
+            writeProgramCode(fileName, p)
+            return (fileName, retry)
+    print("\nDropping {}: no new program after {} retries".format(fileName, cfg.DEDUP_MAX_RETRIES))
+    return (fileName, None)
+
+
+def getGenerationJobs(campaignSeed, fileNameList):
+    return [(campaignSeed, i, fileName, None) for i, fileName in enumerate(fileNameList)]
+
+
+# Several jobs per chunk keep the pool overhead low, while enough chunks
+# per worker keep the load balanced
+def getChunkSize(numJobs, numWorkers):
+    return max(1, numJobs // (numWorkers * 4))
+
+
+# retries maps each generated file to the retry it was generated from
+# (None for the tests dropped as duplicates)
+def newCampaignManifest(dir, campaignSeed, fileNameList, retries, batches=None):
+    batches = batches or {}
+    m = manifest.newManifest(campaignSeed)
+    for i, fileName in enumerate(fileNameList):
+        if retries.get(fileName) is None:
+            continue
+        manifest.addTest(m, dir, os.path.splitext(fileName)[0], getTestSources(fileName), i, retries[fileName])
+    for batchName, fileNames in batches.items():
+        manifest.addBatch(m, dir, batchName, [os.path.splitext(fileName)[0] for fileName in fileNames])
+    manifest.save(dir, m)
+    return m
+
+
+def printDuplicates(retries):
+    if cfg.DEDUP_INDEX is None:
+        return
+    duplicates = sum([r for r in retries.values() if r is not None])
+    dropped = len([r for r in retries.values() if r is None])
+    print("Duplicate programs replaced: {}, tests dropped: {}".format(duplicates, dropped))
 
+
+def generateTests():
+    dir = getTargetDirectory()
+    print("Generating {} groups, {} tests... ".format(cfg.NUM_GROUPS, cfg.TESTS_PER_GROUP))
+    fileNameList = getTestFileNames(dir)
+    makeTestDirectories(fileNameList)
+    campaignSeed = random_functions.newCampaignSeed()
+    print("Campaign seed:", campaignSeed)
+
+    jobs = getGenerationJobs(campaignSeed, fileNameList)
+    retries = {}
     cpuCount = mp.cpu_count()
-    for i in range(0, len(fileNameList), cpuCount):
-        workLoad = fileNameList[i:i + cpuCount]
-        with mp.Pool(cpuCount) as myPool:
-            myPool.map(writeProgramCode, workLoad)
-            # writeProgramCode(fileName)
+    with mp.Pool(cpuCount) as myPool:
+        for (fileName, retry) in myPool.imap_unordered(writeTestProgram, jobs, getChunkSize(len(jobs), cpuCount)):
+            retries[fileName] = retry
+
+    batches = writeBatchSources(fileNameList, retries)
+    newCampaignManifest(dir, campaignSeed, fileNameList, retries, batches)
+    printDuplicates(retries)
     print("done!")
     return dir
 
 
-def compileTests(path):
-    print("Compiling tests...")
-    print("Total tests to compile: ", cfg.NUM_GROUPS * cfg.TESTS_PER_GROUP)
+def regenerateTests(dir):
+    """Rewrites the sources of the tests of campaign dir from the seed
+    recorded in its manifest."""
+    m = manifest.load(dir)
+    if m is None or m.get("seed") is None:
+        print("No campaign seed found in", manifest.getManifestFileName(dir))
+        return
+    campaignSeed = m["seed"]
+    tests = manifest.getGeneratedTests(m, dir)
+    print("Regenerating {} tests from seed {}... ".format(len(tests), campaignSeed))
+    jobs = []
+    for (index, retry, sources) in tests:
+        os.makedirs(os.path.dirname(sources["c"]), exist_ok=True)
+        jobs.append((campaignSeed, index, sources["c"], retry))
 
-    # Check if the compilers exist
+    cpuCount = mp.cpu_count()
+    with mp.Pool(cpuCount) as myPool:
+        for result in myPool.imap_unordered(writeTestProgram, jobs, getChunkSize(len(jobs), cpuCount)):
+            pass
+    for (batchName, base_names) in manifest.getBatches(m, dir) if "batch" in getTargets() else []:
+        writeBatchSource(batchName, [base_name + ".c" for base_name in base_names])
+    print("done!")
+
+
+def getExistingCompilers():
     existing_compilers = []
     for compiler_name, compiler_path in cfg.COMPILERS:
         if os.path.exists(compiler_path):
@@ -165,29 +471,384 @@ def compileTests(path):
         else:
             print(
                 f"\033[1;91mCompiler {compiler_name} with path {compiler_path} does not exist and will be skipped.\033[0m")
+    return existing_compilers
+
+
+def getCompileConfigs(dirName, fileName, compilers):
+    configs = []
+    for (compiler_name, compiler_path) in compilers:
+        for opts in cfg.OPT_LEVELS:
+            (op, other_op) = opts
+            configs.append((compiler_name, compiler_path, op, other_op, dirName, fileName))
+    return configs
+
+
+# (directory, C source file name) of the tests of campaign path
+def getCompileSources(path):
+    m = manifest.load(path)
+    if m is None:
+        return [os.path.split(fileName) for fileName in getTestFileNames(path)]
+    return [os.path.split(sources["c"]) for (index, retry, sources) in manifest.getGeneratedTests(m, path)]
+
+
+# Compile configurations of the tests of campaign path. Batched tests are
+# compiled in their batch by the host compilers.
+def getCampaignCompileConfigs(path, sources, compilers):
+    m = manifest.load(path)
+    batches = manifest.getBatches(m, path) if m is not None else []
+    batchCompilers = [c for c in compilers if usesBatches(c[0])]
+    testCompilers = [c for c in compilers if not usesBatches(c[0])]
+    configs = []
+    batched = set()
+    if len(batchCompilers) > 0:
+        for (batchName, base_names) in batches:
+            batched.update([base_name + ".c" for base_name in base_names])
+            (dirName, fileName) = os.path.split(batchName)
+            configs += getCompileConfigs(dirName, fileName, batchCompilers)
+    for (dirName, fileName) in sources:
+        if os.path.join(dirName, fileName) in batched:
+            configs += getCompileConfigs(dirName, fileName, testCompilers)
+        else:
+            configs += getCompileConfigs(dirName, fileName, compilers)
+    return configs
 
-    compileConfigList = []
-    for g in range(cfg.NUM_GROUPS):
-        p = path + "/" + cfg.TESTS_DIR + "/_group_" + str(g + 1)
-        for t in range(cfg.TESTS_PER_GROUP):
-            fileName = "_test_" + str(t + 1) + ".c"
-            for c in existing_compilers:
-                compiler_name = c[0]
-                compiler_path = c[1]
-                for opts in cfg.OPT_LEVELS:
-                    (op, other_op) = opts
-                    config = (compiler_name, compiler_path, op, other_op, p, fileName)
-                    compileConfigList.append(config)
 
-    cpuCount = mp.cpu_count()
-    for i in range(0, len(compileConfigList), cpuCount):
-        print("\r--> Compiling test: {}".format(int(i / cpuCount) + 1), end='')
+def compileTests(path):
+    print("Compiling tests...")
+    sources = getCompileSources(path)
+    print("Total tests to compile: ", len(sources))
+
+    # Check if the compilers exist
+    existing_compilers = getExistingCompilers()
+
+    compileSharedDrivers(path, existing_compilers)
+    compileConfigList = getCampaignCompileConfigs(path, sources, existing_compilers)
+
+    # A single pool is fed from the whole job list, so a slow compile only
+    # occupies one worker while the others keep draining the queue. Jobs are
+    # submitted when the scheduler has room for their compiler (see
+    # cfg.COMPILER_RESOURCES), heaviest first.
+    jobTimes = []
+    total = len(compileConfigList)
+    scheduler = compile_scheduler.newScheduler(mp.cpu_count())
+    pending = scheduler.order(compileConfigList)
+
+    def onCompiled(job, memory):
+        jobTimes.append(job)
+        scheduler.release(job[0][0], memory, job[6])
+        print("\r--> Compiled job: {}/{}".format(len(jobTimes), total), end='')
         sys.stdout.flush()
-        workLoad = compileConfigList[i:i + cpuCount]
-        with mp.Pool(cpuCount) as myPool:
-            myPool.map(compileCode, workLoad)
+
+    def onCompileError(exc, config, memory):
+        print("\nError at compile time:", exc)
+        scheduler.release(config[0], memory)
+
+    with mp.Pool(mp.cpu_count()) as myPool:
+        while len(pending) > 0:
+            (config, memory) = scheduler.acquireNext(pending)
+            myPool.apply_async(compileCode, (config,),
+                               callback=lambda job, memory=memory: onCompiled(job, memory),
+                               error_callback=lambda exc, config=config, memory=memory:
+                               onCompileError(exc, config, memory))
+        scheduler.wait()
 
     print("")
+    finishCompilation(path, jobTimes)
+
+
+def addExecutablesToManifest(m, path, jobTimes):
+    batches = {batchName: [base_name + ".c" for base_name in base_names]
+               for (batchName, base_names) in manifest.getBatches(m, path)}
+    for (config, seconds, ok, cached, exeName, failure, peakRSS) in jobTimes:
+        if not ok:
+            continue
+        (compiler_name, compiler_path, op_level, other_op, dirName, fileName) = config
+        target = "so" if exeName.endswith(".so") else "exe"
+        if isBatchSource(fileName):
+            exes = linkBatchExecutable(exeName, batches[os.path.join(dirName, fileName)])
+            target = "batch"
+        else:
+            exes = [(os.path.splitext(os.path.join(dirName, fileName))[0], exeName)]
+        sha256 = exec_cache.executableHash(exeName)
+        for (base_name, testExeName) in exes:
+            if not manifest.getTestEntry(m, path, base_name)["sources"]:
+                # Campaigns generated before manifests existed
+                manifest.addTest(m, path, base_name, getTestSources(base_name + ".c"))
+            manifest.addExecutable(m, path, base_name, testExeName, compiler_name, getOptName(op_level, other_op),
+                                   target, sha256)
+
+
+# Prints how many executables are identical to another executable of their
+# test, which are run only once (see cfg.RUN_IDENTICAL_ONCE)
+def printIdenticalExecutables(m, path):
+    total = 0
+    identical = 0
+    for (base_name, exes) in manifest.getTests(m, path):
+        total += len(exes)
+        identical += len(exes) - len(manifest.getIdenticalExecutables(m, path, base_name))
+    if identical > 0:
+        print("Identical executables: {}/{}".format(identical, total))
+    return identical
+
+
+def finishCompilation(path, jobTimes):
+    m = manifest.loadOrCreate(path)
+    addExecutablesToManifest(m, path, jobTimes)
+    manifest.save(path, m)
+    printIdenticalExecutables(m, path)
+    saveCompileData(path, jobTimes)
+    saveCompileFailures(path, jobTimes)
+    if compile_cache.isEnabled():
+        hits = len([j for j in jobTimes if j[3]])
+        print("Compile cache hits: {}/{}".format(hits, len(jobTimes)))
+        compile_cache.evict()
+
+
+def saveCompileFailures(path, jobTimes):
+    failures = [job[5] for job in jobTimes if job[5] is not None]
+    compile_failures.save(path, failures)
+    if len(failures) == 0:
+        return None
+    sources = set([os.path.join(job[0][4], job[0][5]) for job in jobTimes])
+    summary = compile_failures.summarize(path, sources)
+    compile_failures.printSummary(summary)
+    return summary
+
+
+def saveCompileData(path, jobTimes):
+    jobs = []
+    per_compiler = {}
+    for (config, seconds, ok, cached, exeName, failure, peakRSS) in jobTimes:
+        (compiler_name, compiler_path, op_level, other_op, dirName, fileName) = config
+        jobs.append({
+            "file": os.path.join(dirName, fileName),
+            "executable": exeName,
+            "compiler": compiler_name,
+            "opt": op_level,
+            "extra_opt": other_op,
+            "seconds": seconds,
+            "ok": ok,
+            "cached": cached,
+            "failure": failure["kind"] if failure is not None else None,
+            "peak rss": peakRSS,
+        })
+        if compiler_name not in per_compiler:
+            per_compiler[compiler_name] = {"jobs": 0, "total seconds": 0.0, "max seconds": 0.0,
+                                           "measured jobs": 0, "total peak rss": 0, "max peak rss": 0}
+        stats = per_compiler[compiler_name]
+        stats["jobs"] += 1
+        stats["total seconds"] += seconds
+        stats["max seconds"] = max(stats["max seconds"], seconds)
+        # Cached jobs did not run the compiler
+        if peakRSS is not None:
+            stats["measured jobs"] += 1
+            stats["total peak rss"] += peakRSS
+            stats["max peak rss"] = max(stats["max peak rss"], peakRSS)
+
+    for compiler_name, stats in per_compiler.items():
+        stats["mean seconds"] = stats["total seconds"] / stats["jobs"]
+        # To tune cfg.COMPILER_RESOURCES
+        stats["memory hint"] = compile_scheduler.getResourceHints(compiler_name).get("memory")
+        stats["mean peak rss"] = stats["total peak rss"] // max(stats["measured jobs"], 1)
+        print("{}: {} jobs, mean {:.3f}s, max {:.3f}s, peak RSS mean {:.0f} MiB, max {:.0f} MiB".format(
+            compiler_name, stats["jobs"], stats["mean seconds"], stats["max seconds"],
+            stats["mean peak rss"] / 1024 ** 2, stats["max peak rss"] / 1024 ** 2))
+
+    compile_data = {"Compilers": per_compiler, "Jobs": jobs}
+    with open(os.path.join(path, "compile_data.json"), "w") as f:
+        json.dump(compile_data, f, indent=2)
+
+
+def pipelineTests():
+    """Generates, compiles and runs the tests as a streaming pipeline.
+
+    Each generated program is queued for compilation as soon as it is
+    written, and each executable is run as soon as it is compiled. The
+    number of compile jobs and executables waiting to run, and the number
+    of programs generated ahead of them, are bounded by
+    cfg.PIPELINE_QUEUE_SIZE, so generation slows down when the later stages
+    fall behind.
+    """
+    dir = getTargetDirectory()
+    print("Pipelining {} groups, {} tests... ".format(cfg.NUM_GROUPS, cfg.TESTS_PER_GROUP))
+    fileNameList = getTestFileNames(dir)
+    makeTestDirectories(fileNameList)
+    existing_compilers = getExistingCompilers()
+    compileSharedDrivers(dir, existing_compilers)
+    run.openResultsStore(dir)
+    campaignSeed = random_functions.newCampaignSeed()
+    print("Campaign seed:", campaignSeed)
+
+    cpuCount = mp.cpu_count()
+    queueSize = cfg.PIPELINE_QUEUE_SIZE
+    if queueSize is None:
+        queueSize = 2 * cpuCount
+    slots = threading.BoundedSemaphore(queueSize)
+    # Generation jobs are submitted when a slot is free, and hold it until
+    # their compile jobs are queued
+    genSlots = threading.BoundedSemaphore(queueSize)
+    scheduler = compile_scheduler.newScheduler(cpuCount)
+
+    lock = threading.Lock()
+    jobTimes = []
+    testInputs = {}
+    # Results of the executables of each test, by content, so that identical
+    # executables are run once
+    testRuns = {}
+    batch_runtime = {}
+    retries = {}
+    # Batches of the host compilers, written when their last test is generated
+    batchCompilers = [c for c in existing_compilers if usesBatches(c[0])]
+    testCompilers = [c for c in existing_compilers if not usesBatches(c[0])]
+    pendingBatches = getBatches(fileNameList) if batchCompilers and "batch" in getTargets() else {}
+    remaining = {batchName: len(fileNames) for batchName, fileNames in pendingBatches.items()}
+    batches = {}
+
+    def runTest(base_name, exeName):
+        try:
+            key = (base_name, exec_cache.executableHash(exeName) if cfg.RUN_IDENTICAL_ONCE else exeName)
+            with lock:
+                # All the executables of a test run on the same inputs
+                if base_name not in testInputs:
+                    inputsList = run.generateInputsList(base_name)
+                    testInputs[base_name] = (inputsList, run.getInputTypes(base_name))
+                (inputsList, types) = testInputs[base_name]
+                first = key not in testRuns
+                if first:
+                    testRuns[key] = concurrent.futures.Future()
+                future = testRuns[key]
+            if first:
+                try:
+                    future.set_result(run.runExecutable(exeName, inputsList, types))
+                except Exception as exc:
+                    future.set_exception(exc)
+            results = future.result()
+            with lock:
+                for index, (inputs, res, runtime) in enumerate(results):
+                    run.appendResult(base_name, exeName, inputs, res, runtime, batch_runtime, index)
+        except OSError as outexc:
+            print("\nError at runtime:", outexc)
+            print("CMD", exeName)
+
+    def runCompiled(base_name, exeName):
+        try:
+            runTest(base_name, exeName)
+        finally:
+            slots.release()
+
+    # The tests of a batch executable hold the slot of its compile job
+    def runBatchCompiled(exes):
+        try:
+            for (base_name, exeName) in exes:
+                runTest(base_name, exeName)
+        finally:
+            slots.release()
+
+    def onCompiled(job, memory):
+        (config, seconds, ok, cached, exeName, failure, peakRSS) = job
+        scheduler.release(config[0], memory, peakRSS)
+        with lock:
+            jobTimes.append(job)
+        if not ok:
+            slots.release()
+            return
+        (compiler_name, compiler_path, op_level, other_op, dirName, fileName) = config
+        if isBatchSource(fileName):
+            exes = linkBatchExecutable(exeName, batches[os.path.join(dirName, fileName)])
+            for (base_name, testExeName) in exes:
+                exec_cache.addBatchedExecutable(testExeName)
+                run.registerExecutable(testExeName, compiler_name, getOptName(op_level, other_op))
+            runExecutor.submit(runBatchCompiled, exes)
+            return
+        base_name = os.path.splitext(os.path.join(dirName, fileName))[0]
+        run.registerExecutable(exeName, compiler_name, getOptName(op_level, other_op))
+        runExecutor.submit(runCompiled, base_name, exeName)
+
+    def onCompileError(exc, config, memory):
+        print("\nError at compile time:", exc)
+        scheduler.release(config[0], memory)
+        slots.release()
+
+    def submitCompile(configs):
+        for config in configs:
+            slots.acquire()
+            memory = scheduler.acquire(config[0])
+            compilePool.apply_async(compileCode, (config,),
+                                    callback=lambda job, memory=memory: onCompiled(job, memory),
+                                    error_callback=lambda exc, config=config, memory=memory:
+                                    onCompileError(exc, config, memory))
+
+    # Writes the batch of fileName once all its tests are generated, and
+    # queues its compilation
+    def submitBatch(fileName):
+        batchName = getBatchName(fileName)
+        remaining[batchName] -= 1
+        if remaining[batchName] > 0:
+            return
+        fileNames = [f for f in pendingBatches[batchName] if retries.get(f) is not None]
+        if len(fileNames) == 0:
+            return
+        writeBatchSource(batchName, fileNames)
+        batches[batchName] = fileNames
+        (dirName, baseFileName) = os.path.split(batchName)
+        submitCompile(getCompileConfigs(dirName, baseFileName, batchCompilers))
+
+    # Runs in the result thread of the generation pool, which blocks while
+    # the compile queue is full
+    def onGenerated(fileName, retry):
+        try:
+            retries[fileName] = retry
+            if retry is not None:
+                generated[0] += 1
+                print("\r--> Generated: {}/{}, compiled: {}".format(generated[0], len(fileNameList), len(jobTimes)),
+                      end='')
+                sys.stdout.flush()
+                (dirName, baseFileName) = os.path.split(fileName)
+                if pendingBatches:
+                    submitCompile(getCompileConfigs(dirName, baseFileName, testCompilers))
+                else:
+                    submitCompile(getCompileConfigs(dirName, baseFileName, existing_compilers))
+            if pendingBatches:
+                submitBatch(fileName)
+        finally:
+            genSlots.release()
+
+    def onGenerationError(exc, fileName):
+        print("\nError generating {}: {}".format(fileName, exc))
+        onGenerated(fileName, None)
+
+    genWorkers = max(1, cpuCount // 4)
+    genPool = mp.Pool(genWorkers)
+    compilePool = mp.Pool(cpuCount)
+    runExecutor = concurrent.futures.ThreadPoolExecutor(cpuCount)
+    try:
+        generated = [0]
+        for job in getGenerationJobs(campaignSeed, fileNameList):
+            genSlots.acquire()
+            genPool.apply_async(writeTestProgram, (job,), callback=lambda result: onGenerated(*result),
+                                error_callback=lambda exc, fileName=job[2]: onGenerationError(exc, fileName))
+        genPool.close()
+        # Joining the generation pool waits for its callbacks, so every
+        # compile job is submitted before the compile pool is closed
+        genPool.join()
+        compilePool.close()
+        # Joining the pool also waits for its callbacks, so every run is
+        # submitted before the executor is shut down
+        compilePool.join()
+        runExecutor.shutdown(wait=True)
+    finally:
+        genPool.terminate()
+        compilePool.terminate()
+    print("")
+
+    newCampaignManifest(dir, campaignSeed, fileNameList, retries, batches)
+    printDuplicates(retries)
+    finishCompilation(dir, jobTimes)
+    print("Saving runs results...")
+    run.saveResults(dir)
+    run.saveRunData(dir, batch_runtime=batch_runtime)
+    print("done")
+    return dir
 
 
 def dirName():
@@ -220,6 +881,14 @@ def check_divergence(dir, compiler_one, compiler_two):
     run.check_divergence(dir, compiler_one, compiler_two)
 
 
+def check_divergence_matrix(dir):
+    run.check_divergence_matrix(dir)
+
+
+def analyze_ulp(dir):
+    analysis.analyze_ulp(dir)
+
+
 def get_summary(dirs):
     run.report_discrepancies(dirs)
 
@@ -227,22 +896,40 @@ def get_summary(dirs):
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-g", "--generate", help="generate programs", action="store_true")
+    parser.add_argument("-p", "--pipeline", help="generate, compile and run programs as a pipeline",
+                        action="store_true")
+    parser.add_argument("-rg", "--regenerate", type=str,
+                        help="regenerate the programs in dir: REGENERATE from its campaign seed")
+    parser.add_argument("--seed", type=int, help="seed of the generated campaign")
     parser.add_argument("-c", "--compile", type=str, help="compile programs in dir: COMPILE")
     parser.add_argument("-r", "--run", type=str, help="run programs in dir: RUN")
     parser.add_argument("-re", "--rerun", type=str, help="run saved programs in dir: RERUN")
     parser.add_argument("-d", "--divergence", nargs=3, metavar=("DIVERGENCE", "COMPILER_ONE", "COMPILER_TWO"),
                         help="check divergence in dir: DIVERGENCE using COMPILER_ONE and COMPILER_TWO")
+    parser.add_argument("-dm", "--divergence-matrix", type=str,
+                        help="check divergence in dir: DIVERGENCE_MATRIX between all compilers and opt levels")
+    parser.add_argument("-u", "--ulp", type=str, help="analyze the ULP distance of the divergences in dir: ULP")
     parser.add_argument("-s", "--summary", nargs='+', help="summarise and make a report in dirs: SUMMARY")
 
     args = parser.parse_args()
+    if args.seed is not None:
+        cfg.SEED = args.seed
 
-    if len(sys.argv) == 1:
-        working_directory = generateTests()
-        compileTests(working_directory)
-        runTests(working_directory)
+    # --seed alone runs the default campaign
+    if not any(v for k, v in vars(args).items() if k != "seed"):
+        if cfg.PIPELINE:
+            pipelineTests()
+        else:
+            working_directory = generateTests()
+            compileTests(working_directory)
+            runTests(working_directory)
     else:
+        if args.pipeline:
+            pipelineTests()
         if args.generate:
             generateTests()
+        if args.regenerate:
+            regenerateTests(args.regenerate)
         if args.compile:
             compileTests(args.compile)
         if args.run:
@@ -252,6 +939,10 @@ def main():
         if args.divergence:
             divergence_dir, compiler_one, compiler_two = args.divergence
             check_divergence(divergence_dir, compiler_one, compiler_two)
+        if args.divergence_matrix:
+            check_divergence_matrix(args.divergence_matrix)
+        if args.ulp:
+            analyze_ulp(args.ulp)
         if args.summary:
             get_summary(args.summary)
 